@@ -0,0 +1,399 @@
+"""
+Ancoragem em lote: em vez de um registerProperty por matrícula, registros e
+transferências executadas viram folhas de uma árvore Merkle e só a raiz vai
+para o contrato (anchorRoot). Cada registro guarda a prova de inclusão, que
+pode ser verificada localmente ou pelo próprio contrato (verifyInclusion).
+
+A árvore segue o formato do MerkleProof do OpenZeppelin: folha =
+keccak256(keccak256(payload)) e pares ordenados antes do hash, então a prova é
+só a lista de irmãos, sem bits de direção.
+
+Ativado com ANCHOR_MODE=true. O lote fecha a cada ANCHOR_INTERVAL_S segundos
+ou ao atingir ANCHOR_MAX_ITEMS folhas, o que vier antes.
+
+O lote é gravado (raiz, folhas e provas) antes do envio, sem travas abertas
+durante a chamada à chain, e o tx_hash do lote passa por estados:
+"anchor-sending:<token>" (reservado para envio), "anchor-sent:<hash>" (hash
+gravado; no modo rpc antes da transmissão) e o hash final só depois do recibo
+com sucesso, quando registros e transferências recebem o hash. Recibo
+revertido ou transação desconhecida consultam anchoredAt(raiz): raiz já
+ancorada conta como sucesso, senão a raiz é reenviada.
+"""
+import json
+import os
+import secrets
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.orm import Session
+
+from app.blockchain import (
+    OnchainReadUnavailable,
+    anchor_root_onchain,
+    keccak,
+    root_anchored_at,
+    transaction_status,
+)
+from app.database import SessionLocal
+from app.models import AnchorBatch, AnchorRecord, Property, Transfer
+from app.observability import get_logger
+
+
+ANCHOR_INTERVAL_S = float(os.getenv("ANCHOR_INTERVAL_S", "10"))
+ANCHOR_MAX_ITEMS = int(os.getenv("ANCHOR_MAX_ITEMS", "256"))
+# tx_hash provisório de propriedades/transferências até a raiz ser ancorada.
+PENDING_PREFIX = "anchor-pending:"
+# tx_hash do lote antes do recibo (ver docstring do módulo).
+SENDING_PREFIX = "anchor-sending:"
+SENT_PREFIX = "anchor-sent:"
+# Lote reservado sem hash há mais que isso é reenviado (o worker que o reservou caiu).
+ANCHOR_RESEND_AFTER_S = float(os.getenv("ANCHOR_RESEND_AFTER_S", "60"))
+
+log = get_logger(__name__)
+
+
+def is_anchor_mode() -> bool:
+    return os.getenv("ANCHOR_MODE", "false").lower() == "true"
+
+
+# --- árvore Merkle ---------------------------------------------------------------
+
+
+def to_hex(value: bytes) -> str:
+    return "0x" + value.hex()
+
+
+def from_hex(value: str) -> bytes:
+    return bytes.fromhex(value.removeprefix("0x"))
+
+
+def leaf_payload(
+    *,
+    kind: str,
+    ref_id: int,
+    matricula: str,
+    previous_owner: str | None,
+    current_owner: str,
+    latitude: float,
+    longitude: float,
+) -> str:
+    """Serialização canônica do registro; é o que a folha compromete."""
+    return json.dumps(
+        {
+            "kind": kind,
+            "ref_id": ref_id,
+            "matricula": matricula,
+            "previous_owner": previous_owner or "",
+            "current_owner": current_owner,
+            "latitude_e6": int(latitude * 1_000_000),
+            "longitude_e6": int(longitude * 1_000_000),
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+
+
+def leaf_hash(payload: str) -> bytes:
+    # Hash duplo evita que um nó interno seja apresentado como folha.
+    return keccak(keccak(payload.encode()))
+
+
+def _parent(a: bytes, b: bytes) -> bytes:
+    return keccak(a + b if a <= b else b + a)
+
+
+def build_tree(leaves: list[bytes]) -> list[list[bytes]]:
+    """Níveis da árvore, das folhas à raiz. Nó sem par sobe sem hash."""
+    if not leaves:
+        raise ValueError("árvore sem folhas")
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        current = levels[-1]
+        nxt = [_parent(current[i], current[i + 1]) for i in range(0, len(current) - 1, 2)]
+        if len(current) % 2:
+            nxt.append(current[-1])
+        levels.append(nxt)
+    return levels
+
+
+def merkle_proof(levels: list[list[bytes]], index: int) -> list[bytes]:
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append(level[sibling])
+        index //= 2
+    return proof
+
+
+def verify_proof(leaf: bytes, proof: list[bytes], root: bytes) -> bool:
+    node = leaf
+    for sibling in proof:
+        node = _parent(node, sibling)
+    return node == root
+
+
+# --- fila de ancoragem -----------------------------------------------------------
+
+
+def enqueue_anchor(
+    db: Session,
+    *,
+    kind: str,
+    ref_id: int,
+    matricula: str,
+    previous_owner: str | None,
+    current_owner: str,
+    latitude: float,
+    longitude: float,
+) -> str:
+    """
+    Adiciona a folha à sessão do handler (entra no mesmo commit do registro) e
+    devolve o tx_hash provisório, trocado pelo hash do anchorRoot no flush.
+    """
+    payload = leaf_payload(
+        kind=kind,
+        ref_id=ref_id,
+        matricula=matricula,
+        previous_owner=previous_owner,
+        current_owner=current_owner,
+        latitude=latitude,
+        longitude=longitude,
+    )
+    leaf = to_hex(leaf_hash(payload))
+    db.add(AnchorRecord(kind=kind, ref_id=ref_id, matricula=matricula, payload=payload, leaf_hash=leaf))
+    return PENDING_PREFIX + leaf
+
+
+def is_confirmed(batch: AnchorBatch) -> bool:
+    """Lote com recibo de sucesso (ou raiz confirmada por anchoredAt)."""
+    return not batch.tx_hash.startswith((SENDING_PREFIX, SENT_PREFIX))
+
+
+def _swap_batch(batch_id: int, old: str, new: str) -> bool:
+    """Compare-and-set do tx_hash do lote; False se outro worker já o mudou."""
+    with SessionLocal() as db:
+        db.execute(
+            update(AnchorBatch).where(AnchorBatch.id == batch_id, AnchorBatch.tx_hash == old).values(tx_hash=new)
+        )
+        db.commit()
+        return db.scalar(select(AnchorBatch.tx_hash).where(AnchorBatch.id == batch_id)) == new
+
+
+def _submit(batch_id: int, root: str, state: str) -> str | None:
+    """Envia anchorRoot de um lote reservado (`state`); devolve o novo estado ou None se falhou."""
+
+    def on_signed(tx_hash: str):
+        if not _swap_batch(batch_id, state, SENT_PREFIX + tx_hash):
+            raise RuntimeError(f"lote {batch_id} reservado por outro worker")
+
+    try:
+        tx_hash = anchor_root_onchain(root, on_signed=on_signed)
+    except Exception as exc:
+        # Continua reservado; confirm_batches reenvia após ANCHOR_RESEND_AFTER_S.
+        log.error("anchor.submit_failed", root=root, error=str(exc))
+        return None
+    sent = SENT_PREFIX + tx_hash
+    # No modo rpc o estado já é este (on_signed); nos demais o hash só existe agora.
+    _swap_batch(batch_id, state, sent)
+    return sent
+
+
+def _confirm(batch_id: int, state: str, tx_hash: str) -> bool:
+    """Fecha o lote com o hash final e troca o tx_hash provisório das folhas."""
+    if not _swap_batch(batch_id, state, tx_hash):
+        return False
+    with SessionLocal() as db:
+        leaves = db.execute(select(AnchorRecord.leaf_hash).where(AnchorRecord.batch_id == batch_id)).scalars().all()
+        markers = [PENDING_PREFIX + leaf for leaf in leaves]
+        for model in (Property, Transfer):
+            db.execute(
+                update(model)
+                .where(model.tx_hash.in_(markers))
+                .values(tx_hash=tx_hash)
+                .execution_options(synchronize_session=False)
+            )
+        db.commit()
+    return True
+
+
+def _anchored(root: str) -> bool:
+    try:
+        return bool(root_anchored_at(root))
+    except OnchainReadUnavailable:
+        # Modo mock: todo envio é confirmado, não há estado para consultar.
+        return False
+
+
+def _settle(batch_id: int, root: str, state: str, created_at: datetime | None) -> str:
+    """
+    Um passo do lote não confirmado: espera o recibo, confirma ou reenvia.
+    Devolve o estado resultante.
+    """
+    if state.startswith(SENT_PREFIX):
+        tx_hash = state.removeprefix(SENT_PREFIX)
+        status = transaction_status(tx_hash)
+        if status == "pending":
+            return state
+        if status == "confirmed" or _anchored(root):
+            # Revertida com "Raiz ja ancorada": um envio anterior já ancorou a raiz.
+            return tx_hash if _confirm(batch_id, state, tx_hash) else state
+        log.warning("anchor.resend", root=root, tx_hash=tx_hash, status=status)
+    else:
+        if created_at is not None and created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        age = (datetime.now(timezone.utc) - created_at).total_seconds() if created_at else 0.0
+        if age < ANCHOR_RESEND_AFTER_S:
+            return state
+        if _anchored(root):
+            # Ancorada por um envio cujo hash não chegou a ser gravado.
+            anchored = f"anchor-root:{root}"
+            return anchored if _confirm(batch_id, state, anchored) else state
+    claim = SENDING_PREFIX + secrets.token_hex(8)
+    if not _swap_batch(batch_id, state, claim):
+        return state
+    return _submit(batch_id, root, claim) or claim
+
+
+def confirm_batches() -> int:
+    """Avança os lotes sem recibo confirmado; devolve quantos foram confirmados."""
+    with SessionLocal() as db:
+        batches = db.execute(
+            select(AnchorBatch.id, AnchorBatch.root, AnchorBatch.tx_hash, AnchorBatch.created_at).where(
+                or_(AnchorBatch.tx_hash.startswith(SENDING_PREFIX), AnchorBatch.tx_hash.startswith(SENT_PREFIX))
+            )
+        ).all()
+    confirmed = 0
+    for batch in batches:
+        try:
+            state = _settle(batch.id, batch.root, batch.tx_hash, batch.created_at)
+        except Exception as exc:
+            log.error("anchor.confirm_failed", root=batch.root, error=str(exc))
+            continue
+        if not state.startswith((SENDING_PREFIX, SENT_PREFIX)):
+            confirmed += 1
+            log.info("anchor.confirmed", root=batch.root, tx_hash=state)
+    return confirmed
+
+
+def flush_pending(limit: int = ANCHOR_MAX_ITEMS) -> AnchorBatch | None:
+    """
+    Fecha um lote com até `limit` folhas pendentes e envia a raiz. O lote e as
+    provas são gravados antes do envio; as folhas recebem o hash depois do
+    recibo (aqui mesmo, se já houver, ou em confirm_batches).
+    """
+    with SessionLocal() as db:
+        # SKIP LOCKED: com vários workers cada um pega folhas diferentes.
+        records = (
+            db.execute(
+                select(AnchorRecord)
+                .where(AnchorRecord.batch_id.is_(None))
+                .order_by(AnchorRecord.id)
+                .limit(limit)
+                .with_for_update(skip_locked=True)
+            )
+            .scalars()
+            .all()
+        )
+        if not records:
+            return None
+
+        start = time.perf_counter()
+        levels = build_tree([from_hex(r.leaf_hash) for r in records])
+        root = to_hex(levels[-1][0])
+        claim = SENDING_PREFIX + secrets.token_hex(8)
+        batch = AnchorBatch(root=root, tx_hash=claim, leaf_count=len(records))
+        db.add(batch)
+        db.flush()
+        for index, record in enumerate(records):
+            record.batch_id = batch.id
+            record.leaf_index = index
+            record.proof = json.dumps([to_hex(p) for p in merkle_proof(levels, index)])
+        # As travas saem aqui: o envio abaixo não segura linhas.
+        db.commit()
+        db.refresh(batch)
+
+    state = _submit(batch.id, root, claim)
+    if state is not None:
+        try:
+            state = _settle(batch.id, root, state, batch.created_at)
+        except Exception as exc:
+            log.error("anchor.confirm_failed", root=root, error=str(exc))
+    batch.tx_hash = state or claim
+    log.info(
+        "anchor.flushed",
+        root=root,
+        tx_hash=batch.tx_hash,
+        leaves=len(records),
+        duration_ms=round((time.perf_counter() - start) * 1000, 1),
+    )
+    return batch
+
+
+class AnchorBatcher:
+    """
+    Thread por worker que fecha lotes por tempo ou tamanho. As folhas ficam no
+    banco, então nada se perde se o processo cair antes do flush: o próximo
+    worker a rodar ancora o que estiver pendente.
+    """
+
+    def __init__(self, interval: float = ANCHOR_INTERVAL_S, max_items: int = ANCHOR_MAX_ITEMS):
+        self.interval = interval
+        self.max_items = max_items
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def notify(self, count: int = 1):
+        """Chamado após o commit do handler; acorda a thread ao encher o lote."""
+        if self._thread is None:
+            return
+        with self._lock:
+            self._pending += count
+            if self._pending >= self.max_items:
+                self._wake.set()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="anchor-batcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=30)
+        self._thread = None
+
+    def _drain(self):
+        confirm_batches()
+        while True:
+            batch = flush_pending(self.max_items)
+            if batch is None or batch.leaf_count < self.max_items:
+                return
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            with self._lock:
+                self._pending = 0
+            try:
+                self._drain()
+            except Exception as exc:
+                log.error("anchor.flush_failed", error=str(exc))
+        # Desligamento gracioso: ancora o que sobrou antes de sair.
+        try:
+            self._drain()
+        except Exception as exc:
+            log.error("anchor.flush_failed", error=str(exc))
+
+
+anchor_batcher = AnchorBatcher()
@@ -0,0 +1,563 @@
+"""
+Particionamento quente/frio e arquivamento do histórico que só cresce.
+
+No Postgres, `pos_validations` pode ser particionada por mês de `created_at`
+(o job maintenance.partitions cria as partições à frente); `nonces` e as
+propostas rejeitadas saem linha a linha. O job `maintenance.archive` exporta o
+que passou de ARCHIVE_AFTER_DAYS (nonces: NONCE_TTL_S) para arquivos
+compactados em ARCHIVE_DIR (Parquet/zstd com pyarrow instalado, senão NDJSON
+gzip) e registra cada arquivo em `archive_segments`. Partições inteiramente
+antigas são exportadas, desanexadas e descartadas; o restante sai em lotes de
+ARCHIVE_BATCH_SIZE linhas.
+
+Listagens com período (`since`/`until`) juntam as linhas do banco com os
+segmentos que cruzam o intervalo (archived_rows); sem período só o banco é lido.
+A exportação do regulador sempre inclui os segmentos (archived_stream).
+
+Conversão das tabelas existentes (uma vez, em janela de manutenção):
+
+    python -m app.archive --setup-partitions
+    python -m app.archive --run        # arquiva agora, sem esperar o job
+"""
+import argparse
+import enum
+import gzip
+import json
+import os
+import secrets
+import sys
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Iterator
+
+from sqlalchemy import Boolean, DateTime, Enum, Float, Integer, delete, select, text
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal, engine
+from app.models import ArchiveSegment, Nonce, PosValidation, Proposal, ProposalStatus
+from app.observability import get_logger
+
+
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "false").lower() == "true"
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", "archive"))
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+# parquet, ndjson ou auto (parquet se o pyarrow estiver instalado).
+ARCHIVE_FORMAT = os.getenv("ARCHIVE_FORMAT", "auto").lower()
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "10000"))
+# Partições criadas à frente para que os inserts não caiam na partição default.
+ARCHIVE_PARTITIONS_AHEAD = int(os.getenv("ARCHIVE_PARTITIONS_AHEAD", "3"))
+NONCE_TTL_S = float(os.getenv("NONCE_TTL_S", "86400"))
+
+# Chave do advisory lock que impede dois processos de arquivar ao mesmo tempo.
+_LOCK_KEY = 0x61726368
+
+log = get_logger(__name__)
+
+
+@dataclass
+class ArchivedTable:
+    model: type
+    partition: str | None  # "month", "day" ou None (só arquivamento por linha)
+    after_s: float
+    eligible: object = None  # filtro extra das linhas arquiváveis
+
+    @property
+    def name(self) -> str:
+        return self.model.__tablename__
+
+    @property
+    def table(self):
+        return self.model.__table__
+
+
+ARCHIVED_TABLES = {
+    spec.name: spec
+    for spec in (
+        ArchivedTable(PosValidation, "month", ARCHIVE_AFTER_DAYS * 86400),
+        # Sem partição: o Postgres exigiria created_at em toda unicidade e o nonce SIWE precisa ser único.
+        ArchivedTable(Nonce, None, NONCE_TTL_S),
+        ArchivedTable(
+            Proposal,
+            None,
+            ARCHIVE_AFTER_DAYS * 86400,
+            eligible=Proposal.status == ProposalStatus.REJECTED,
+        ),
+    )
+}
+
+
+# --- serialização --------------------------------------------------------------------
+
+
+def _utc(value: datetime) -> datetime:
+    # SQLite devolve datetimes sem fuso; o banco grava em UTC.
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def plain_row(mapping) -> dict:
+    """Linha do banco com enums como valor e datetimes em UTC."""
+    row = {}
+    for key, value in mapping.items():
+        if isinstance(value, enum.Enum):
+            value = value.value
+        elif isinstance(value, datetime):
+            value = _utc(value)
+        row[key] = value
+    return row
+
+
+def _load(spec: ArchivedTable, record: dict):
+    """Linha arquivada -> instância transitória do modelo (nunca vai para a sessão)."""
+    values = {}
+    for column in spec.table.columns:
+        value = record.get(column.name)
+        if value is not None:
+            if isinstance(column.type, DateTime):
+                value = _utc(datetime.fromisoformat(value) if isinstance(value, str) else value)
+            elif isinstance(column.type, Enum) and column.type.enum_class is not None:
+                value = column.type.enum_class(value)
+        values[column.key] = value
+    return spec.model(**values)
+
+
+def _format() -> str:
+    if ARCHIVE_FORMAT != "auto":
+        return ARCHIVE_FORMAT
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return "ndjson"
+    return "parquet"
+
+
+def arrow_schema(table):
+    """Schema Arrow equivalente às colunas da tabela SQLAlchemy."""
+    import pyarrow as pa
+
+    fields = []
+    for column in table.columns:
+        if isinstance(column.type, DateTime):
+            arrow_type = pa.timestamp("us", tz="UTC")
+        elif isinstance(column.type, Float):
+            arrow_type = pa.float64()
+        elif isinstance(column.type, Boolean):
+            arrow_type = pa.bool_()
+        elif isinstance(column.type, Integer):
+            arrow_type = pa.int64()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+def _write_file(spec: ArchivedTable, rows: list[dict], start: datetime, end: datetime) -> tuple[str, str]:
+    fmt = _format()
+    ext = "parquet" if fmt == "parquet" else "ndjson.gz"
+    relative = Path(spec.name) / f"{spec.name}-{start:%Y%m%dT%H%M%S}-{end:%Y%m%dT%H%M%S}-{secrets.token_hex(4)}.{ext}"
+    path = ARCHIVE_DIR / relative
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        pq.write_table(pa.Table.from_pylist(rows, schema=arrow_schema(spec.table)), tmp, compression="zstd")
+    else:
+        with gzip.open(tmp, "wt", encoding="utf-8") as fh:
+            for row in rows:
+                fh.write(json.dumps(row, default=lambda v: v.isoformat(), separators=(",", ":")))
+                fh.write("\n")
+    os.replace(tmp, path)
+    return str(relative), fmt
+
+
+def _read_file(segment: ArchiveSegment) -> list[dict]:
+    path = ARCHIVE_DIR / segment.path
+    if segment.format == "parquet":
+        import pyarrow.parquet as pq
+
+        return pq.read_table(path).to_pylist()
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def _store_segment(db: Session, spec: ArchivedTable, rows: list[dict]):
+    """Grava o arquivo antes do commit; se a transação falhar ele fica órfão e é ignorado."""
+    start = min(row["created_at"] for row in rows)
+    end = max(row["created_at"] for row in rows)
+    path, fmt = _write_file(spec, rows, start, end)
+    db.add(
+        ArchiveSegment(
+            table_name=spec.name,
+            range_start=start,
+            range_end=end,
+            row_count=len(rows),
+            path=path,
+            format=fmt,
+        )
+    )
+
+
+# --- partições (Postgres) ------------------------------------------------------------
+
+
+def _is_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def _floor(moment: datetime, interval: str) -> datetime:
+    moment = _utc(moment).astimezone(timezone.utc)
+    if interval == "month":
+        return datetime(moment.year, moment.month, 1, tzinfo=timezone.utc)
+    return datetime(moment.year, moment.month, moment.day, tzinfo=timezone.utc)
+
+
+def _next(start: datetime, interval: str) -> datetime:
+    if interval == "month":
+        return datetime(start.year + start.month // 12, start.month % 12 + 1, 1, tzinfo=timezone.utc)
+    return start + timedelta(days=1)
+
+
+def _partition_name(spec: ArchivedTable, start: datetime) -> str:
+    return f"{spec.name}_p{start:%Y%m%d}"
+
+
+def is_partitioned(db: Session, spec: ArchivedTable) -> bool:
+    return bool(
+        db.scalar(
+            text(
+                "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt "
+                "JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :name)"
+            ),
+            {"name": spec.name},
+        )
+    )
+
+
+def _partitions(db: Session, spec: ArchivedTable) -> list[tuple[str, datetime, datetime]]:
+    """(partição, início, fim) em ordem; os limites vêm do nome (<tabela>_pYYYYMMDD)."""
+    names = db.execute(
+        text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :name"
+        ),
+        {"name": spec.name},
+    ).scalars()
+    prefix = f"{spec.name}_p"
+    out = []
+    for name in names:
+        if not name.startswith(prefix):
+            continue  # partição default
+        start = datetime.strptime(name[len(prefix) :], "%Y%m%d").replace(tzinfo=timezone.utc)
+        out.append((name, start, _next(start, spec.partition)))
+    return sorted(out, key=lambda item: item[1])
+
+
+def _create_partition(db: Session, spec: ArchivedTable, name: str, lower: datetime, upper: datetime):
+    """
+    Cria a partição [lower, upper). Linhas do intervalo que caíram na partição
+    default (partição criada tarde) impedem o PARTITION OF: a default é
+    desanexada, as linhas vão para a partição nova e ela volta em seguida.
+    """
+    default = f"{spec.name}_default"
+    bounds = {"lower": lower, "upper": upper}
+    in_range = "created_at >= :lower AND created_at < :upper"
+    spilled = db.scalar(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": default}) and db.scalar(
+        text(f'SELECT EXISTS (SELECT 1 FROM "{default}" WHERE {in_range})'), bounds
+    )
+    if spilled:
+        db.execute(text(f'ALTER TABLE "{spec.name}" DETACH PARTITION "{default}"'))
+    # Limites são calculados aqui, não vêm do usuário.
+    db.execute(
+        text(
+            f'CREATE TABLE "{name}" PARTITION OF "{spec.name}" '
+            f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+    )
+    if spilled:
+        moved = db.execute(text(f'INSERT INTO "{name}" SELECT * FROM "{default}" WHERE {in_range}'), bounds).rowcount
+        db.execute(text(f'DELETE FROM "{default}" WHERE {in_range}'), bounds)
+        db.execute(text(f'ALTER TABLE "{spec.name}" ATTACH PARTITION "{default}" DEFAULT'))
+        log.warning("archive.partition_backfilled", table=spec.name, partition=name, rows=moved)
+
+
+def ensure_partitions(db: Session, spec: ArchivedTable, since: datetime | None = None) -> int:
+    """Cria as partições de `since` (padrão: agora) até ARCHIVE_PARTITIONS_AHEAD intervalos à frente."""
+    current = _floor(since or datetime.now(timezone.utc), spec.partition)
+    last = _floor(datetime.now(timezone.utc), spec.partition)
+    for _ in range(ARCHIVE_PARTITIONS_AHEAD):
+        last = _next(last, spec.partition)
+    existing = {name for name, _, _ in _partitions(db, spec)}
+    created = 0
+    while current <= last:
+        upper = _next(current, spec.partition)
+        name = _partition_name(spec, current)
+        if name not in existing:
+            _create_partition(db, spec, name, current, upper)
+            created += 1
+        current = upper
+    return created
+
+
+def setup_partitions(db: Session, spec: ArchivedTable) -> bool:
+    """
+    Converte a tabela em particionada por created_at, copiando as linhas.
+    Bloqueia a tabela durante a cópia. A chave primária passa a ser
+    (id, created_at) e índices únicos viram comuns (o Postgres exige a chave de
+    partição em qualquer unicidade), por isso só tabelas sem unicidade própria
+    são particionadas.
+    """
+    if spec.partition is None or is_partitioned(db, spec):
+        return False
+    name, legacy = spec.name, f"{spec.name}_legacy"
+    db.execute(text(f'LOCK TABLE "{name}" IN ACCESS EXCLUSIVE MODE'))
+    db.execute(text(f'UPDATE "{name}" SET created_at = now() WHERE created_at IS NULL'))
+    sequence = db.scalar(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": name})
+    db.execute(text(f'ALTER TABLE "{name}" RENAME TO "{legacy}"'))
+    db.execute(text(f'ALTER TABLE "{legacy}" RENAME CONSTRAINT "{name}_pkey" TO "{legacy}_pkey"'))
+    db.execute(text(f'CREATE TABLE "{name}" (LIKE "{legacy}" INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)'))
+    db.execute(text(f'ALTER TABLE "{name}" ADD PRIMARY KEY (id, created_at)'))
+    db.execute(text(f'CREATE TABLE "{name}_default" PARTITION OF "{name}" DEFAULT'))
+    ensure_partitions(db, spec, since=db.scalar(text(f'SELECT min(created_at) FROM "{legacy}"')))
+    db.execute(text(f'INSERT INTO "{name}" SELECT * FROM "{legacy}"'))
+    if sequence:
+        db.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY "{name}".id'))
+    db.execute(text(f'DROP TABLE "{legacy}"'))
+    for index in spec.table.indexes:
+        columns = ", ".join(f'"{column.name}"' for column in index.columns)
+        db.execute(text(f'CREATE INDEX IF NOT EXISTS "{index.name}" ON "{name}" ({columns})'))
+    db.commit()
+    log.info("archive.partitioned", table=name)
+    return True
+
+
+# --- arquivamento --------------------------------------------------------------------
+
+
+def _archive_partitions(db: Session, spec: ArchivedTable, cutoff: datetime) -> int:
+    """Exporta partições que terminam antes do corte e as descarta (sem DELETE linha a linha)."""
+    moved = 0
+    for name, _, upper in _partitions(db, spec):
+        if upper > cutoff:
+            break
+        after = None
+        count = 0
+        while True:
+            # Paginação por (created_at, id) para não carregar a partição inteira.
+            sql = f'SELECT * FROM "{name}"'
+            params = {"limit": ARCHIVE_BATCH_SIZE}
+            if after is not None:
+                sql += " WHERE (created_at, id) > (:after_ts, :after_id)"
+                params.update(after_ts=after[0], after_id=after[1])
+            sql += " ORDER BY created_at, id LIMIT :limit"
+            rows = [plain_row(r) for r in db.execute(text(sql), params).mappings()]
+            if not rows:
+                break
+            _store_segment(db, spec, rows)
+            count += len(rows)
+            after = (rows[-1]["created_at"], rows[-1]["id"])
+        db.execute(text(f'ALTER TABLE "{spec.name}" DETACH PARTITION "{name}"'))
+        db.execute(text(f'DROP TABLE "{name}"'))
+        db.commit()
+        moved += count
+        log.info("archive.partition_dropped", table=spec.name, partition=name, rows=count)
+    return moved
+
+
+def _archive_rows(db: Session, spec: ArchivedTable, cutoff: datetime) -> int:
+    table = spec.table
+    moved = 0
+    while True:
+        stmt = select(table).where(table.c.created_at < cutoff)
+        if spec.eligible is not None:
+            stmt = stmt.where(spec.eligible)
+        stmt = stmt.order_by(table.c.created_at, table.c.id).limit(ARCHIVE_BATCH_SIZE).with_for_update(skip_locked=True)
+        rows = [plain_row(r) for r in db.execute(stmt).mappings()]
+        if not rows:
+            db.rollback()
+            return moved
+        _store_segment(db, spec, rows)
+        db.execute(delete(table).where(table.c.id.in_([row["id"] for row in rows])))
+        db.commit()
+        moved += len(rows)
+
+
+def ensure_all_partitions() -> int:
+    """
+    Cria as partições à frente nas tabelas já particionadas. Roda no job
+    maintenance.partitions com ou sem ARCHIVE_ENABLED: sem ele os inserts
+    passariam a cair na partição default.
+    """
+    created = 0
+    with engine.connect() as lock_conn, SessionLocal() as db:
+        if not _is_postgres(db):
+            return 0
+        if not lock_conn.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": _LOCK_KEY}):
+            return 0
+        try:
+            for spec in ARCHIVED_TABLES.values():
+                if spec.partition and is_partitioned(db, spec):
+                    created += ensure_partitions(db, spec)
+                    db.commit()
+        finally:
+            lock_conn.scalar(text("SELECT pg_advisory_unlock(:key)"), {"key": _LOCK_KEY})
+    if created:
+        log.info("archive.partitions_created", count=created)
+    return created
+
+
+def run(now: datetime | None = None) -> dict:
+    """Arquiva todas as tabelas; devolve linhas movidas por tabela."""
+    now = now or datetime.now(timezone.utc)
+    report = {}
+    with engine.connect() as lock_conn, SessionLocal() as db:
+        postgres = _is_postgres(db)
+        # Lock em conexão própria: a sessão devolve a conexão ao pool a cada commit.
+        if postgres and not lock_conn.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": _LOCK_KEY}):
+            log.info("archive.skipped", reason="locked")
+            return report
+        try:
+            for spec in ARCHIVED_TABLES.values():
+                cutoff = now - timedelta(seconds=spec.after_s)
+                moved = 0
+                if postgres and spec.partition and is_partitioned(db, spec):
+                    ensure_partitions(db, spec)
+                    db.commit()
+                    moved += _archive_partitions(db, spec, cutoff)
+                moved += _archive_rows(db, spec, cutoff)
+                report[spec.name] = moved
+        finally:
+            if postgres:
+                lock_conn.scalar(text("SELECT pg_advisory_unlock(:key)"), {"key": _LOCK_KEY})
+    if any(report.values()):
+        log.info("archive.completed", **report)
+    return report
+
+
+# --- leitura -------------------------------------------------------------------------
+
+
+def archived_rows(
+    db: Session,
+    table_name: str,
+    *,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    filters: dict | None = None,
+) -> list:
+    """
+    Linhas arquivadas com created_at em [since, until) que batem com `filters`
+    (igualdade por coluna), como instâncias transitórias do modelo. Só abre os
+    arquivos cujo intervalo cruza o período pedido.
+    """
+    spec = ARCHIVED_TABLES[table_name]
+    since = _utc(since) if since else None
+    until = _utc(until) if until else None
+    expected = {key: value.value if isinstance(value, enum.Enum) else value for key, value in (filters or {}).items()}
+
+    stmt = select(ArchiveSegment).where(ArchiveSegment.table_name == table_name)
+    if since is not None:
+        stmt = stmt.where(ArchiveSegment.range_end >= since)
+    if until is not None:
+        stmt = stmt.where(ArchiveSegment.range_start < until)
+    out = []
+    for segment in db.execute(stmt.order_by(ArchiveSegment.range_start)).scalars():
+        for record in _read_file(segment):
+            if any(record.get(key) != value for key, value in expected.items()):
+                continue
+            item = _load(spec, record)
+            if since is not None and item.created_at < since:
+                continue
+            if until is not None and item.created_at >= until:
+                continue
+            out.append(item)
+    return out
+
+
+def archived_stream(
+    table_name: str,
+    *,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    after_id: int = 0,
+) -> Iterator[dict]:
+    """
+    Linhas arquivadas com id > after_id e created_at em [since, until), em
+    ordem de id e no formato de plain_row (para a exportação). Segmentos cujos
+    intervalos se cruzam são lidos juntos e os demais um grupo por vez, então a
+    memória fica no tamanho do maior grupo.
+    """
+    spec = ARCHIVED_TABLES.get(table_name)
+    if spec is None:
+        return
+    since = _utc(since) if since else None
+    until = _utc(until) if until else None
+    stmt = select(ArchiveSegment.path, ArchiveSegment.format, ArchiveSegment.range_start, ArchiveSegment.range_end)
+    stmt = stmt.where(ArchiveSegment.table_name == table_name)
+    if since is not None:
+        stmt = stmt.where(ArchiveSegment.range_end >= since)
+    if until is not None:
+        stmt = stmt.where(ArchiveSegment.range_start < until)
+    with engine.connect() as conn:
+        segments = conn.execute(stmt.order_by(ArchiveSegment.range_start)).all()
+
+    def flush(group):
+        rows = []
+        for segment in group:
+            for record in _read_file(segment):
+                item = _load(spec, record)
+                if item.id <= after_id:
+                    continue
+                if since is not None and item.created_at < since:
+                    continue
+                if until is not None and item.created_at >= until:
+                    continue
+                rows.append(plain_row({column.name: getattr(item, column.key) for column in spec.table.columns}))
+        return sorted(rows, key=lambda row: row["id"])
+
+    group, group_end = [], None
+    for segment in segments:
+        if group and _utc(segment.range_start) > group_end:
+            yield from flush(group)
+            group, group_end = [], None
+        group.append(segment)
+        end = _utc(segment.range_end)
+        group_end = end if group_end is None else max(group_end, end)
+    if group:
+        yield from flush(group)
+
+
+def merge_desc(hot: list, cold: list, created_at=lambda row: row.created_at) -> list:
+    """Une linhas do banco e do arquivo, mais recentes primeiro."""
+    if not cold:
+        return hot
+    return sorted(hot + cold, key=lambda row: _utc(created_at(row)), reverse=True)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--setup-partitions", action="store_true", help="Converte as tabelas em particionadas")
+    parser.add_argument("--run", action="store_true", help="Arquiva o histórico frio agora")
+    args = parser.parse_args(argv)
+    if not (args.setup_partitions or args.run):
+        parser.print_help()
+        return 2
+
+    if args.setup_partitions:
+        with SessionLocal() as db:
+            if not _is_postgres(db):
+                print("Particionamento requer Postgres; no SQLite o arquivamento é só por linha.")
+                return 1
+            for spec in ARCHIVED_TABLES.values():
+                status = "convertida" if setup_partitions(db, spec) else "sem alteração"
+                print(f"{spec.name}: {status}")
+    if args.run:
+        print(json.dumps(run(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,11 +3,10 @@ import secrets
 import time
 
 import jwt
-from eth_account import Account
-from eth_account.messages import encode_defunct
 from sqlalchemy.orm import Session
 
 from .models import Nonce, User
+from .observability import SIGNATURE_RECOVERY_LATENCY, timed
 
 
 JWT_SECRET = os.getenv("JWT_SECRET", "changeme")
@@ -42,9 +41,14 @@ def build_siwe_message(address: str, nonce: str) -> str:
 
 def verify_signature(address: str, message: str, signature: str) -> bool:
     """Valida a assinatura SIWE usando recover."""
+    # Import tardio: eth_account pesa no cold start e só é usado no login.
+    from eth_account import Account
+    from eth_account.messages import encode_defunct
+
     try:
         msg = encode_defunct(text=message)
-        recovered = Account.recover_message(msg, signature=signature)
+        with timed(SIGNATURE_RECOVERY_LATENCY):
+            recovered = Account.recover_message(msg, signature=signature)
         return recovered.lower() == address.lower()
     except Exception:
         return False
@@ -1,10 +1,17 @@
+import json
 import os
+import re
 import secrets
-from typing import Optional
+import threading
+import time
+from functools import partial
+from typing import TYPE_CHECKING, Callable, Optional
 
-from eth_account import Account
-from web3 import Web3
-from web3.middleware import geth_poa_middleware
+from .observability import CHAIN_SUBMIT_LATENCY
+
+# web3/eth_account levam ~1s para importar; só são carregados fora do modo mock.
+if TYPE_CHECKING:
+    from web3 import Web3
 
 # ABI simplificada de um contrato de registro de propriedades.
 PROPERTY_REGISTRY_ABI = [
@@ -20,15 +27,233 @@ PROPERTY_REGISTRY_ABI = [
         "outputs": [],
         "stateMutability": "nonpayable",
         "type": "function",
+    },
+    {
+        "inputs": [{"internalType": "bytes32", "name": "root", "type": "bytes32"}],
+        "name": "anchorRoot",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function",
+    },
+    {
+        "inputs": [{"internalType": "bytes32", "name": "", "type": "bytes32"}],
+        "name": "anchoredAt",
+        "outputs": [{"internalType": "uint256", "name": "", "type": "uint256"}],
+        "stateMutability": "view",
+        "type": "function",
+    },
+    {
+        "inputs": [{"internalType": "string", "name": "", "type": "string"}],
+        "name": "properties",
+        "outputs": [
+            {"internalType": "string", "name": "matricula", "type": "string"},
+            {"internalType": "string", "name": "previousOwner", "type": "string"},
+            {"internalType": "string", "name": "currentOwner", "type": "string"},
+            {"internalType": "int256", "name": "latitudeE6", "type": "int256"},
+            {"internalType": "int256", "name": "longitudeE6", "type": "int256"},
+            {"internalType": "address", "name": "submittedBy", "type": "address"},
+            {"internalType": "uint256", "name": "registeredAt", "type": "uint256"},
+        ],
+        "stateMutability": "view",
+        "type": "function",
+    },
+]
+
+# v2 (contracts/PropertyRegistryV2.sol): tipos fixos e struct empacotada em 3 slots.
+PROPERTY_REGISTRY_V2_ABI = [
+    {
+        "inputs": [
+            {"internalType": "bytes32", "name": "matriculaHash", "type": "bytes32"},
+            {"internalType": "address", "name": "previousOwner", "type": "address"},
+            {"internalType": "address", "name": "currentOwner", "type": "address"},
+            {"internalType": "int32", "name": "latitudeE6", "type": "int32"},
+            {"internalType": "int32", "name": "longitudeE6", "type": "int32"},
+        ],
+        "name": "registerProperty",
+        "outputs": [],
+        "stateMutability": "nonpayable",
+        "type": "function",
+    },
+    PROPERTY_REGISTRY_ABI[1],
+    PROPERTY_REGISTRY_ABI[2],
+    {
+        "inputs": [{"internalType": "bytes32", "name": "", "type": "bytes32"}],
+        "name": "properties",
+        "outputs": [
+            {"internalType": "address", "name": "previousOwner", "type": "address"},
+            {"internalType": "int32", "name": "latitudeE6", "type": "int32"},
+            {"internalType": "int32", "name": "longitudeE6", "type": "int32"},
+            {"internalType": "address", "name": "currentOwner", "type": "address"},
+            {"internalType": "uint64", "name": "registeredAt", "type": "uint64"},
+            {"internalType": "address", "name": "submittedBy", "type": "address"},
+        ],
+        "stateMutability": "view",
+        "type": "function",
+    },
+]
+
+# Multicall3 tem o mesmo endereço na mainnet e nas testnets públicas.
+MULTICALL_ADDRESS = os.getenv("MULTICALL_ADDRESS", "0xcA11bde05977b3631167028862bE2a173976CA11")
+MULTICALL3_ABI = [
+    {
+        "inputs": [
+            {
+                "components": [
+                    {"internalType": "address", "name": "target", "type": "address"},
+                    {"internalType": "bool", "name": "allowFailure", "type": "bool"},
+                    {"internalType": "bytes", "name": "callData", "type": "bytes"},
+                ],
+                "internalType": "struct Multicall3.Call3[]",
+                "name": "calls",
+                "type": "tuple[]",
+            }
+        ],
+        "name": "aggregate3",
+        "outputs": [
+            {
+                "components": [
+                    {"internalType": "bool", "name": "success", "type": "bool"},
+                    {"internalType": "bytes", "name": "returnData", "type": "bytes"},
+                ],
+                "internalType": "struct Multicall3.Result[]",
+                "name": "returnData",
+                "type": "tuple[]",
+            }
+        ],
+        "stateMutability": "payable",
+        "type": "function",
     }
 ]
+# topic0 de PropertyRegistered em cada versão; topic1 é keccak256(matrícula) nas duas.
+PROPERTY_REGISTERED_SIGNATURES = {
+    1: "PropertyRegistered(string,string,string)",
+    2: "PropertyRegistered(bytes32,address,address)",
+}
+
+ZERO_ADDRESS = "0x" + "0" * 40
+_ADDRESS_RE = re.compile(r"^0x[0-9a-fA-F]{40}$")
+_INT32_MIN, _INT32_MAX = -(2**31), 2**31 - 1
+
+
+def contract_version() -> int:
+    """PROPERTY_CONTRACT_VERSION=2 usa o encoder compacto (padrão 1, contrato original)."""
+    return int(os.getenv("PROPERTY_CONTRACT_VERSION", "1"))
+
+
+def registry_abi(version: int | None = None) -> list[dict]:
+    return PROPERTY_REGISTRY_V2_ABI if (version or contract_version()) == 2 else PROPERTY_REGISTRY_ABI
+
+
+def keccak(data: bytes) -> bytes:
+    # eth_hash já vem com o web3; importado aqui para não pesar no startup.
+    from eth_hash.auto import keccak as _keccak
+
+    return _keccak(data)
+
+
+def matricula_hash(matricula: str) -> bytes:
+    """Chave da v2: keccak256(bytes(matricula))."""
+    return keccak(matricula.encode())
 
 
-def _get_web3() -> Web3:
-    rpc = os.getenv("ETH_RPC_URL")
-    if not rpc:
+def is_address(value: str) -> bool:
+    """Carteira 0x de 20 bytes, o formato que o contrato v2 aceita."""
+    return bool(_ADDRESS_RE.match(value))
+
+
+def _to_address(value: Optional[str], field: str) -> str:
+    if not value:
+        return ZERO_ADDRESS
+    if not is_address(value):
+        raise ValueError(f"{field} precisa ser um endereço 0x de 20 bytes no contrato v2")
+    from eth_utils import to_checksum_address
+
+    return to_checksum_address(value)
+
+
+def _to_int32_e6(value: float, field: str) -> int:
+    scaled = int(value * 1_000_000)
+    if not _INT32_MIN <= scaled <= _INT32_MAX:
+        raise ValueError(f"{field} fora do intervalo int32 em micrograus")
+    return scaled
+
+
+def encode_register_args(
+    *,
+    matricula: str,
+    previous_owner: Optional[str],
+    current_owner: str,
+    latitude: float,
+    longitude: float,
+    version: int | None = None,
+) -> tuple:
+    """Argumentos de registerProperty na ordem da ABI da versão do contrato."""
+    if (version or contract_version()) == 2:
+        return (
+            matricula_hash(matricula),
+            _to_address(previous_owner, "previous_owner"),
+            _to_address(current_owner, "current_owner"),
+            _to_int32_e6(latitude, "latitude"),
+            _to_int32_e6(longitude, "longitude"),
+        )
+    # Guarda coordenadas como inteiro em micrograus para evitar ponto flutuante no contrato.
+    return (
+        matricula,
+        previous_owner or "",
+        current_owner,
+        int(latitude * 1_000_000),
+        int(longitude * 1_000_000),
+    )
+
+
+def is_mock() -> bool:
+    return os.getenv("ETH_MOCK", "true").lower() == "true"
+
+
+def chain_backend() -> str:
+    """
+    CHAIN_BACKEND escolhe o backend: `mock` (hash instantâneo), `sim` (nó simulado
+    em processo, ver chain_sim.py) ou `rpc` (nó real). Sem ela, ETH_MOCK decide
+    entre mock e rpc.
+    """
+    backend = os.getenv("CHAIN_BACKEND")
+    if backend:
+        return backend.lower()
+    return "mock" if is_mock() else "rpc"
+
+
+def preload_chain_stack():
+    """Importa a pilha web3 antecipadamente (startup) quando o modo real está ativo."""
+    if chain_backend() == "rpc":
+        import web3  # noqa: F401
+        import web3.middleware  # noqa: F401
+        from eth_account import Account  # noqa: F401
+
+
+_w3: Optional["Web3"] = None
+_w3_lock = threading.Lock()
+
+
+def _get_web3() -> "Web3":
+    """Provider HTTP reaproveitado entre chamadas (mantém o keep-alive da sessão)."""
+    global _w3
+    with _w3_lock:
+        if _w3 is None:
+            _w3 = _connect_web3()
+        return _w3
+
+
+def _connect_web3() -> "Web3":
+    from web3 import Web3
+    from web3.middleware import geth_poa_middleware
+
+    from .rpc import FailoverProvider, rpc_urls
+
+    urls = rpc_urls()
+    if not urls:
         raise RuntimeError("ETH_RPC_URL não configurada")
-    w3 = Web3(Web3.HTTPProvider(rpc))
+    # Com mais de uma URL: failover, hedge de leituras e broadcast de escritas (ver rpc.py).
+    w3 = Web3(FailoverProvider(urls) if len(urls) > 1 else Web3.HTTPProvider(urls[0]))
     # Redes de teste PoA (ex: Sepolia) precisam do middleware.
     try:
         w3.middleware_onion.inject(geth_poa_middleware, layer=0)
@@ -39,13 +264,15 @@ def _get_web3() -> Web3:
     return w3
 
 
-def _get_contract(w3: Web3):
+def _get_contract(w3: "Web3"):
+    from web3 import Web3
+
     address = os.getenv("PROPERTY_CONTRACT_ADDRESS")
     if not address:
         raise RuntimeError("PROPERTY_CONTRACT_ADDRESS não configurado")
     return w3.eth.contract(
         address=Web3.to_checksum_address(address),
-        abi=PROPERTY_REGISTRY_ABI,
+        abi=registry_abi(),
     )
 
 
@@ -56,48 +283,365 @@ def register_property_onchain(
     current_owner: str,
     latitude: float,
     longitude: float,
+    on_signed: Callable[[str], None] | None = None,
 ) -> str:
     """
     Registra a propriedade no contrato. Por padrão roda em modo mock (ETH_MOCK=true)
-    e apenas retorna um hash sintético.
+    e apenas retorna um hash sintético. No modo rpc `on_signed(tx_hash)` roda
+    depois da assinatura e antes do envio (ver _sign_and_send).
+    """
+    backend = chain_backend()
+    outcome = "error"
+    start = time.perf_counter()
+    try:
+        if backend == "mock":
+            tx_hash = f"mock-{secrets.token_hex(16)}"
+        elif backend == "sim":
+            tx_hash = _submit_simulated(
+                matricula=matricula,
+                previous_owner=previous_owner,
+                current_owner=current_owner,
+                latitude=latitude,
+                longitude=longitude,
+            )
+        else:
+            tx_hash = _send_register_tx(
+                matricula=matricula,
+                previous_owner=previous_owner,
+                current_owner=current_owner,
+                latitude=latitude,
+                longitude=longitude,
+                on_signed=on_signed,
+            )
+        outcome = "ok"
+        return tx_hash
+    finally:
+        CHAIN_SUBMIT_LATENCY.labels(
+            mode="real" if backend == "rpc" else backend, outcome=outcome
+        ).observe(time.perf_counter() - start)
+
+
+def register_properties_onchain(items: list[dict], on_signed: Callable[[int, str], None] | None = None):
+    """
+    Registra várias propriedades em sequência, devolvendo (gerador) o tx_hash
+    de cada item na ordem recebida. Cada item tem os argumentos de
+    `register_property_onchain`. No modo rpc usa uma conexão e os nonces do
+    contador do processo (ver _sign_and_send) e chama `on_signed(índice,
+    tx_hash)` antes de cada envio; quem chama grava cada hash assim que ele
+    sai, para uma falha no meio não reenviar o que já foi.
+    """
+    backend = chain_backend()
+    if backend != "rpc":
+        for item in items:
+            yield register_property_onchain(**item)
+        return
+
+    w3 = _get_web3()
+    contract = _get_contract(w3)
+    gas = 150_000 if contract_version() == 2 else 500_000
+    for index, item in enumerate(items):
+        outcome = "error"
+        start = time.perf_counter()
+        try:
+            call = contract.functions.registerProperty(*encode_register_args(**item))
+            signed = partial(on_signed, index) if on_signed else None
+            tx_hash = _sign_and_send(w3, call, gas=gas, on_signed=signed)
+            outcome = "ok"
+        finally:
+            CHAIN_SUBMIT_LATENCY.labels(mode="real", outcome=outcome).observe(time.perf_counter() - start)
+        yield tx_hash
+
+
+def anchor_root_onchain(root: str, on_signed: Callable[[str], None] | None = None) -> str:
+    """
+    Ancora uma raiz Merkle (0x + 64 hex) via anchorRoot(bytes32); ver anchoring.py.
+    No modo rpc `on_signed(tx_hash)` roda antes do envio (ver _sign_and_send).
     """
-    if os.getenv("ETH_MOCK", "true").lower() == "true":
+    backend = chain_backend()
+    if backend == "mock":
         return f"mock-{secrets.token_hex(16)}"
+    if backend == "sim":
+        from .chain_sim import get_simulated_chain
 
-    private_key = os.getenv("ETH_PRIVATE_KEY")
-    from_address = os.getenv("ETH_FROM_ADDRESS")
-    if not private_key:
-        raise RuntimeError("ETH_PRIVATE_KEY não configurada")
+        return get_simulated_chain().submit(
+            json.dumps(["anchorRoot", root]),
+            sender=os.getenv("ETH_FROM_ADDRESS", "0x" + "0" * 40),
+            to=os.getenv("PROPERTY_CONTRACT_ADDRESS"),
+            effect={"anchor": root},
+        )
 
     w3 = _get_web3()
     contract = _get_contract(w3)
+    call = contract.functions.anchorRoot(bytes.fromhex(root.removeprefix("0x")))
+    return _sign_and_send(w3, call, gas=80_000, on_signed=on_signed)
 
-    sender = (
-        Web3.to_checksum_address(from_address)
-        if from_address
-        else Account.from_key(private_key).address
-    )
-    nonce = w3.eth.get_transaction_count(sender)
-    # Guarda coordenadas como inteiro em micrograus para evitar ponto flutuante no contrato.
-    latitude_e6 = int(latitude * 1_000_000)
-    longitude_e6 = int(longitude * 1_000_000)
 
-    tx = contract.functions.registerProperty(
-        matricula,
-        previous_owner or "",
-        current_owner,
-        latitude_e6,
-        longitude_e6,
-    ).build_transaction(
-        {
-            "from": sender,
-            "nonce": nonce,
-            "gas": 500_000,
-            "maxFeePerGas": w3.to_wei("2", "gwei"),
-            "maxPriorityFeePerGas": w3.to_wei("1", "gwei"),
+def root_anchored_at(root: str) -> int:
+    """anchoredAt(root) do contrato: timestamp da ancoragem ou 0 se a raiz não foi ancorada."""
+    backend = chain_backend()
+    if backend == "mock":
+        raise OnchainReadUnavailable("modo mock não tem estado on-chain")
+    if backend == "sim":
+        from .chain_sim import get_simulated_chain
+
+        return get_simulated_chain().anchored_at(root)
+    contract = _get_contract(_get_web3())
+    return contract.functions.anchoredAt(bytes.fromhex(root.removeprefix("0x"))).call()
+
+
+def get_transaction_receipt(tx_hash: str) -> dict | None:
+    """Recibo da transação ou None se ainda pendente (mock confirma na hora)."""
+    backend = chain_backend()
+    if backend == "mock":
+        return {"transactionHash": tx_hash, "status": 1, "blockNumber": None}
+    if backend == "sim":
+        from .chain_sim import get_simulated_chain
+
+        return get_simulated_chain().get_receipt(tx_hash)
+
+    from web3.exceptions import TransactionNotFound
+
+    try:
+        return dict(_get_web3().eth.get_transaction_receipt(tx_hash))
+    except TransactionNotFound:
+        return None
+
+
+def transaction_status(tx_hash: str) -> str:
+    """
+    "confirmed" ou "reverted" pelo recibo; sem recibo, "pending" se o nó conhece
+    a transação (mempool) e "unknown" se não (nunca chegou ou foi descartada).
+    """
+    receipt = get_transaction_receipt(tx_hash)
+    if receipt is not None:
+        return "confirmed" if receipt.get("status", 1) else "reverted"
+    if chain_backend() == "sim":
+        from .chain_sim import get_simulated_chain
+
+        return "pending" if get_simulated_chain().knows(tx_hash) else "unknown"
+
+    from web3.exceptions import TransactionNotFound
+
+    try:
+        _get_web3().eth.get_transaction(tx_hash)
+    except TransactionNotFound:
+        return "unknown"
+    return "pending"
+
+
+# --- leituras ------------------------------------------------------------------------
+
+
+class OnchainReadUnavailable(RuntimeError):
+    """Backend sem estado consultável (modo mock)."""
+
+
+def current_block_number() -> int:
+    backend = chain_backend()
+    if backend == "mock":
+        raise OnchainReadUnavailable("modo mock não tem estado on-chain")
+    if backend == "sim":
+        from .chain_sim import get_simulated_chain
+
+        return get_simulated_chain().block_number()
+    return _get_web3().eth.block_number
+
+
+def _normalize_property(values: dict) -> dict | None:
+    if not values.get("registered_at"):
+        return None
+    return {
+        "previous_owner": (values.get("previous_owner") or "").lower() or None,
+        "current_owner": (values.get("current_owner") or "").lower(),
+        "latitude_e6": int(values["latitude_e6"]),
+        "longitude_e6": int(values["longitude_e6"]),
+        "registered_at": int(values["registered_at"]),
+        "submitted_by": (values.get("submitted_by") or "").lower(),
+    }
+
+
+def read_properties_onchain(
+    matriculas: list[str], block: int | None = None, batch_size: int = 100
+) -> tuple[int, dict[str, dict | None]]:
+    """
+    Lê `properties(matricula)` de várias matrículas com uma chamada por lote
+    (Multicall3.aggregate3) fixada num bloco. Devolve (bloco, {matrícula: struct
+    normalizada ou None se não registrada}).
+    """
+    backend = chain_backend()
+    if backend == "mock":
+        raise OnchainReadUnavailable("modo mock não tem estado on-chain")
+    if backend == "sim":
+        from .chain_sim import get_simulated_chain
+
+        keys = ["0x" + matricula_hash(m).hex() for m in matriculas]
+        number, values = get_simulated_chain().read_state(keys)
+        return number, {
+            m: _normalize_property(v) if v else None for m, v in zip(matriculas, values)
         }
+
+    w3 = _get_web3()
+    contract = _get_contract(w3)
+    block = w3.eth.block_number if block is None else block
+    version = contract_version()
+    getter = next(item for item in registry_abi(version) if item["name"] == "properties")
+    output_types = [out["type"] for out in getter["outputs"]]
+    output_names = [out["name"] for out in getter["outputs"]]
+    multicall = w3.eth.contract(address=w3.to_checksum_address(MULTICALL_ADDRESS), abi=MULTICALL3_ABI)
+
+    out: dict[str, dict | None] = {}
+    for start in range(0, len(matriculas), batch_size):
+        chunk = matriculas[start : start + batch_size]
+        calls = [
+            (
+                contract.address,
+                True,
+                contract.encodeABI(
+                    fn_name="properties", args=[matricula_hash(m) if version == 2 else m]
+                ),
+            )
+            for m in chunk
+        ]
+        results = multicall.functions.aggregate3(calls).call(block_identifier=block)
+        for matricula, (success, data) in zip(chunk, results):
+            if not success or not data:
+                out[matricula] = None
+                continue
+            raw = dict(zip(output_names, w3.codec.decode(output_types, data)))
+            out[matricula] = _normalize_property(
+                {
+                    "previous_owner": raw["previousOwner"],
+                    "current_owner": raw["currentOwner"],
+                    "latitude_e6": raw["latitudeE6"],
+                    "longitude_e6": raw["longitudeE6"],
+                    "registered_at": raw["registeredAt"],
+                    "submitted_by": raw["submittedBy"],
+                }
+            )
+    return block, out
+
+
+def registered_since(from_block: int, to_block: int) -> set[str]:
+    """keccak256 (0x…) das matrículas com PropertyRegistered no intervalo de blocos."""
+    backend = chain_backend()
+    if backend == "mock":
+        raise OnchainReadUnavailable("modo mock não tem estado on-chain")
+    if backend == "sim":
+        from .chain_sim import get_simulated_chain
+
+        return set(get_simulated_chain().registered_keys(from_block, to_block))
+
+    w3 = _get_web3()
+    contract = _get_contract(w3)
+    topic0 = "0x" + keccak(PROPERTY_REGISTERED_SIGNATURES[contract_version()].encode()).hex()
+    logs = w3.eth.get_logs(
+        {"address": contract.address, "fromBlock": from_block, "toBlock": to_block, "topics": [topic0]}
+    )
+    return {"0x" + bytes(log["topics"][1]).hex() for log in logs}
+
+
+def _submit_simulated(
+    *,
+    matricula: str,
+    previous_owner: Optional[str],
+    current_owner: str,
+    latitude: float,
+    longitude: float,
+) -> str:
+    from .chain_sim import get_simulated_chain
+
+    args = encode_register_args(
+        matricula=matricula,
+        previous_owner=previous_owner,
+        current_owner=current_owner,
+        latitude=latitude,
+        longitude=longitude,
+    )
+    calldata = json.dumps(args, default=lambda b: "0x" + b.hex())
+    # O nó simulado aplica a escrita na inclusão, para leituras/eventos como numa rede real.
+    effect = {
+        "key": "0x" + matricula_hash(matricula).hex(),
+        "value": {
+            "previous_owner": (previous_owner or "").lower(),
+            "current_owner": current_owner.lower(),
+            "latitude_e6": int(latitude * 1_000_000),
+            "longitude_e6": int(longitude * 1_000_000),
+        },
+    }
+    return get_simulated_chain().submit(
+        calldata,
+        sender=os.getenv("ETH_FROM_ADDRESS", "0x" + "0" * 40),
+        to=os.getenv("PROPERTY_CONTRACT_ADDRESS"),
+        effect=effect,
+    )
+
+
+def _send_register_tx(
+    *,
+    matricula: str,
+    previous_owner: Optional[str],
+    current_owner: str,
+    latitude: float,
+    longitude: float,
+    on_signed: Callable[[str], None] | None = None,
+) -> str:
+    args = encode_register_args(
+        matricula=matricula,
+        previous_owner=previous_owner,
+        current_owner=current_owner,
+        latitude=latitude,
+        longitude=longitude,
     )
+    w3 = _get_web3()
+    contract = _get_contract(w3)
+    # A v2 grava 3 slots em vez de ~12; o limite acompanha.
+    gas = 150_000 if contract_version() == 2 else 500_000
+    return _sign_and_send(w3, contract.functions.registerProperty(*args), gas=gas, on_signed=on_signed)
 
-    signed = w3.eth.account.sign_transaction(tx, private_key=private_key)
-    tx_hash = w3.eth.send_raw_transaction(signed.rawTransaction)
+
+def _sender_address() -> str:
+    from eth_account import Account
+    from web3 import Web3
+
+    private_key = os.getenv("ETH_PRIVATE_KEY")
+    from_address = os.getenv("ETH_FROM_ADDRESS")
+    if not private_key:
+        raise RuntimeError("ETH_PRIVATE_KEY não configurada")
+    return Web3.to_checksum_address(from_address) if from_address else Account.from_key(private_key).address
+
+
+# Os workers da fila "chain" enviam da mesma conta: cada um lendo o nonce no nó
+# pegaria o mesmo número. Os envios do processo passam por este lock e o nonce
+# é numerado localmente a partir do "pending" da conta. `on_signed(tx_hash)` deixa
+# quem chama gravar o hash antes do envio; se levantar, nada é enviado.
+_send_lock = threading.Lock()
+_next_nonce: int | None = None
+
+
+def _sign_and_send(w3: "Web3", call, *, gas: int, on_signed: Callable[[str], None] | None = None) -> str:
+    global _next_nonce
+    sender = _sender_address()
+    private_key = os.getenv("ETH_PRIVATE_KEY")
+    with _send_lock:
+        try:
+            if _next_nonce is None:
+                _next_nonce = w3.eth.get_transaction_count(sender, "pending")
+            tx = call.build_transaction(
+                {
+                    "from": sender,
+                    "nonce": _next_nonce,
+                    "gas": gas,
+                    "maxFeePerGas": w3.to_wei("2", "gwei"),
+                    "maxPriorityFeePerGas": w3.to_wei("1", "gwei"),
+                }
+            )
+            signed = w3.eth.account.sign_transaction(tx, private_key=private_key)
+            if on_signed is not None:
+                on_signed(signed.hash.hex())
+            tx_hash = w3.eth.send_raw_transaction(signed.rawTransaction)
+        except Exception:
+            # Nonce recusado (ex.: outro processo usou a conta) ou falha de rede: relê no próximo envio.
+            _next_nonce = None
+            raise
+        _next_nonce += 1
     return tx_hash.hex()
@@ -0,0 +1,410 @@
+"""
+Nó Ethereum simulado para testes de carga e planejamento de capacidade.
+
+Modela latência de submissão, tempo de bloco, capacidade do mempool e por bloco,
+e taxas de falha (RPC recusa) e de revert (incluída com status 0). Pode rodar em
+processo (CHAIN_BACKEND=sim) ou como stub JSON-RPC local:
+
+    python -m app.chain_sim --port 8545
+
+e o backend aponta para ele com ETH_MOCK=false ETH_RPC_URL=http://localhost:8545.
+Com `--port 8545,8546 --latency-ms 20,400` sobe vários endpoints da mesma
+chain (ETH_RPC_URLS), para testar o failover de app/rpc.py.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class SimulatedRpcError(RuntimeError):
+    """Falha de submissão (equivalente a erro JSON-RPC do provedor)."""
+
+
+class MempoolFull(SimulatedRpcError):
+    pass
+
+
+@dataclass
+class SimConfig:
+    submit_latency_ms: float = float(os.getenv("SIM_SUBMIT_LATENCY_MS", "120"))
+    latency_jitter_ms: float = float(os.getenv("SIM_LATENCY_JITTER_MS", "40"))
+    block_time_s: float = float(os.getenv("SIM_BLOCK_TIME_S", "12"))
+    # ~30M gas por bloco / ~150k gas por registerProperty.
+    txs_per_block: int = int(os.getenv("SIM_TXS_PER_BLOCK", "200"))
+    mempool_capacity: int = int(os.getenv("SIM_MEMPOOL_CAPACITY", "5000"))
+    failure_rate: float = float(os.getenv("SIM_FAILURE_RATE", "0"))
+    revert_rate: float = float(os.getenv("SIM_REVERT_RATE", "0"))
+    gas_used: int = int(os.getenv("SIM_GAS_USED", "148000"))
+    chain_id: int = int(os.getenv("SIM_CHAIN_ID", "11155111"))
+    seed: int | None = int(os.environ["SIM_SEED"]) if os.getenv("SIM_SEED") else None
+
+
+def _hash(*parts) -> str:
+    h = hashlib.sha3_256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else str(part).encode())
+    return "0x" + h.hexdigest()
+
+
+@dataclass
+class _PendingTx:
+    tx_hash: str
+    sender: str
+    to: str | None
+    submitted_at: float
+    # Escrita de estado aplicada na inclusão (ex.: registerProperty).
+    effect: dict | None = None
+
+
+@dataclass
+class Block:
+    number: int
+    hash: str
+    parent_hash: str
+    timestamp: float
+    transactions: list[str] = field(default_factory=list)
+
+
+class SimulatedChain:
+    """
+    Blocos são minerados de forma preguiçosa: a cada chamada, produz os blocos
+    cujo intervalo já passou desde o último, sem thread de fundo.
+    """
+
+    def __init__(self, config: SimConfig | None = None):
+        self.config = config or SimConfig()
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._mempool: deque[_PendingTx] = deque()
+        self._receipts: dict[str, dict] = {}
+        self._nonces: dict[str, int] = {}
+        self._known_raw: set[str] = set()
+        # Estado do contrato (chave -> struct) e eventos PropertyRegistered (bloco, chave).
+        self.state: dict[str, dict] = {}
+        self._events: deque[tuple[int, str]] = deque(maxlen=100_000)
+        # anchoredAt do contrato: raiz -> timestamp do bloco.
+        self.anchored: dict[str, int] = {}
+        genesis = Block(0, _hash("genesis", self.config.chain_id), "0x" + "0" * 64, time.time())
+        # Só os blocos recentes ficam em memória; recibos continuam consultáveis.
+        self.blocks: deque[Block] = deque([genesis], maxlen=10_000)
+
+    # --- produção de blocos ------------------------------------------------
+
+    def _advance(self, now: float):
+        head = self.blocks[-1]
+        due = int((now - head.timestamp) // self.config.block_time_s)
+        for _ in range(due):
+            ts = head.timestamp + self.config.block_time_s
+            block = Block(head.number + 1, _hash(head.hash, ts), head.hash, ts)
+            for index in range(min(self.config.txs_per_block, len(self._mempool))):
+                tx = self._mempool.popleft()
+                status = 0 if self._rng.random() < self.config.revert_rate else 1
+                block.transactions.append(tx.tx_hash)
+                logs = []
+                if status and tx.effect is not None and "anchor" in tx.effect:
+                    # anchorRoot: require(anchoredAt[root] == 0, "Raiz ja ancorada").
+                    if tx.effect["anchor"] in self.anchored:
+                        status = 0
+                    else:
+                        self.anchored[tx.effect["anchor"]] = int(ts)
+                elif status and tx.effect is not None:
+                    key = tx.effect["key"]
+                    self.state[key] = {**tx.effect["value"], "registered_at": int(ts), "submitted_by": tx.sender}
+                    self._events.append((block.number, key))
+                    logs.append({"event": "PropertyRegistered", "topics": [key], "blockNumber": block.number})
+                self._receipts[tx.tx_hash] = {
+                    "transactionHash": tx.tx_hash,
+                    "transactionIndex": index,
+                    "blockNumber": block.number,
+                    "blockHash": block.hash,
+                    "from": tx.sender,
+                    "to": tx.to,
+                    "status": status,
+                    "gasUsed": self.config.gas_used if status else self.config.gas_used // 3,
+                    "cumulativeGasUsed": self.config.gas_used * (index + 1),
+                    "effectiveGasPrice": 2_000_000_000,
+                    "logs": logs,
+                    "inclusionDelay": round(ts - tx.submitted_at, 3),
+                }
+            self.blocks.append(block)
+            head = block
+
+    # --- API ---------------------------------------------------------------
+
+    def _latency(self):
+        jitter = self._rng.uniform(-self.config.latency_jitter_ms, self.config.latency_jitter_ms)
+        delay = max(self.config.submit_latency_ms + jitter, 0) / 1000
+        if delay:
+            time.sleep(delay)
+
+    def submit(
+        self,
+        payload: bytes | str,
+        sender: str = "0x0",
+        to: str | None = None,
+        effect: dict | None = None,
+        tx_hash: str | None = None,
+    ) -> str:
+        """Envia uma transação; devolve o hash ou levanta SimulatedRpcError/MempoolFull."""
+        self._latency()
+        with self._lock:
+            now = time.time()
+            self._advance(now)
+            if self._rng.random() < self.config.failure_rate:
+                raise SimulatedRpcError("simulated RPC failure")
+            if len(self._mempool) >= self.config.mempool_capacity:
+                raise MempoolFull("txpool is full")
+            nonce = self._nonces.get(sender.lower(), 0)
+            self._nonces[sender.lower()] = nonce + 1
+            tx_hash = tx_hash or _hash(payload, sender, nonce, now)
+            self._mempool.append(_PendingTx(tx_hash, sender, to, now, effect))
+            return tx_hash
+
+    def submit_raw(self, raw: bytes, sender: str) -> str:
+        """
+        Transação assinada recebida via JSON-RPC. Como num nó real, o hash é o
+        keccak dos bytes e reenviar a mesma transação (broadcast para vários
+        endpoints do mesmo nó) falha com "already known".
+        """
+        from eth_utils import keccak
+
+        tx_hash = "0x" + keccak(raw).hex()
+        with self._lock:
+            if tx_hash in self._known_raw:
+                raise SimulatedRpcError("already known")
+            self._known_raw.add(tx_hash)
+        try:
+            return self.submit(raw, sender=sender, tx_hash=tx_hash)
+        except SimulatedRpcError:
+            with self._lock:
+                self._known_raw.discard(tx_hash)
+            raise
+
+    def get_receipt(self, tx_hash: str) -> dict | None:
+        with self._lock:
+            self._advance(time.time())
+            return self._receipts.get(tx_hash)
+
+    def knows(self, tx_hash: str) -> bool:
+        """Transação no mempool ou já incluída."""
+        with self._lock:
+            self._advance(time.time())
+            return tx_hash in self._receipts or any(tx.tx_hash == tx_hash for tx in self._mempool)
+
+    def anchored_at(self, root: str) -> int:
+        with self._lock:
+            self._advance(time.time())
+            return self.anchored.get(root, 0)
+
+    def wait_for_receipt(self, tx_hash: str, timeout: float = 120, poll: float = 0.5) -> dict:
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            receipt = self.get_receipt(tx_hash)
+            if receipt is not None:
+                return receipt
+            time.sleep(poll)
+        raise TimeoutError(f"tx {tx_hash} não incluída em {timeout}s")
+
+    def block_number(self) -> int:
+        with self._lock:
+            self._advance(time.time())
+            return self.blocks[-1].number
+
+    def read_state(self, keys: list[str]) -> tuple[int, list[dict | None]]:
+        """Leitura em lote no bloco atual (equivalente a um multicall de `properties`)."""
+        with self._lock:
+            self._advance(time.time())
+            return self.blocks[-1].number, [self.state.get(key) for key in keys]
+
+    def registered_keys(self, from_block: int, to_block: int) -> list[str]:
+        with self._lock:
+            return [key for number, key in self._events if from_block <= number <= to_block]
+
+    def nonce(self, sender: str) -> int:
+        with self._lock:
+            return self._nonces.get(sender.lower(), 0)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._advance(time.time())
+            return {
+                "block_number": self.blocks[-1].number,
+                "mempool": len(self._mempool),
+                "mempool_capacity": self.config.mempool_capacity,
+                "included": len(self._receipts),
+            }
+
+
+_default: SimulatedChain | None = None
+_default_lock = threading.Lock()
+
+
+def get_simulated_chain() -> SimulatedChain:
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = SimulatedChain()
+        return _default
+
+
+# --- stub JSON-RPC ---------------------------------------------------------------
+
+
+def _hex(value: int) -> str:
+    return hex(value)
+
+
+def _rpc_receipt(receipt: dict) -> dict:
+    out = dict(receipt)
+    for key in ("transactionIndex", "blockNumber", "status", "gasUsed", "cumulativeGasUsed", "effectiveGasPrice"):
+        out[key] = _hex(out[key])
+    out.pop("inclusionDelay", None)
+    out["type"] = "0x2"
+    out["logsBloom"] = "0x" + "0" * 512
+    out["contractAddress"] = None
+    return out
+
+
+def _recover_sender(raw_hex: str) -> str:
+    try:
+        from eth_account import Account
+
+        return Account.recover_transaction(raw_hex)
+    except Exception:
+        return "0x" + "0" * 40
+
+
+def handle_rpc(chain: SimulatedChain, request: dict) -> dict:
+    method, params = request.get("method"), request.get("params") or []
+    result = None
+    try:
+        if method == "web3_clientVersion":
+            result = "chain-sim/1.0"
+        elif method == "net_version":
+            result = str(chain.config.chain_id)
+        elif method == "eth_chainId":
+            result = _hex(chain.config.chain_id)
+        elif method == "eth_blockNumber":
+            result = _hex(chain.block_number())
+        elif method == "eth_gasPrice":
+            result = _hex(2_000_000_000)
+        elif method == "eth_maxPriorityFeePerGas":
+            result = _hex(1_000_000_000)
+        elif method == "eth_estimateGas":
+            result = _hex(chain.config.gas_used)
+        elif method == "eth_getTransactionCount":
+            result = _hex(chain.nonce(params[0]))
+        elif method == "eth_sendRawTransaction":
+            sender = _recover_sender(params[0])
+            result = chain.submit_raw(bytes.fromhex(params[0].removeprefix("0x")), sender=sender)
+        elif method == "eth_getTransactionReceipt":
+            receipt = chain.get_receipt(params[0])
+            result = _rpc_receipt(receipt) if receipt else None
+        elif method == "eth_getTransactionByHash":
+            result = {"hash": params[0], "blockNumber": None} if chain.knows(params[0]) else None
+        elif method == "eth_getBlockByNumber":
+            number = chain.block_number() if params[0] in ("latest", "pending") else int(params[0], 16)
+            offset = number - chain.blocks[0].number
+            if not 0 <= offset < len(chain.blocks):
+                return {"jsonrpc": "2.0", "id": request.get("id"), "result": None}
+            block = chain.blocks[offset]
+            result = {
+                "number": _hex(block.number),
+                "hash": block.hash,
+                "parentHash": block.parent_hash,
+                "timestamp": _hex(int(block.timestamp)),
+                "transactions": block.transactions,
+                "baseFeePerGas": _hex(1_000_000_000),
+                "gasLimit": _hex(30_000_000),
+                "gasUsed": _hex(chain.config.gas_used * len(block.transactions)),
+                "extraData": "0x",
+            }
+        else:
+            return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32601, "message": "Method not found"}}
+    except SimulatedRpcError as exc:
+        return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32000, "message": str(exc)}}
+    return {"jsonrpc": "2.0", "id": request.get("id"), "result": result}
+
+
+def serve(
+    host: str,
+    port: int,
+    chain: SimulatedChain | None = None,
+    latency_ms: float = 0.0,
+    jitter_ms: float = 0.0,
+    rate_limit: float = 0.0,
+) -> ThreadingHTTPServer:
+    """
+    Stub JSON-RPC. `latency_ms`/`jitter_ms` atrasam toda resposta (provedor
+    lento) e `rate_limit` é a fração de requisições recusadas com HTTP 429,
+    para exercitar o failover de app/rpc.py. Vários stubs podem servir o
+    mesmo `chain`.
+    """
+    chain = chain or SimulatedChain()
+    rng = random.Random()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            delay = max(latency_ms + rng.uniform(-jitter_ms, jitter_ms), 0) / 1000
+            if delay:
+                time.sleep(delay)
+            if rate_limit and rng.random() < rate_limit:
+                self.send_response(429)
+                self.send_header("Retry-After", "1")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if isinstance(body, list):
+                out = [handle_rpc(chain, item) for item in body]
+            else:
+                out = handle_rpc(chain, body)
+            data = json.dumps(out).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument(
+        "--port", default="8545", help="Porta ou lista (8545,8546): vários endpoints da mesma chain simulada"
+    )
+    parser.add_argument("--latency-ms", default="0", help="Atraso por resposta; lista alinhada com --port")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Fração de respostas HTTP 429")
+    args = parser.parse_args(argv)
+
+    ports = [int(p) for p in args.port.split(",")]
+    latencies = [float(v) for v in args.latency_ms.split(",")]
+    latencies += [latencies[-1]] * (len(ports) - len(latencies))
+    chain = SimulatedChain()
+    servers = [
+        serve(args.host, port, chain, latency_ms=latency, jitter_ms=args.jitter_ms, rate_limit=args.rate_limit)
+        for port, latency in zip(ports, latencies)
+    ]
+    for port, latency in zip(ports, latencies):
+        print(f"chain-sim JSON-RPC em http://{args.host}:{port} (latência {latency:g}ms)")
+    print(f"config: {SimConfig()}")
+    for server in servers[1:]:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    servers[0].serve_forever()
+
+
+if __name__ == "__main__":
+    main()
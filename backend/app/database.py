@@ -1,19 +1,209 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from starlette.requests import Request
+from starlette.responses import Response
+import itertools
 import os
+import threading
+import time
+
+from app.observability import DB_READ_ROUTE, get_logger
 
 DATABASE_URL = os.getenv("DATABASE_URL")
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+# Com vários workers o total de conexões é workers * (pool_size + max_overflow).
+_pool_kwargs = {}
+if os.getenv("DB_POOL_SIZE"):
+    _pool_kwargs["pool_size"] = int(os.getenv("DB_POOL_SIZE"))
+if os.getenv("DB_MAX_OVERFLOW"):
+    _pool_kwargs["max_overflow"] = int(os.getenv("DB_MAX_OVERFLOW"))
+# SQL compilado por forma de statement (ver app/repository.py); 500 é o padrão do SQLAlchemy.
+_pool_kwargs["query_cache_size"] = int(os.getenv("DB_QUERY_CACHE_SIZE", "500"))
+# psycopg 3 (postgresql+psycopg://) prepara no servidor o statement executado
+# esse número de vezes na conexão; vazio desliga. psycopg2 não tem prepare.
+DB_PREPARE_THRESHOLD = os.getenv("DB_PREPARE_THRESHOLD", "5")
+
+
+def _engine_kwargs(url: str) -> dict:
+    kwargs = dict(_pool_kwargs)
+    if make_url(url).get_driver_name() == "psycopg":
+        kwargs["connect_args"] = {"prepare_threshold": int(DB_PREPARE_THRESHOLD) if DB_PREPARE_THRESHOLD else None}
+    return kwargs
+
+
+engine = create_engine(DATABASE_URL, pool_pre_ping=True, **_engine_kwargs(DATABASE_URL))
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
+# Réplicas só de leitura, separadas por vírgula. Sem elas tudo vai para o primário.
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# Réplica com atraso acima disso (ou fora do ar) sai do rodízio até a próxima checagem.
+DB_REPLICA_MAX_LAG_S = float(os.getenv("DB_REPLICA_MAX_LAG_S", "5"))
+DB_REPLICA_CHECK_S = float(os.getenv("DB_REPLICA_CHECK_S", "2"))
+# Depois de uma escrita o cliente lê do primário por esse tempo (cookie).
+DB_READ_YOUR_WRITES_S = float(os.getenv("DB_READ_YOUR_WRITES_S", "5"))
+PRIMARY_COOKIE = "db_primary_until"
+
+replica_engines = [create_engine(url, pool_pre_ping=True, **_engine_kwargs(url)) for url in DATABASE_REPLICA_URLS]
+
+# Bancos extras para propriedades, propostas e transferências, distribuídas por
+# hash da matrícula (ver app/sharding.py). DATABASE_URL é o shard "s0" e guarda
+# também as tabelas globais (usuários, jobs, PoS, âncoras).
+DATABASE_SHARD_URLS = [url.strip() for url in os.getenv("DATABASE_SHARD_URLS", "").split(",") if url.strip()]
+shard_engines = {"s0": engine}
+for _index, _url in enumerate(DATABASE_SHARD_URLS, start=1):
+    shard_engines[f"s{_index}"] = create_engine(_url, pool_pre_ping=True, **_engine_kwargs(_url))
+
+log = get_logger(__name__)
+
+_PG_LAG = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() THEN 0 "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class ReplicaRouter:
+    """Rodízio entre réplicas, pulando as atrasadas ou fora do ar."""
+
+    def __init__(self, engines, max_lag: float = DB_REPLICA_MAX_LAG_S, check_interval: float = DB_REPLICA_CHECK_S):
+        self.engines = engines
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._cursor = itertools.count()
+        # índice -> (checado em, lag em segundos ou None se falhou)
+        self._state: dict[int, tuple[float, float | None]] = {}
+        self._locks = [threading.Lock() for _ in engines]
+
+    def _lag(self, index: int) -> float | None:
+        replica = self.engines[index]
+        try:
+            with replica.connect() as conn:
+                if replica.dialect.name == "postgresql":
+                    return float(conn.scalar(_PG_LAG))
+                # Outros bancos não expõem atraso; só valida a conexão.
+                conn.execute(text("SELECT 1"))
+                return 0.0
+        except Exception as exc:
+            log.warning("db.replica_unavailable", replica=index, error=str(exc))
+            return None
+
+    def _usable(self, index: int) -> bool:
+        checked_at, lag = self._state.get(index, (0.0, None))
+        now = time.monotonic()
+        # Só uma thread checa por vez; as demais usam o último resultado.
+        if now - checked_at >= self.check_interval and self._locks[index].acquire(blocking=False):
+            try:
+                lag = self._lag(index)
+                self._state[index] = (now, lag)
+            finally:
+                self._locks[index].release()
+        return lag is not None and lag <= self.max_lag
+
+    def pick(self):
+        """Engine da próxima réplica utilizável, ou None para usar o primário."""
+        if not self.engines:
+            return None
+        start = next(self._cursor)
+        for offset in range(len(self.engines)):
+            index = (start + offset) % len(self.engines)
+            if self._usable(index):
+                return self.engines[index]
+        return None
+
+    def status(self) -> list[dict]:
+        return [
+            {"replica": index, "lag_s": lag, "checked_at": checked_at}
+            for index, (checked_at, lag) in sorted(self._state.items())
+        ]
+
+
+replica_router = ReplicaRouter(replica_engines)
+
 
 class Base(DeclarativeBase):
     pass
 
 
-def get_db():
+def mark_primary_reads(response: Response):
+    """Faz o cliente ler do primário por DB_READ_YOUR_WRITES_S (só com réplicas)."""
+    if replica_engines:
+        until = time.time() + DB_READ_YOUR_WRITES_S
+        response.set_cookie(PRIMARY_COOKIE, f"{until:.3f}", max_age=max(int(DB_READ_YOUR_WRITES_S), 1))
+
+
+def get_db(request: Request, response: Response):
+    """Sessão no primário. Em requisições de escrita marca o cliente para ler do primário por um tempo."""
+    if request.method not in ("GET", "HEAD"):
+        mark_primary_reads(response)
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def _wants_primary(request: Request) -> bool:
+    if request.headers.get("x-consistency", "").lower() == "strong":
+        return True
+    try:
+        return float(request.cookies.get(PRIMARY_COOKIE, "0")) > time.time()
+    except ValueError:
+        return False
+
+
+def get_read_db(request: Request):
+    """
+    Sessão para rotas só de leitura: réplica em rodízio, ou o primário se não
+    houver réplica utilizável, se o cliente escreveu há pouco (cookie) ou se
+    pediu `X-Consistency: strong`.
+    """
+    # Réplicas por shard ainda não existem: com sharding as leituras vão aos primários.
+    replica = None if DATABASE_SHARD_URLS or _wants_primary(request) else replica_router.pick()
+    DB_READ_ROUTE.labels(target="replica" if replica is not None else "primary").inc()
+    db = SessionLocal(bind=replica) if replica is not None else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def dispose_after_fork():
+    """Descarta conexões herdadas do processo pai sem fechá-las (são dele)."""
+    for shard in shard_engines.values():
+        shard.dispose(close=False)
+    for replica in replica_engines:
+        replica.dispose(close=False)
+
+
+def should_create_schema() -> bool:
+    """
+    DB_CREATE_ALL (padrão true) liga o create_all no startup. Lido em runtime porque
+    o master do gunicorn cria o schema e desliga a flag antes de fazer fork.
+    Em produção desligue e rode `python -m app.database` (ou migrações) no deploy.
+    """
+    return os.getenv("DB_CREATE_ALL", "true").lower() == "true"
+
+
+def init_schema():
+    """Cria as tabelas que ainda não existem (ambiente simples, sem migrações)."""
+    from app import models  # noqa: F401  registra os modelos no metadata
+
+    # Cada shard recebe o schema inteiro; as tabelas globais só são usadas no s0.
+    for shard in shard_engines.values():
+        Base.metadata.create_all(bind=shard)
+
+
+if DATABASE_SHARD_URLS and __name__ != "__main__":
+    # Importado no fim: app.sharding usa Base, engine e shard_engines deste módulo.
+    from app.sharding import ShardedRegistrySession, install as _install_sharding
+
+    _install_sharding()
+    SessionLocal = sessionmaker(class_=ShardedRegistrySession, autoflush=False, autocommit=False)
+
+
+if __name__ == "__main__":
+    # Como script este módulo é __main__; reimporta para usar o mesmo Base dos modelos.
+    from app.database import init_schema as _init_schema
+
+    _init_schema()
+    print("Schema criado/atualizado.")
@@ -4,6 +4,8 @@ from typing import Annotated
 import jwt
 from fastapi import Depends, Header, HTTPException
 
+from app.observability import JWT_DECODE_LATENCY, timed
+
 
 JWT_SECRET = os.getenv("JWT_SECRET", "changeme")
 
@@ -13,7 +15,8 @@ async def get_current_role(authorization: Annotated[str | None, Header()] = None
         raise HTTPException(status_code=401, detail="Missing token")
     token = authorization.split(" ", 1)[1]
     try:
-        data = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+        with timed(JWT_DECODE_LATENCY):
+            data = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
         return data.get("role", "USER")
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid token")
@@ -27,7 +30,43 @@ async def get_current_user(
         raise HTTPException(status_code=401, detail="Missing token")
     token = authorization.split(" ", 1)[1]
     try:
-        data = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+        with timed(JWT_DECODE_LATENCY):
+            data = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
         return data
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid token")
+
+
+def decode_token(token: str | None) -> dict | None:
+    """Decodifica o JWT sem levantar HTTPException (uso em SSE/WebSocket)."""
+    if not token:
+        return None
+    try:
+        with timed(JWT_DECODE_LATENCY):
+            return jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+    except Exception:
+        return None
+
+
+async def get_stream_user(
+    authorization: Annotated[str | None, Header()] = None,
+    token: str | None = None,
+) -> dict:
+    """
+    Igual a get_current_user, mas aceita `?token=` porque o EventSource
+    do navegador não permite enviar cabeçalhos.
+    """
+    if authorization and authorization.startswith("Bearer "):
+        token = authorization.split(" ", 1)[1]
+    data = decode_token(token)
+    if data is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return data
+
+
+async def require_admin(
+    x_admin_secret: Annotated[str | None, Header()] = None,
+) -> None:
+    """Rotas operacionais: exige o mesmo ADMIN_SECRET de /admin/assign-role no cabeçalho."""
+    if x_admin_secret != os.getenv("ADMIN_SECRET", "changeme-admin"):
+        raise HTTPException(status_code=403, detail="Forbidden")
@@ -0,0 +1,180 @@
+import asyncio
+import json
+import os
+import select
+import threading
+import time
+from typing import Iterable
+
+from sqlalchemy import text
+
+from app.database import engine
+from app.jobs import jobs
+from app.observability import get_logger
+
+
+# Canal usado no LISTEN/NOTIFY para espalhar eventos entre workers.
+EVENTS_CHANNEL = os.getenv("EVENTS_CHANNEL", "app_events")
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+EVENTS_KEEPALIVE_SEC = float(os.getenv("EVENTS_KEEPALIVE_SEC", "15"))
+
+
+def _default_backend() -> str:
+    url = os.getenv("DATABASE_URL") or ""
+    return "postgres" if url.startswith("postgresql") else "local"
+
+
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", _default_backend()).lower()
+
+log = get_logger(__name__)
+
+
+def wallet_channel(wallet: str) -> str:
+    return f"wallet:{wallet.lower()}"
+
+
+def role_channel(role: str) -> str:
+    return f"role:{role.upper()}"
+
+
+class _Subscriber:
+    def __init__(self, channels: set[str], loop: asyncio.AbstractEventLoop):
+        self.channels = channels
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=EVENTS_QUEUE_SIZE)
+
+    def _put(self, event: dict):
+        # Consumidor lento: descarta o evento mais antigo para não travar o publicador.
+        if self.queue.full():
+            try:
+                self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+        self.queue.put_nowait(event)
+
+    def deliver(self, event: dict):
+        self.loop.call_soon_threadsafe(self._put, event)
+
+
+class EventBus:
+    """
+    Pub/sub em processo. Handlers síncronos publicam a partir do threadpool;
+    cada assinante (SSE/WebSocket) recebe apenas eventos dos seus canais.
+    Com backend "postgres" a publicação passa por NOTIFY e um listener por
+    worker entrega localmente, garantindo fan-out entre processos.
+    """
+
+    def __init__(self, backend: str = "local", channel: str = EVENTS_CHANNEL):
+        self.backend = backend
+        self.channel = channel
+        self._subscribers: dict[str, set[_Subscriber]] = {}
+        self._lock = threading.Lock()
+        self._listener: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    def subscribe(self, channels: Iterable[str]) -> _Subscriber:
+        sub = _Subscriber(set(channels), asyncio.get_running_loop())
+        with self._lock:
+            for ch in sub.channels:
+                self._subscribers.setdefault(ch, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: _Subscriber):
+        with self._lock:
+            for ch in sub.channels:
+                subs = self._subscribers.get(ch)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._subscribers[ch]
+
+    def publish(self, channels: Iterable[str], event: dict):
+        """Publica `event` para os canais informados (não bloqueia em consumidores)."""
+        message = {"channels": sorted(set(channels)), "event": {**event, "ts": time.time()}}
+        if self.backend == "postgres":
+            try:
+                with engine.begin() as conn:
+                    conn.execute(
+                        text("SELECT pg_notify(:channel, :payload)"),
+                        {"channel": self.channel, "payload": json.dumps(message)},
+                    )
+                return
+            except Exception as exc:
+                log.warning("events.notify_failed", error=str(exc))
+        self._dispatch(message)
+
+    def _dispatch(self, message: dict):
+        targets: set[_Subscriber] = set()
+        with self._lock:
+            for ch in message["channels"]:
+                targets.update(self._subscribers.get(ch, ()))
+        for sub in targets:
+            try:
+                sub.deliver(message["event"])
+            except RuntimeError:
+                # Loop do assinante já encerrado.
+                self.unsubscribe(sub)
+
+    def start(self):
+        if self.backend != "postgres" or self._listener is not None:
+            return
+        self._stop.clear()
+        self._listener = threading.Thread(target=self._listen, name="events-listener", daemon=True)
+        self._listener.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._listener is not None:
+            self._listener.join(timeout=5)
+            self._listener = None
+
+    def _listen(self):
+        while not self._stop.is_set():
+            raw = None
+            try:
+                raw = engine.raw_connection()
+                conn = raw.driver_connection
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f'LISTEN "{self.channel}"')
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            self._dispatch(json.loads(notify.payload))
+                        except Exception as exc:
+                            log.warning("events.invalid_payload", error=str(exc))
+            except Exception as exc:
+                log.warning("events.listener_reconnect", error=str(exc))
+                self._stop.wait(2.0)
+            finally:
+                if raw is not None:
+                    try:
+                        raw.invalidate()
+                    except Exception:
+                        pass
+
+
+bus = EventBus(backend=EVENTS_BACKEND)
+
+
+def notify_wallets(wallets: Iterable[str | None], event: dict, roles: Iterable[str] = ()):
+    """
+    Atalho usado pelos handlers: publica para carteiras e, opcionalmente, papéis.
+    Com o runner de jobs ativo, a publicação (NOTIFY no Postgres) sai da requisição.
+    """
+    channels = {wallet_channel(w) for w in wallets if w}
+    channels.update(role_channel(r) for r in roles)
+    if not channels:
+        return
+    if jobs.running:
+        jobs.enqueue("events.publish", channels=sorted(channels), event=event)
+    else:
+        bus.publish(channels, event)
+
+
+def format_sse(event: dict) -> str:
+    return f"event: {event.get('type', 'message')}\ndata: {json.dumps(event)}\n\n"
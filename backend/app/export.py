@@ -0,0 +1,217 @@
+"""
+Exportação completa para o regulador, em streaming.
+
+Cada chamada exporta uma tabela (propriedades, propostas, transferências ou
+validações PoS) em ordem de id, lida com cursor do lado do servidor
+(`stream_results`) em blocos de EXPORT_CHUNK_ROWS linhas e codificada à medida
+que sai: CSV e NDJSON comprimidos em gzip, Parquet com zstd por row group.
+A memória fica constante no tamanho do bloco e o handler só ocupa uma thread
+enquanto produz cada bloco.
+
+Para retomar uma exportação interrompida (ou dividi-la em partes com
+`limit`), passe em `after_id` o último id recebido; `since`/`until` filtram por
+`created_at`. Como os ids crescem com o tempo, a ordem bate com created_at.
+Tabelas com arquivamento (ver app/archive.py) incluem as linhas dos segmentos
+frios, intercaladas por id com as do banco.
+"""
+import abc
+import csv
+import heapq
+import io
+import itertools
+import os
+import zlib
+from datetime import datetime
+from typing import Iterator
+
+import orjson
+from sqlalchemy import select
+
+from app.archive import ARCHIVED_TABLES, archived_stream, arrow_schema, plain_row
+from app.database import engine, replica_router, shard_engines
+from app.models import PosValidation, Property, Proposal, Transfer
+from app.sharding import is_sharded
+
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "5000"))
+
+EXPORT_TABLES = {
+    "properties": Property,
+    "proposals": Proposal,
+    "transfers": Transfer,
+    "pos_validations": PosValidation,
+}
+
+# formato -> (extensão, content-type)
+EXPORT_FORMATS = {
+    "csv": ("csv.gz", "application/gzip"),
+    "ndjson": ("ndjson.gz", "application/gzip"),
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+
+class _GzipEncoder(abc.ABC):
+    """Comprime em gzip o texto que cada formato gera em `_encode`."""
+
+    def __init__(self, table):
+        self.columns = [column.name for column in table.columns]
+        # wbits=31: cabeçalho gzip, para o arquivo abrir com gunzip/zcat.
+        self._zlib = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    @abc.abstractmethod
+    def _encode(self, rows: list[dict]) -> bytes:
+        """Bytes não comprimidos de um bloco de linhas."""
+
+    def encode(self, rows: list[dict]) -> bytes:
+        return self._zlib.compress(self._encode(rows))
+
+    def finish(self) -> bytes:
+        return self._zlib.flush()
+
+
+class _CsvEncoder(_GzipEncoder):
+    def __init__(self, table):
+        super().__init__(table)
+        self._header = True
+
+    def _encode(self, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if self._header:
+            writer.writerow(self.columns)
+            self._header = False
+        for row in rows:
+            writer.writerow(
+                [
+                    "" if row[name] is None else row[name].isoformat() if isinstance(row[name], datetime) else row[name]
+                    for name in self.columns
+                ]
+            )
+        return buffer.getvalue().encode()
+
+    def finish(self):
+        # Tabela vazia ainda recebe o cabeçalho.
+        head = self._zlib.compress(self._encode([])) if self._header else b""
+        return head + self._zlib.flush()
+
+
+class _NdjsonEncoder(_GzipEncoder):
+    def _encode(self, rows):
+        return b"".join(orjson.dumps(row, option=orjson.OPT_UTC_Z) + b"\n" for row in rows)
+
+
+class _Sink(io.RawIOBase):
+    """Destino do ParquetWriter que é esvaziado a cada row group."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+class _ParquetEncoder:
+    def __init__(self, table):
+        import pyarrow.parquet as pq
+
+        self._schema = arrow_schema(table)
+        self._sink = _Sink()
+        self._writer = pq.ParquetWriter(self._sink, self._schema, compression="zstd")
+
+    def encode(self, rows):
+        import pyarrow as pa
+
+        self._writer.write_table(pa.Table.from_pylist(rows, schema=self._schema))
+        return self._sink.drain()
+
+    def finish(self):
+        self._writer.close()
+        return self._sink.drain()
+
+
+_ENCODERS = {"csv": _CsvEncoder, "ndjson": _NdjsonEncoder, "parquet": _ParquetEncoder}
+
+
+def format_available(fmt: str) -> bool:
+    """Parquet depende do pyarrow (opcional); checado antes de a resposta começar."""
+    if fmt != "parquet":
+        return fmt in _ENCODERS
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def export_stmt(
+    table_name: str,
+    *,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    after_id: int = 0,
+    limit: int | None = None,
+):
+    table = EXPORT_TABLES[table_name].__table__
+    stmt = select(table).where(table.c.id > after_id).order_by(table.c.id)
+    if since is not None:
+        stmt = stmt.where(table.c.created_at >= since)
+    if until is not None:
+        stmt = stmt.where(table.c.created_at < until)
+    if limit:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def _rows(bind, stmt) -> Iterator[dict]:
+    with bind.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=EXPORT_CHUNK_ROWS).execute(stmt)
+        for row in result.mappings():
+            yield plain_row(row)
+
+
+def export_stream(
+    table_name: str,
+    fmt: str,
+    *,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    after_id: int = 0,
+    limit: int | None = None,
+) -> Iterator[bytes]:
+    """Gera os bytes do arquivo; as conexões (réplica, se houver) vivem só durante o streaming."""
+    table = EXPORT_TABLES[table_name].__table__
+    encoder = _ENCODERS[fmt](table)
+    stmt = export_stmt(table_name, since=since, until=until, after_id=after_id, limit=limit)
+    if len(shard_engines) > 1 and is_sharded(table.name):
+        sources = [_rows(shard, stmt) for shard in shard_engines.values()]
+    else:
+        sources = [_rows(replica_router.pick() or engine, stmt)]
+    if table_name in ARCHIVED_TABLES:
+        # Linhas já movidas para arquivos frios (validações PoS antigas, propostas rejeitadas).
+        sources.append(archived_stream(table_name, since=since, until=until, after_id=after_id))
+    # Cada fonte já sai em ordem de id; a junção mantém a ordem e o limit vale para o total.
+    rows = itertools.islice(heapq.merge(*sources, key=lambda row: row["id"]), limit)
+    while True:
+        batch = list(itertools.islice(rows, EXPORT_CHUNK_ROWS))
+        if not batch:
+            break
+        chunk = encoder.encode(batch)
+        if chunk:
+            yield chunk
+    tail = encoder.finish()
+    if tail:
+        yield tail
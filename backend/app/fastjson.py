@@ -0,0 +1,30 @@
+"""
+Caminho rápido para respostas com listas grandes.
+
+Em vez de carregar objetos ORM (identity map), validar cada um no schema com
+`from_attributes` e serializar com o encoder padrão, as rotas selecionam só as
+colunas do schema e serializam as linhas direto com orjson. As linhas vêm do
+banco com os tipos do modelo, então a validação é dispensada; o
+`response_model` da rota continua documentando o formato.
+"""
+import orjson
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        # OPT_UTC_Z: datetimes com fuso saem como "...Z", igual ao pydantic.
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+
+
+def schema_columns(model, schema) -> list:
+    """Colunas do modelo com os mesmos nomes dos campos do schema."""
+    return [getattr(model, name) for name in schema.model_fields if hasattr(model, name)]
+
+
+def select_rows(db: Session, stmt) -> list[dict]:
+    """Executa um select de colunas e devolve dicts (sem instâncias ORM)."""
+    result = db.execute(stmt)
+    keys = list(result.keys())
+    return [dict(zip(keys, row)) for row in result]
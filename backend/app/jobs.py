@@ -0,0 +1,459 @@
+"""
+Execução de tarefas em segundo plano, fora do caminho da requisição.
+
+Cada job pertence a uma fila nomeada com concorrência própria e, opcionalmente,
+limite de taxa (ex.: cota do provedor RPC). Falhas são repetidas com backoff
+exponencial e jitter; jobs periódicos são agendados com `every`. No shutdown o
+runner para de agendar, espera os jobs em andamento e esvazia as filas até
+JOBS_DRAIN_TIMEOUT_S.
+
+JOBS_BACKEND=memory (padrão) mantém as filas no processo. JOBS_BACKEND=postgres
+grava os jobs na tabela `jobs` (mesma transação do handler quando `db` é
+passado) e os workers disputam as linhas com SKIP LOCKED, então nada se perde
+em restart e vários processos dividem a mesma fila. Filas com durable=False
+(ex.: notificações) ficam sempre em memória.
+
+Filas padrão em DEFAULT_QUEUES; JOBS_QUEUES (JSON) sobrescreve, por exemplo:
+    {"chain": {"concurrency": 2, "rate": 5, "burst": 5}}
+"""
+import heapq
+import itertools
+import json
+import os
+import queue
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+from sqlalchemy import event, func, select, update
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import Job
+from app.observability import JOB_DURATION, get_logger
+
+
+JOBS_BACKEND = os.getenv("JOBS_BACKEND", "memory").lower()
+JOBS_MAX_RETRIES = int(os.getenv("JOBS_MAX_RETRIES", "5"))
+JOBS_BACKOFF_BASE_S = float(os.getenv("JOBS_BACKOFF_BASE_S", "0.5"))
+JOBS_BACKOFF_CAP_S = float(os.getenv("JOBS_BACKOFF_CAP_S", "60"))
+JOBS_DRAIN_TIMEOUT_S = float(os.getenv("JOBS_DRAIN_TIMEOUT_S", "20"))
+JOBS_POLL_S = float(os.getenv("JOBS_POLL_S", "1"))
+# Job "running" sem atualização por mais que isso volta para a fila (worker morreu).
+JOBS_LEASE_S = float(os.getenv("JOBS_LEASE_S", "300"))
+
+log = get_logger(__name__)
+
+
+@dataclass
+class QueueConfig:
+    concurrency: int = 1
+    rate: float | None = None  # jobs/s; None = sem limite
+    burst: int = 1
+    durable: bool = True
+
+
+DEFAULT_QUEUES = {
+    "chain": QueueConfig(concurrency=4, rate=10, burst=10),
+    "notifications": QueueConfig(concurrency=2, durable=False),
+    "maintenance": QueueConfig(concurrency=1),
+}
+
+
+def _queue_configs() -> dict[str, QueueConfig]:
+    configs = dict(DEFAULT_QUEUES)
+    env = os.getenv("JOBS_QUEUES")
+    if env:
+        try:
+            for name, cfg in json.loads(env).items():
+                configs[name] = QueueConfig(**cfg)
+        except Exception as exc:
+            log.warning("jobs.invalid_config", error=str(exc))
+    return configs
+
+
+def backoff_delay(attempt: int) -> float:
+    """Backoff exponencial com jitter completo (0..min(cap, base * 2^tentativa))."""
+    return random.uniform(0, min(JOBS_BACKOFF_CAP_S, JOBS_BACKOFF_BASE_S * 2 ** (attempt - 1)))
+
+
+class _RateLimiter:
+    """Token bucket simples; `acquire` bloqueia o worker até haver ficha."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+@dataclass
+class _Task:
+    name: str
+    fn: Callable
+    queue: str
+    max_retries: int
+    on_failure: Callable | None = None
+
+
+@dataclass
+class _Job:
+    name: str
+    kwargs: dict
+    attempts: int = 0
+    id: int | None = None  # linha na tabela jobs (modo durável)
+
+
+@dataclass(order=True)
+class _Scheduled:
+    due: float
+    seq: int
+    job: _Job | None = field(compare=False, default=None)
+    periodic: tuple | None = field(compare=False, default=None)
+
+
+# Callbacks que só podem rodar depois do commit do handler (ex.: job que lê a linha criada).
+@event.listens_for(Session, "after_commit")
+def _run_after_commit(session):
+    for callback in session.info.pop("jobs_after_commit", []):
+        callback()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_commit(session):
+    session.info.pop("jobs_after_commit", None)
+
+
+class JobRunner:
+    def __init__(self, backend: str = JOBS_BACKEND, queues: dict[str, QueueConfig] | None = None):
+        self.backend = backend
+        self.queues = queues or _queue_configs()
+        self._tasks: dict[str, _Task] = {}
+        self._periodic: list[tuple[float, str, dict]] = []
+        self._memory: dict[str, queue.Queue] = {name: queue.Queue() for name in self.queues}
+        self._wakeups = {name: threading.Event() for name in self.queues}
+        self._limiters = {
+            name: _RateLimiter(cfg.rate, cfg.burst) for name, cfg in self.queues.items() if cfg.rate
+        }
+        self._heap: list[_Scheduled] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._stopping = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._inflight = 0
+        self._running: list[_Job] = []
+        self._inflight_lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads)
+
+    # --- registro ------------------------------------------------------------
+
+    def task(
+        self, name: str, *, queue: str, max_retries: int = JOBS_MAX_RETRIES, on_failure: Callable | None = None
+    ):
+        """`on_failure(**kwargs)` roda quando o job esgota as tentativas."""
+        if queue not in self.queues:
+            raise ValueError(f"fila desconhecida: {queue}")
+
+        def decorator(fn):
+            self._tasks[name] = _Task(name, fn, queue, max_retries, on_failure)
+            return fn
+
+        return decorator
+
+    def every(self, seconds: float, name: str, **kwargs):
+        """Agenda `name` a cada `seconds` (por processo; o job deve ser idempotente)."""
+        self._periodic.append((seconds, name, kwargs))
+
+    def _durable(self, queue_name: str) -> bool:
+        return self.backend == "postgres" and self.queues[queue_name].durable
+
+    # --- enfileiramento ------------------------------------------------------
+
+    def enqueue(self, name: str, *, db: Session | None = None, delay: float = 0.0, **kwargs):
+        """
+        Enfileira o job `name` com kwargs serializáveis em JSON. Com `db`, o job
+        só é liberado no commit dessa sessão (descartado em rollback).
+        """
+        task = self._tasks.get(name)
+        if task is None:
+            raise ValueError(f"job desconhecido: {name}")
+
+        if self._durable(task.queue):
+            row = Job(
+                queue=task.queue,
+                name=name,
+                payload=json.dumps(kwargs),
+                max_retries=task.max_retries,
+                run_at=datetime.now(timezone.utc) + timedelta(seconds=delay),
+            )
+            if db is not None:
+                db.add(row)
+                db.info.setdefault("jobs_after_commit", []).append(self._wakeups[task.queue].set)
+            else:
+                with SessionLocal() as session:
+                    session.add(row)
+                    session.commit()
+                self._wakeups[task.queue].set()
+            return
+
+        job = _Job(name, kwargs)
+        if db is not None:
+            db.info.setdefault("jobs_after_commit", []).append(lambda: self._submit(job, delay))
+        else:
+            self._submit(job, delay)
+
+    def _submit(self, job: _Job, delay: float = 0.0):
+        if delay > 0:
+            self._schedule(_Scheduled(time.monotonic() + delay, next(self._seq), job=job))
+        else:
+            self._memory[self._tasks[job.name].queue].put(job)
+
+    def live(self, name: str) -> list[dict]:
+        """
+        kwargs dos jobs `name` ainda na fila, aguardando repetição ou rodando. No
+        backend em memória só enxerga este processo.
+        """
+        task = self._tasks[name]
+        if self._durable(task.queue):
+            with SessionLocal() as db:
+                payloads = db.execute(
+                    select(Job.payload).where(Job.name == name, Job.status.in_(("queued", "running")))
+                ).scalars()
+                return [json.loads(payload) for payload in payloads]
+        q = self._memory[task.queue]
+        with q.mutex:
+            found = [job for job in q.queue if job.name == name]
+        with self._cond:
+            found += [item.job for item in self._heap if item.job is not None and item.job.name == name]
+        with self._inflight_lock:
+            found += [job for job in self._running if job.name == name]
+        return [job.kwargs for job in found]
+
+    def _schedule(self, item: _Scheduled):
+        with self._cond:
+            heapq.heappush(self._heap, item)
+            self._cond.notify()
+
+    # --- ciclo de vida -------------------------------------------------------
+
+    def start(self):
+        if self._threads:
+            return
+        self._stopping.clear()
+        now = time.monotonic()
+        for seconds, name, kwargs in self._periodic:
+            self._schedule(_Scheduled(now + seconds, next(self._seq), periodic=(seconds, name, kwargs)))
+        self._spawn(self._scheduler, "jobs-scheduler")
+        for name, cfg in self.queues.items():
+            target = self._durable_worker if self._durable(name) else self._memory_worker
+            for index in range(cfg.concurrency):
+                self._spawn(lambda n=name: target(n), f"jobs-{name}-{index}")
+
+    def _spawn(self, target, name: str):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def stop(self, timeout: float = JOBS_DRAIN_TIMEOUT_S):
+        """Para de agendar e espera os workers esvaziarem as filas (até `timeout`)."""
+        if not self._threads:
+            return
+        self._stopping.set()
+        with self._cond:
+            self._cond.notify_all()
+        for wakeup in self._wakeups.values():
+            wakeup.set()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(deadline - time.monotonic(), 0))
+        self._threads = []
+        left = sum(q.qsize() for q in self._memory.values())
+        delayed = sum(1 for item in self._heap if item.job is not None)
+        if left or delayed:
+            log.warning("jobs.drain_incomplete", queued=left, delayed=delayed)
+        self._heap.clear()
+
+    # --- workers -------------------------------------------------------------
+
+    def _scheduler(self):
+        last_lease_check = 0.0
+        while not self._stopping.is_set():
+            with self._cond:
+                timeout = self._heap[0].due - time.monotonic() if self._heap else 1.0
+                if timeout > 0:
+                    self._cond.wait(min(timeout, 1.0))
+                now = time.monotonic()
+                due = []
+                while self._heap and self._heap[0].due <= now:
+                    due.append(heapq.heappop(self._heap))
+            for item in due:
+                if item.periodic is not None:
+                    seconds, name, kwargs = item.periodic
+                    self._schedule(_Scheduled(now + seconds, next(self._seq), periodic=item.periodic))
+                    try:
+                        self.enqueue(name, **kwargs)
+                    except Exception as exc:
+                        log.error("jobs.periodic_failed", job=name, error=str(exc))
+                else:
+                    self._submit(item.job)
+            if self.backend == "postgres" and now - last_lease_check > 60:
+                last_lease_check = now
+                self._requeue_expired()
+
+    def _memory_worker(self, queue_name: str):
+        q = self._memory[queue_name]
+        while True:
+            try:
+                job = q.get(timeout=0.2)
+            except queue.Empty:
+                # Drenagem: só sai quando a fila esvaziou depois do stop.
+                if self._stopping.is_set():
+                    return
+                continue
+            self._execute(queue_name, job)
+
+    def _durable_worker(self, queue_name: str):
+        wakeup = self._wakeups[queue_name]
+        while not self._stopping.is_set():
+            try:
+                job = self._claim(queue_name)
+            except Exception as exc:
+                log.warning("jobs.claim_failed", queue=queue_name, error=str(exc))
+                job = None
+            if job is None:
+                wakeup.wait(JOBS_POLL_S)
+                wakeup.clear()
+                continue
+            self._execute(queue_name, job)
+
+    def _claim(self, queue_name: str) -> _Job | None:
+        with SessionLocal() as db:
+            row = db.execute(
+                select(Job)
+                .where(
+                    Job.queue == queue_name,
+                    Job.status == "queued",
+                    Job.run_at <= datetime.now(timezone.utc),
+                )
+                .order_by(Job.run_at)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            ).scalar_one_or_none()
+            if row is None:
+                return None
+            row.status = "running"
+            db.commit()
+            return _Job(row.name, json.loads(row.payload), attempts=row.attempts, id=row.id)
+
+    def _requeue_expired(self):
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=JOBS_LEASE_S)
+        try:
+            with SessionLocal() as db:
+                result = db.execute(
+                    update(Job)
+                    .where(Job.status == "running", Job.updated_at < cutoff)
+                    .values(status="queued", run_at=func.now())
+                )
+                db.commit()
+            if result.rowcount:
+                log.warning("jobs.requeued_expired", count=result.rowcount)
+        except Exception as exc:
+            log.warning("jobs.requeue_failed", error=str(exc))
+
+    def _execute(self, queue_name: str, job: _Job):
+        task = self._tasks[job.name]
+        limiter = self._limiters.get(queue_name)
+        if limiter is not None:
+            limiter.acquire()
+        with self._inflight_lock:
+            self._inflight += 1
+            self._running.append(job)
+        outcome = "ok"
+        error = None
+        start = time.perf_counter()
+        try:
+            task.fn(**job.kwargs)
+        except Exception as exc:
+            job.attempts += 1
+            error = f"{type(exc).__name__}: {exc}"
+            outcome = "failed" if job.attempts > task.max_retries else "retry"
+        finally:
+            JOB_DURATION.labels(queue=queue_name, name=job.name, outcome=outcome).observe(
+                time.perf_counter() - start
+            )
+            with self._inflight_lock:
+                self._inflight -= 1
+                self._running.remove(job)
+
+        if outcome == "retry":
+            delay = backoff_delay(job.attempts)
+            log.warning("jobs.retry", job=job.name, attempt=job.attempts, delay_s=round(delay, 2), error=error)
+        elif outcome == "failed":
+            log.error("jobs.failed", job=job.name, attempts=job.attempts, kwargs=job.kwargs, error=error)
+            if task.on_failure is not None:
+                try:
+                    task.on_failure(**job.kwargs)
+                except Exception as exc:
+                    log.error("jobs.on_failure_error", job=job.name, error=str(exc))
+
+        if job.id is not None:
+            self._finish_durable(job, outcome, error, delay if outcome == "retry" else 0.0)
+        elif outcome == "retry":
+            self._submit(job, delay)
+
+    def _finish_durable(self, job: _Job, outcome: str, error: str | None, delay: float):
+        values = {"attempts": job.attempts, "last_error": error}
+        if outcome == "ok":
+            values["status"] = "done"
+        elif outcome == "retry":
+            values.update(status="queued", run_at=datetime.now(timezone.utc) + timedelta(seconds=delay))
+        else:
+            values["status"] = "failed"
+        with SessionLocal() as db:
+            db.execute(update(Job).where(Job.id == job.id).values(**values))
+            db.commit()
+
+    def stats(self) -> dict:
+        out = {
+            "backend": self.backend,
+            "running": self.running,
+            "inflight": self._inflight,
+            "queues": {
+                name: {
+                    "concurrency": cfg.concurrency,
+                    "rate": cfg.rate,
+                    "durable": self._durable(name),
+                    "queued": self._memory[name].qsize(),
+                }
+                for name, cfg in self.queues.items()
+            },
+            "delayed": sum(1 for item in self._heap if item.job is not None),
+        }
+        if self.backend == "postgres":
+            with SessionLocal() as db:
+                rows = db.execute(select(Job.queue, Job.status, func.count()).group_by(Job.queue, Job.status))
+                for queue_name, status, count in rows:
+                    out["queues"].setdefault(queue_name, {})[status] = count
+        return out
+
+
+jobs = JobRunner()
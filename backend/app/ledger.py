@@ -0,0 +1,312 @@
+"""
+Livro de frações e order book por matrícula.
+
+`property_shares` guarda a participação de cada carteira em pontos-base
+(10000 = 100%). `property_books` mantém os agregados (total ofertado em
+propostas abertas, total comprometido em propostas aceitas ainda não
+liquidadas, melhor oferta) e `book_bids` as propostas abertas indexadas por
+(matricula, unit_price). Tudo é atualizado incrementalmente nos handlers, na
+mesma transação, então ler o book é uma busca por chave mais uma varredura de
+índice limitada à profundidade pedida, sem reler as propostas.
+
+Matrículas sem livro (dados anteriores ou carga em massa) são reconstruídas a
+partir do histórico no primeiro acesso: ofertas e compromissos vêm das
+propostas; sem frações registradas, o dono atual recebe 100%. Para refazer tudo:
+
+    python -m app.ledger --rebuild
+"""
+import argparse
+import sys
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models import (
+    BookBid,
+    Property,
+    PropertyBook,
+    PropertyShare,
+    Proposal,
+    ProposalStatus,
+    Transfer,
+    TransferStatus,
+)
+
+
+FULL_BPS = 10_000
+
+
+class LedgerError(ValueError):
+    """Operação incompatível com as frações disponíveis."""
+
+
+def fraction_bps(fraction: float | None) -> int:
+    """`fraction` é percentual (0.01 a 100); sem fração a proposta é pela propriedade inteira."""
+    if fraction is None:
+        return FULL_BPS
+    return max(1, min(FULL_BPS, round(fraction * 100)))
+
+
+def _unit_price(amount: float, bps: int) -> float:
+    return amount * FULL_BPS / bps
+
+
+# --- reconstrução ---------------------------------------------------------------------
+
+
+def _rebuild_one(db: Session, matricula: str) -> PropertyBook:
+    db.execute(delete(BookBid).where(BookBid.matricula == matricula))
+    db.execute(delete(PropertyBook).where(PropertyBook.matricula == matricula))
+
+    # Frações já registradas são a fonte da verdade; só os compromissos são recalculados.
+    shares = {
+        share.owner_wallet: share
+        for share in db.query(PropertyShare).filter(PropertyShare.matricula == matricula)
+    }
+    for share in shares.values():
+        share.committed_bps = 0
+    if not shares:
+        prop = db.query(Property).filter(Property.matricula == matricula).first()
+        if prop is not None:
+            # Histórico anterior ao livro transferia a propriedade inteira.
+            owner = PropertyShare(
+                matricula=matricula, owner_wallet=prop.current_owner.lower(), shares_bps=FULL_BPS, committed_bps=0
+            )
+            db.add(owner)
+            shares[owner.owner_wallet] = owner
+
+    book = PropertyBook(matricula=matricula, total_offered_bps=0, total_committed_bps=0, open_bids=0)
+    settled = {
+        row.proposal_id
+        for row in db.query(Transfer.proposal_id).filter(
+            Transfer.matricula == matricula,
+            Transfer.status.in_([TransferStatus.EXECUTED, TransferStatus.REJECTED]),
+        )
+    }
+    for proposal in db.query(Proposal).filter(Proposal.matricula == matricula):
+        bps = fraction_bps(proposal.fraction)
+        if proposal.status == ProposalStatus.PENDING:
+            db.add(_bid_for(proposal, bps))
+            book.total_offered_bps += bps
+            book.open_bids += 1
+            price = _unit_price(proposal.amount, bps)
+            if book.best_bid_price is None or price > book.best_bid_price:
+                book.best_bid_price = price
+                book.best_bid_proposal_id = proposal.id
+        elif proposal.status == ProposalStatus.ACCEPTED and proposal.id not in settled:
+            book.total_committed_bps += bps
+            seller = shares.get(proposal.owner_wallet.lower())
+            if seller is not None:
+                seller.committed_bps += bps
+    db.add(book)
+    db.flush()
+    return book
+
+
+def _book_for_update(db: Session, matricula: str) -> PropertyBook:
+    """Trava a linha de agregados da matrícula (serializa escritas concorrentes)."""
+    stmt = select(PropertyBook).where(PropertyBook.matricula == matricula).with_for_update()
+    book = db.execute(stmt).scalar_one_or_none()
+    if book is not None:
+        return book
+    try:
+        with db.begin_nested():
+            return _rebuild_one(db, matricula)
+    except IntegrityError:
+        # Outro request criou o livro ao mesmo tempo.
+        return db.execute(stmt).scalar_one()
+
+
+def rebuild(db: Session, matricula: str | None = None) -> int:
+    matriculas = [matricula] if matricula else [m for (m,) in db.query(Property.matricula)]
+    for m in matriculas:
+        _rebuild_one(db, m)
+    return len(matriculas)
+
+
+# --- atualizações incrementais ---------------------------------------------------------
+
+
+def _bid_for(proposal: Proposal, bps: int) -> BookBid:
+    return BookBid(
+        proposal_id=proposal.id,
+        matricula=proposal.matricula,
+        proposer_wallet=proposal.proposer_wallet,
+        fraction_bps=bps,
+        amount=proposal.amount,
+        unit_price=_unit_price(proposal.amount, bps),
+    )
+
+
+def _shares(db: Session, matricula: str, wallet: str) -> PropertyShare | None:
+    return (
+        db.query(PropertyShare)
+        .filter(PropertyShare.matricula == matricula, PropertyShare.owner_wallet == wallet.lower())
+        .first()
+    )
+
+
+def register_owner(db: Session, matricula: str, wallet: str):
+    """Nova propriedade: o dono começa com 100% e o livro vazio."""
+    db.add(PropertyShare(matricula=matricula, owner_wallet=wallet.lower(), shares_bps=FULL_BPS, committed_bps=0))
+    db.add(PropertyBook(matricula=matricula, total_offered_bps=0, total_committed_bps=0, open_bids=0))
+
+
+def on_proposal_created(db: Session, proposal: Proposal):
+    """Põe a proposta no book; levanta LedgerError se o vendedor não tem a fração pedida."""
+    book = _book_for_update(db, proposal.matricula)
+    bps = fraction_bps(proposal.fraction)
+    owned = _shares(db, proposal.matricula, proposal.owner_wallet)
+    if owned is None or owned.shares_bps < bps:
+        held = owned.shares_bps if owned else 0
+        raise LedgerError(f"Vendedor possui {held / 100:.2f}% da matrícula, proposta pede {bps / 100:.2f}%")
+    if db.get(BookBid, proposal.id) is not None:
+        # Já incluída pela reconstrução do livro.
+        return
+    bid = _bid_for(proposal, bps)
+    db.add(bid)
+    book.total_offered_bps += bps
+    book.open_bids += 1
+    if book.best_bid_price is None or bid.unit_price > book.best_bid_price:
+        book.best_bid_price = bid.unit_price
+        book.best_bid_proposal_id = proposal.id
+
+
+def _refresh_best_bid(db: Session, book: PropertyBook):
+    best = db.execute(
+        select(BookBid.proposal_id, BookBid.unit_price)
+        .where(BookBid.matricula == book.matricula)
+        .order_by(BookBid.unit_price.desc(), BookBid.proposal_id)
+        .limit(1)
+    ).first()
+    book.best_bid_proposal_id = best.proposal_id if best else None
+    book.best_bid_price = best.unit_price if best else None
+
+
+def on_proposal_decided(db: Session, proposal: Proposal, accepted: bool):
+    """
+    Tira a proposta do book; se aceita, compromete a fração. Levanta
+    LedgerError se o dono não tem fração livre suficiente. Chamar antes de
+    mudar o status (a reconstrução do livro lê o estado atual).
+    """
+    book = _book_for_update(db, proposal.matricula)
+    bps = fraction_bps(proposal.fraction)
+    bid = db.get(BookBid, proposal.id)
+    if bid is not None:
+        db.delete(bid)
+        db.flush()
+        book.total_offered_bps -= bid.fraction_bps
+        book.open_bids -= 1
+        if book.best_bid_proposal_id == proposal.id:
+            _refresh_best_bid(db, book)
+
+    if accepted:
+        owned = _shares(db, proposal.matricula, proposal.owner_wallet)
+        available = owned.shares_bps - owned.committed_bps if owned else 0
+        if bps > available:
+            raise LedgerError(f"Fração indisponível: {available / 100:.2f}% livre, proposta pede {bps / 100:.2f}%")
+        owned.committed_bps += bps
+        book.total_committed_bps += bps
+
+
+def on_transfer_settled(db: Session, transfer: Transfer, executed: bool) -> str | None:
+    """
+    Libera o compromisso; se executada, move a fração do vendedor para o
+    comprador. Devolve a carteira do comprador se ele passou a ter mais de
+    50% (é quem o registro e o contrato mostram como dono), senão None.
+    Chamar antes de mudar o status da transferência.
+    """
+    proposal = db.get(Proposal, transfer.proposal_id)
+    if proposal is None:
+        return
+    book = _book_for_update(db, transfer.matricula)
+    bps = fraction_bps(proposal.fraction)
+    seller = _shares(db, transfer.matricula, transfer.owner_wallet)
+    # Valida antes de mexer em qualquer saldo: o lote de assinaturas segue com os outros itens.
+    if executed and (seller is None or seller.shares_bps < bps):
+        raise LedgerError("Vendedor não possui a fração a transferir")
+    book.total_committed_bps = max(book.total_committed_bps - bps, 0)
+    if seller is not None:
+        seller.committed_bps = max(seller.committed_bps - bps, 0)
+    if not executed:
+        return None
+
+    seller.shares_bps -= bps
+    if seller.shares_bps == 0:
+        db.delete(seller)
+    buyer = _shares(db, transfer.matricula, transfer.buyer_wallet)
+    if buyer is None:
+        buyer = PropertyShare(
+            matricula=transfer.matricula,
+            owner_wallet=transfer.buyer_wallet.lower(),
+            shares_bps=bps,
+            committed_bps=0,
+        )
+        db.add(buyer)
+    else:
+        buyer.shares_bps += bps
+    # Só o comprador ganha fração, então só ele pode ter passado a deter a maioria.
+    return buyer.owner_wallet if buyer.shares_bps * 2 > FULL_BPS else None
+
+
+# --- leitura -----------------------------------------------------------------------
+
+
+def read_book(db: Session, matricula: str, depth: int = 10) -> dict:
+    book = db.get(PropertyBook, matricula)
+    if book is None:
+        book = _book_for_update(db, matricula)
+        db.commit()
+    bids = db.execute(
+        select(BookBid)
+        .where(BookBid.matricula == matricula)
+        .order_by(BookBid.unit_price.desc(), BookBid.proposal_id)
+        .limit(depth)
+    ).scalars()
+    owners = db.execute(
+        select(PropertyShare.owner_wallet, PropertyShare.shares_bps)
+        .where(PropertyShare.matricula == matricula)
+        .order_by(PropertyShare.shares_bps.desc())
+    ).all()
+    bid_list = [
+        {
+            "proposal_id": bid.proposal_id,
+            "proposer_wallet": bid.proposer_wallet,
+            "fraction": bid.fraction_bps / 100,
+            "amount": bid.amount,
+            "unit_price": bid.unit_price,
+        }
+        for bid in bids
+    ]
+    return {
+        "matricula": matricula,
+        "total_offered": book.total_offered_bps / 100,
+        "total_committed": book.total_committed_bps / 100,
+        "open_bids": book.open_bids,
+        "best_bid": bid_list[0] if bid_list else None,
+        "bids": bid_list,
+        "owners": [{"wallet": wallet, "fraction": bps / 100} for wallet, bps in owners],
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rebuild", action="store_true", help="Reconstrói livros a partir das propostas")
+    parser.add_argument("--matricula", default=None, help="Só esta matrícula")
+    args = parser.parse_args(argv)
+    if not args.rebuild:
+        parser.print_help()
+        return 2
+
+    from app.database import SessionLocal
+
+    with SessionLocal() as db:
+        count = rebuild(db, args.matricula)
+        db.commit()
+    print(f"{count} livro(s) reconstruído(s).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
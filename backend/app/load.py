@@ -0,0 +1,476 @@
+"""
+Carga em massa de propriedades (migração do registro legado, seed de ambientes).
+
+Uso (a partir de backend/):
+    python -m app.load imoveis.csv                       # CSV com cabeçalho
+    python -m app.load imoveis.ndjson.gz --chain skip    # NDJSON, sem escrita on-chain
+    python -m app.load - --format ndjson < dump.ndjson
+    python -m app.load --submit-deferred                 # envia à chain o que ficou adiado
+
+Colunas: matricula, current_owner, latitude, longitude e, opcionais,
+previous_owner e description (as mesmas de POST /properties). O arquivo é lido
+em blocos de --chunk-rows linhas; cada bloco é validado coluna a coluna
+(formato da matrícula em LOAD_MATRICULA_PATTERN, faixas de latitude/longitude,
+tamanhos e matrícula repetida no arquivo) e as linhas recusadas vão para
+--rejects com o número da linha e o motivo.
+
+No Postgres cada bloco entra por `COPY ... FROM STDIN` numa tabela temporária
+e um único INSERT ... SELECT (com ON CONFLICT na matrícula) grava propriedades,
+a fração de 100% do dono e o livro vazio, como register_property faria. Cada
+bloco é uma transação: se a carga parar, rodar de novo pula o que já entrou.
+Em outros bancos (SQLite de desenvolvimento) usa INSERT em lote. Com shards as
+linhas vão para o shard da matrícula com ids reservados em bloco.
+
+Nada é enviado à chain durante a carga. Com --chain defer (padrão) o tx_hash
+fica "chain-deferred" e `--submit-deferred` registra depois, em lotes (ou como
+folhas Merkle em ANCHOR_MODE); com --chain skip fica "chain-skipped" e a
+propriedade não vai para o contrato.
+"""
+import argparse
+import csv
+import gzip
+import io
+import math
+import os
+import re
+import sys
+import time
+
+import orjson
+from sqlalchemy import insert, select
+
+from app.blockchain import contract_version, is_address
+from app.database import DATABASE_SHARD_URLS, SessionLocal, init_schema, shard_engines, should_create_schema
+from app.ledger import FULL_BPS
+from app.models import Property, PropertyBook, PropertyShare
+from app.observability import get_logger
+
+LOAD_CHUNK_ROWS = int(os.getenv("LOAD_CHUNK_ROWS", "50000"))
+LOAD_SUBMIT_BATCH = int(os.getenv("LOAD_SUBMIT_BATCH", "500"))
+LOAD_MATRICULA_PATTERN = os.getenv("LOAD_MATRICULA_PATTERN", r"[0-9A-Za-z][0-9A-Za-z./_-]{2,127}")
+CHAIN_DEFERRED = "chain-deferred"
+CHAIN_SKIPPED = "chain-skipped"
+
+COLUMNS = ("matricula", "previous_owner", "current_owner", "description", "latitude", "longitude")
+REQUIRED = ("matricula", "current_owner", "latitude", "longitude")
+# Lotes de IN (...) no caminho sem COPY; o SQLite aceita até 32766 parâmetros.
+_IN_BATCH = 500
+
+_matricula_re = re.compile(LOAD_MATRICULA_PATTERN)
+log = get_logger(__name__)
+
+
+# --- leitura ---------------------------------------------------------------------
+
+
+def _open(path: str):
+    if path == "-":
+        return sys.stdin
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+
+def detect_format(path: str) -> str:
+    name = path.removesuffix(".gz").lower()
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    if name.endswith(".csv"):
+        return "csv"
+    raise SystemExit(f"Não foi possível deduzir o formato de {path}; use --format")
+
+
+def _empty_columns() -> dict[str, list]:
+    return {name: [] for name in (*COLUMNS, "_line", "_error")}
+
+
+def read_chunks(stream, fmt: str, size: int):
+    """Gera blocos como colunas: {coluna: [valores]}, mais _line e _error (parse)."""
+    cols = _empty_columns()
+    if fmt == "csv":
+        reader = csv.reader(stream)
+        header = [name.strip().lower() for name in next(reader, [])]
+        missing = [name for name in REQUIRED if name not in header]
+        if missing:
+            raise SystemExit(f"Colunas obrigatórias ausentes no CSV: {', '.join(missing)}")
+        index = {name: header.index(name) if name in header else None for name in COLUMNS}
+        rows = ((n, record, None) for n, record in enumerate(reader, start=2))
+    else:
+        rows = (_ndjson_row(n, line) for n, line in enumerate(stream, start=1) if line.strip())
+        index = None
+
+    for line_no, record, error in rows:
+        cols["_line"].append(line_no)
+        cols["_error"].append(error)
+        for name in COLUMNS:
+            if index is None:
+                value = record.get(name) if record else None
+            else:
+                position = index[name]
+                value = record[position] if position is not None and position < len(record) else None
+            if isinstance(value, str):
+                value = value.strip() or None
+            cols[name].append(value)
+        if len(cols["_line"]) >= size:
+            yield cols
+            cols = _empty_columns()
+    if cols["_line"]:
+        yield cols
+
+
+def _ndjson_row(line_no: int, line: str):
+    try:
+        record = orjson.loads(line)
+    except orjson.JSONDecodeError:
+        return line_no, None, "JSON inválido"
+    if not isinstance(record, dict):
+        return line_no, None, "linha não é um objeto JSON"
+    return line_no, record, None
+
+
+# --- validação -------------------------------------------------------------------
+
+
+def _to_float(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _max_len(limit: int):
+    return lambda value: value is None or len(value) <= limit
+
+
+def validate(cols: dict[str, list], seen: set[str]) -> list[str | None]:
+    """
+    Valida o bloco coluna a coluna e devolve o motivo da recusa de cada linha
+    (None = ok). Converte latitude/longitude para float no lugar. `seen` guarda
+    as matrículas aceitas em blocos anteriores para pegar repetições no arquivo.
+    """
+    errors = list(cols["_error"])
+
+    def check(values, predicate, message):
+        for i, ok in enumerate(map(predicate, values)):
+            if not ok and errors[i] is None:
+                errors[i] = message
+
+    cols["latitude"] = list(map(_to_float, cols["latitude"]))
+    cols["longitude"] = list(map(_to_float, cols["longitude"]))
+    for name in ("matricula", "previous_owner", "current_owner", "description"):
+        cols[name] = [str(v) if v is not None else None for v in cols[name]]
+    check(cols["matricula"], lambda m: m is not None and _matricula_re.fullmatch(m), "matrícula fora do formato")
+    check(cols["current_owner"], lambda w: w is not None and 3 <= len(w) <= 64, "current_owner inválido")
+    check(cols["previous_owner"], _max_len(64), "previous_owner acima de 64 caracteres")
+    check(cols["description"], _max_len(1024), "description acima de 1024 caracteres")
+    if contract_version() == 2:
+        # O encoder v2 recusa o que não é address; barrado aqui, não trava o --submit-deferred.
+        check(cols["current_owner"], lambda w: w is None or is_address(w), "current_owner não é endereço 0x")
+        check(cols["previous_owner"], lambda w: not w or is_address(w), "previous_owner não é endereço 0x")
+    check(cols["latitude"], lambda v: v is not None, "latitude não numérica")
+    check(cols["longitude"], lambda v: v is not None, "longitude não numérica")
+    check(cols["latitude"], lambda v: v is None or -90 <= v <= 90, "latitude fora de [-90, 90]")
+    check(cols["longitude"], lambda v: v is None or -180 <= v <= 180, "longitude fora de [-180, 180]")
+
+    for i, matricula in enumerate(cols["matricula"]):
+        if errors[i] is not None:
+            continue
+        if matricula in seen:
+            errors[i] = "matrícula repetida no arquivo"
+        else:
+            seen.add(matricula)
+    return errors
+
+
+# --- escrita ---------------------------------------------------------------------
+
+_STAGE_DDL = """
+CREATE TEMP TABLE IF NOT EXISTS load_properties (
+    id bigint,
+    share_id bigint,
+    matricula varchar(128),
+    previous_owner varchar(64),
+    current_owner varchar(64),
+    description text,
+    latitude double precision,
+    longitude double precision
+) ON COMMIT DELETE ROWS
+"""
+_STAGE_COLUMNS = ("id", "share_id", *COLUMNS)
+
+
+def _merge_sql(with_ids: bool) -> str:
+    """Um statement por bloco: propriedades novas, fração do dono e livro vazio."""
+    prop_id, share_id = ("id, ", "share_id, ") if with_ids else ("", "")
+    return f"""
+WITH ins AS (
+    INSERT INTO properties ({prop_id}matricula, previous_owner, current_owner, description,
+                            latitude, longitude, tx_hash, created_by)
+    SELECT {prop_id}matricula, previous_owner, current_owner, description, latitude, longitude,
+           %(tx_hash)s, %(created_by)s
+    FROM load_properties
+    ON CONFLICT (matricula) DO NOTHING
+    RETURNING matricula
+), shares AS (
+    INSERT INTO property_shares ({prop_id}matricula, owner_wallet, shares_bps, committed_bps)
+    SELECT {share_id}s.matricula, lower(s.current_owner), {FULL_BPS}, 0
+    FROM load_properties s JOIN ins ON ins.matricula = s.matricula
+    ON CONFLICT DO NOTHING
+), books AS (
+    INSERT INTO property_books (matricula, total_offered_bps, total_committed_bps, open_bids)
+    SELECT matricula, 0, 0, 0 FROM ins
+    ON CONFLICT DO NOTHING
+)
+SELECT count(*) FROM ins
+"""
+
+
+class _Target:
+    """Conexão de um shard (ou do banco único) mantida durante toda a carga."""
+
+    def __init__(self, bind, with_ids: bool):
+        self.bind = bind
+        self.with_ids = with_ids
+        self.copy = bind.dialect.name == "postgresql"
+        self.raw = bind.raw_connection() if self.copy else None
+        if self.copy:
+            with self.raw.cursor() as cur:
+                cur.execute(_STAGE_DDL)
+            self.raw.commit()
+
+    def write(self, rows: list[dict], tx_hash: str, created_by: str | None) -> int:
+        return self._copy_merge(rows, tx_hash, created_by) if self.copy else self._insert(rows, tx_hash, created_by)
+
+    def _copy_merge(self, rows, tx_hash, created_by) -> int:
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in rows:
+            writer.writerow([row.get(name) for name in _STAGE_COLUMNS])
+        copy_sql = f"COPY load_properties ({', '.join(_STAGE_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+        try:
+            with self.raw.cursor() as cur:
+                buf.seek(0)
+                if hasattr(cur, "copy_expert"):  # psycopg2
+                    cur.copy_expert(copy_sql, buf)
+                else:  # psycopg 3
+                    with cur.copy(copy_sql) as copy:
+                        copy.write(buf.getvalue())
+                cur.execute(_merge_sql(self.with_ids), {"tx_hash": tx_hash, "created_by": created_by})
+                inserted = cur.fetchone()[0]
+            self.raw.commit()
+        except Exception:
+            self.raw.rollback()
+            raise
+        return inserted
+
+    def _insert(self, rows, tx_hash, created_by) -> int:
+        props = Property.__table__
+        with self.bind.begin() as conn:
+            existing = set()
+            for start in range(0, len(rows), _IN_BATCH):
+                batch = [row["matricula"] for row in rows[start : start + _IN_BATCH]]
+                existing.update(conn.scalars(select(props.c.matricula).where(props.c.matricula.in_(batch))))
+            rows = [row for row in rows if row["matricula"] not in existing]
+            if not rows:
+                return 0
+            conn.execute(
+                insert(props),
+                [
+                    {
+                        **{name: row[name] for name in COLUMNS},
+                        **({"id": row["id"]} if self.with_ids else {}),
+                        "tx_hash": tx_hash,
+                        "created_by": created_by,
+                    }
+                    for row in rows
+                ],
+            )
+            conn.execute(
+                insert(PropertyShare.__table__),
+                [
+                    {
+                        **({"id": row["share_id"]} if self.with_ids else {}),
+                        "matricula": row["matricula"],
+                        "owner_wallet": row["current_owner"].lower(),
+                        "shares_bps": FULL_BPS,
+                        "committed_bps": 0,
+                    }
+                    for row in rows
+                ],
+            )
+            conn.execute(
+                insert(PropertyBook.__table__),
+                [
+                    {"matricula": row["matricula"], "total_offered_bps": 0, "total_committed_bps": 0, "open_bids": 0}
+                    for row in rows
+                ],
+            )
+        return len(rows)
+
+    def close(self):
+        if self.raw is not None:
+            self.raw.close()
+
+
+class Loader:
+    def __init__(self, tx_hash: str, created_by: str | None = None):
+        self.tx_hash = tx_hash
+        self.created_by = created_by
+        self.sharded = bool(DATABASE_SHARD_URLS)
+        self.targets = {name: _Target(bind, self.sharded) for name, bind in shard_engines.items()}
+
+    def write(self, rows: list[dict]) -> int:
+        if not rows:
+            return 0
+        if not self.sharded:
+            return self.targets["s0"].write(rows, self.tx_hash, self.created_by)
+
+        from app.sharding import id_allocator, shard_map
+
+        # Ids reservados antes de abrir as transações dos shards (o SQLite tem um escritor só).
+        for row, prop_id, share_id in zip(
+            rows, id_allocator.reserve("properties", len(rows)), id_allocator.reserve("property_shares", len(rows))
+        ):
+            row["id"], row["share_id"] = prop_id, share_id
+        groups: dict[str, list[dict]] = {}
+        for row in rows:
+            groups.setdefault(shard_map.shard_for(row["matricula"]), []).append(row)
+        return sum(self.targets[shard].write(group, self.tx_hash, self.created_by) for shard, group in groups.items())
+
+    def close(self):
+        for target in self.targets.values():
+            target.close()
+
+
+def load(path: str, fmt: str, *, chain: str, chunk_rows: int, rejects_path: str | None, created_by: str | None):
+    tx_hash = CHAIN_DEFERRED if chain == "defer" else CHAIN_SKIPPED
+    loader = Loader(tx_hash, created_by)
+    rejects = open(rejects_path, "wb") if rejects_path else None
+    seen: set[str] = set()
+    totals = {"read": 0, "inserted": 0, "existing": 0, "rejected": 0}
+    start = time.perf_counter()
+    try:
+        with _open(path) as stream:
+            for cols in read_chunks(stream, fmt, chunk_rows):
+                errors = validate(cols, seen)
+                rows = []
+                for i, error in enumerate(errors):
+                    if error is None:
+                        rows.append({name: cols[name][i] for name in COLUMNS})
+                    elif rejects is not None:
+                        reject = {"line": cols["_line"][i], "error": error, "matricula": cols["matricula"][i]}
+                        rejects.write(orjson.dumps(reject) + b"\n")
+                inserted = loader.write(rows)
+                totals["read"] += len(errors)
+                totals["rejected"] += len(errors) - len(rows)
+                totals["inserted"] += inserted
+                totals["existing"] += len(rows) - inserted
+                elapsed = time.perf_counter() - start
+                print(
+                    f"{totals['read']:>10} lidas  {totals['inserted']:>10} gravadas  "
+                    f"{totals['existing']:>8} já existiam  {totals['rejected']:>8} recusadas  "
+                    f"{totals['read'] / elapsed:>9,.0f} linhas/s",
+                    flush=True,
+                )
+    finally:
+        loader.close()
+        if rejects is not None:
+            rejects.close()
+    totals["seconds"] = round(time.perf_counter() - start, 2)
+    log.info("load.finished", path=path, chain=chain, **totals)
+    return totals
+
+
+def submit_deferred(batch: int = LOAD_SUBMIT_BATCH) -> int:
+    """Envia à chain as propriedades carregadas com --chain defer, em lotes."""
+    from app.anchoring import enqueue_anchor, flush_pending, is_anchor_mode
+    from app.blockchain import register_properties_onchain
+    from app.tasks import CHAIN_FAILED, CHAIN_FIELDS, invalid_for_chain
+
+    stmt = select(Property).where(Property.tx_hash == CHAIN_DEFERRED).order_by(Property.id).limit(batch)
+    anchored = is_anchor_mode()
+    done = 0
+    start = time.perf_counter()
+    while True:
+        with SessionLocal() as db:
+            props = list(db.execute(stmt).scalars())
+            if not props:
+                break
+            if anchored:
+                for prop in props:
+                    prop.tx_hash = enqueue_anchor(
+                        db,
+                        kind="property",
+                        ref_id=prop.id,
+                        matricula=prop.matricula,
+                        previous_owner=prop.previous_owner,
+                        current_owner=prop.current_owner,
+                        latitude=prop.latitude,
+                        longitude=prop.longitude,
+                    )
+                db.commit()
+                sent = len(props)
+            else:
+                items = []
+                valid = []
+                for prop in props:
+                    item = {name: getattr(prop, name) for name in CHAIN_FIELDS}
+                    error = invalid_for_chain(item)
+                    if error:
+                        # Sai da fila de adiadas; sem isso a mesma linha volta primeiro em toda rodada.
+                        prop.tx_hash = CHAIN_FAILED
+                        log.error("load.submit_invalid", matricula=prop.matricula, error=error)
+                        continue
+                    items.append(item)
+                    valid.append(prop)
+                sent = 0
+                try:
+                    # Cada hash é gravado assim que sai; uma falha no meio não reenvia os anteriores.
+                    for prop, tx_hash in zip(valid, register_properties_onchain(items) if items else ()):
+                        prop.tx_hash = tx_hash
+                        sent += 1
+                finally:
+                    db.commit()
+        done += sent
+        print(f"{done:>10} enviadas  {done / (time.perf_counter() - start):>9,.0f} linhas/s", flush=True)
+    if anchored:
+        while flush_pending() is not None:
+            pass
+    return done
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?", help="Arquivo CSV/NDJSON (.gz aceito) ou - para stdin")
+    parser.add_argument("--format", choices=("csv", "ndjson"))
+    parser.add_argument("--chain", choices=("defer", "skip"), default="defer")
+    parser.add_argument("--chunk-rows", type=int, default=LOAD_CHUNK_ROWS)
+    parser.add_argument("--rejects", help="NDJSON com as linhas recusadas (linha, motivo, matrícula)")
+    parser.add_argument("--created-by", help="Valor de created_by nas propriedades carregadas")
+    parser.add_argument("--submit-deferred", action="store_true", help="Envia à chain as cargas adiadas")
+    args = parser.parse_args(argv)
+
+    if should_create_schema():
+        init_schema()
+    if args.submit_deferred:
+        print(f"{submit_deferred()} propriedades enviadas.")
+        return 0
+    if not args.path:
+        parser.print_help()
+        return 2
+    fmt = args.format or detect_format(args.path)
+    totals = load(
+        args.path,
+        fmt,
+        chain=args.chain,
+        chunk_rows=max(args.chunk_rows, 1),
+        rejects_path=args.rejects,
+        created_by=args.created_by,
+    )
+    print(orjson.dumps(totals).decode())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
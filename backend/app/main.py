@@ -1,18 +1,74 @@
+import asyncio
 import json
 import os
 import random
 import secrets
+from contextlib import asynccontextmanager
+from datetime import datetime
 
-from fastapi import Depends, FastAPI, HTTPException
+import orjson
+from fastapi import Depends, FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
+from app.anchoring import (
+    anchor_batcher,
+    enqueue_anchor,
+    from_hex,
+    is_anchor_mode,
+    is_confirmed,
+    leaf_hash,
+    to_hex,
+    verify_proof,
+)
 from app.auth import generate_nonce, issue_jwt, verify_signature
-from app.blockchain import register_property_onchain
-from app.database import Base, engine, get_db
-from app.deps import get_current_user
+from app.blockchain import OnchainReadUnavailable, preload_chain_stack
+from app.database import (
+    SessionLocal,
+    engine,
+    get_db,
+    get_read_db,
+    init_schema,
+    mark_primary_reads,
+    replica_engines,
+    shard_engines,
+    should_create_schema,
+)
+from app.deps import decode_token, get_current_user, get_stream_user, require_admin
+from app.events import (
+    EVENTS_KEEPALIVE_SEC,
+    bus,
+    format_sse,
+    notify_wallets,
+    role_channel,
+    wallet_channel,
+)
+from app.observability import (
+    POS_ROUND_LATENCY,
+    MetricsMiddleware,
+    get_logger,
+    instrument_engine,
+    metrics_payload,
+    setup_logging,
+    stop_logging,
+    timed,
+)
+from app import archive
+from app.export import EXPORT_FORMATS, EXPORT_TABLES, export_stream, format_available
+from app.fastjson import FastJSONResponse, schema_columns, select_rows
+from app.jobs import jobs
+from app import ledger
+from app.onchain import onchain_cache
+from app.profiling import ProfiledRoute, ProfilingMiddleware, profiler
+from app.ratelimit import RateLimitMiddleware
+from app import repository
+from app.search import ensure_indexes as ensure_search_indexes, search_properties
 from app.models import (
-    Nonce,
+    AnchorBatch,
+    AnchorRecord,
     Property,
     Proposal,
     ProposalStatus,
@@ -23,30 +79,72 @@ from app.models import (
     PosValidation,
     PosStatus,
 )
+from app.tasks import CHAIN_FIELDS, CHAIN_PENDING, invalid_for_chain
 from app.schemas import (
+    AnchorProofOut,
+    AnchorVerifyIn,
+    AnchorVerifyOut,
     AssignRoleIn,
     PropertyCreate,
     PropertyOut,
     PropertyBrief,
+    PropertySearchOut,
     ProposalCreate,
     ProposalOut,
     ProposalDecisionIn,
+    PosValidationBatchIn,
     PosValidationIn,
     PosValidationOut,
     PosValidationAudit,
+    OnchainPropertyOut,
+    PropertyBookOut,
+    ProfilingConfigIn,
     AuditOut,
     TransferAudit,
     TransferActionIn,
+    TransferSignBatchIn,
+    TransferSignBatchOut,
     TransferOut,
     TokenOut,
     VerifySiweIn,
 )
 
 
-app = FastAPI(title="POC ID1 – Auth by Wallet")
+setup_logging()
+log = get_logger("app.main")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nada aqui roda na importação: importar app.main não conecta no banco nem carrega web3.
+    if should_create_schema():
+        init_schema()
+        for shard in shard_engines.values():
+            ensure_search_indexes(shard)
+    preload_chain_stack()
+    bus.start()
+    jobs.start()
+    # Começa a contar os CHAIN_PENDING cujos jobs se perderam na parada anterior.
+    jobs.enqueue("maintenance.recover_chain")
+    jobs.enqueue("maintenance.partitions")
+    if is_anchor_mode():
+        anchor_batcher.start()
+    yield
+    anchor_batcher.stop()
+    # Drena os jobs antes de parar o bus: notificações pendentes ainda são publicadas.
+    jobs.stop()
+    bus.stop()
+    stop_logging()
+
+
+app = FastAPI(title="POC ID1 – Auth by Wallet", lifespan=lifespan)
+# Rotas síncronas passam por ProfiledRoute para o profiler enxergar a thread do threadpool.
+app.router.route_class = ProfiledRoute
 
 origins = ["*"]
 
+# Adicionado antes do CORS para que o 429 também leve os headers CORS.
+app.add_middleware(RateLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -54,10 +152,25 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
-
-# Garante criação das tabelas em ambiente simples.
-Base.metadata.create_all(bind=engine)
-
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
+instrument_engine(engine)
+for _extra in [*replica_engines, *(shard for shard in shard_engines.values() if shard is not engine)]:
+    instrument_engine(_extra, pool_metrics=False)
+
+
+POS_BATCH_MAX = int(os.getenv("POS_BATCH_MAX", "10000"))
+POS_BATCH_CHUNK = max(int(os.getenv("POS_BATCH_CHUNK", "1000")), 1)
+TRANSFER_BATCH_MAX = int(os.getenv("TRANSFER_BATCH_MAX", "1000"))
+# Insert Core na tabela: o bulk insert do ORM não roda numa ShardedSession.
+# No Postgres o SQLAlchemy mantém um único INSERT ... VALUES por página e
+# devolve os ids na ordem dos parâmetros. O SQLite não tem esse suporte (cairia
+# em um INSERT por linha), mas numera o rowid na ordem do VALUES, então basta
+# ordenar os ids devolvidos.
+POS_BATCH_SORTED = engine.dialect.name != "sqlite"
+POS_BATCH_INSERT = insert(PosValidation.__table__).returning(
+    PosValidation.__table__.c.id, sort_by_parameter_order=POS_BATCH_SORTED
+)
 
 DEFAULT_VALIDATORS = [
     {"address": "0xvalidator1", "stake": 1_000},
@@ -86,20 +199,162 @@ def _select_validators(count: int = 3):
     return validators[: min(count, len(validators))]
 
 
-def _run_pos_validation(tx_reference: str, force_invalid: bool = False):
-    selected = _select_validators()
+def _pos_outcome(selected: list, force_invalid: bool = False):
+    """Resultado da rodada para validadores já escolhidos: (approvals, required, status, tx_hash)."""
     approvals = 0 if force_invalid else len(selected)
     required = len(selected)
     status = PosStatus.VALIDATED if approvals >= required else PosStatus.REJECTED
     tx_hash = f"pos-mock-{secrets.token_hex(8)}" if status == PosStatus.VALIDATED else None
+    return approvals, required, status, tx_hash
+
+
+def _run_pos_validation(tx_reference: str, force_invalid: bool = False):
+    with timed(POS_ROUND_LATENCY):
+        selected = _select_validators()
+        approvals, required, status, tx_hash = _pos_outcome(selected, force_invalid)
     return selected, approvals, required, status, tx_hash
 
 
+def _pos_batch_stream(tx_references: list[str], force_invalid: bool, by: str):
+    """
+    Valida um lote e devolve NDJSON, uma linha por referência na ordem recebida.
+
+    Os validadores são escolhidos uma vez para o lote todo. Cada bloco de
+    POS_BATCH_CHUNK resultados vira um único INSERT ... RETURNING (o id volta
+    na ordem dos parâmetros) seguido de commit, então o cliente recebe as
+    linhas já persistidas. Usa sessão própria porque as dependências do
+    FastAPI fecham a delas antes do corpo ser enviado. Se um bloco falhar, os
+    anteriores ficam gravados e a última linha traz o erro e quantos itens
+    foram processados.
+    """
+    selected = _select_validators()
+    addresses = [v.get("address") for v in selected]
+    addresses_json = json.dumps(addresses)
+    counts = {PosStatus.VALIDATED.value: 0, PosStatus.REJECTED.value: 0}
+    done = 0
+    db = SessionLocal()
+    try:
+        for start in range(0, len(tx_references), POS_BATCH_CHUNK):
+            rows = []
+            for tx_reference in tx_references[start : start + POS_BATCH_CHUNK]:
+                with timed(POS_ROUND_LATENCY):
+                    approvals, required, status, tx_hash = _pos_outcome(selected, force_invalid)
+                rows.append(
+                    {
+                        "tx_reference": tx_reference,
+                        "selected_validators": addresses_json,
+                        "approvals": approvals,
+                        "required": required,
+                        "status": status,
+                        "tx_hash": tx_hash,
+                    }
+                )
+            try:
+                ids = db.execute(POS_BATCH_INSERT, rows).scalars().all()
+                if not POS_BATCH_SORTED:
+                    ids.sort()
+                db.commit()
+            except SQLAlchemyError as exc:
+                db.rollback()
+                log.error("pos.batch_failed", processed=done, total=len(tx_references), error=str(exc), by=by)
+                yield orjson.dumps({"error": "Falha ao gravar o lote", "processed": done}) + b"\n"
+                return
+            lines = []
+            for record_id, row in zip(ids, rows):
+                status = row["status"].value
+                counts[status] += 1
+                lines.append(
+                    orjson.dumps(
+                        {
+                            "id": record_id,
+                            "tx_reference": row["tx_reference"],
+                            "status": status,
+                            "approvals": row["approvals"],
+                            "required": row["required"],
+                            "selected_validators": addresses,
+                            "tx_hash": row["tx_hash"],
+                        }
+                    )
+                )
+            done += len(rows)
+            yield b"\n".join(lines) + b"\n"
+    finally:
+        db.close()
+    log.info("pos.batch_validated", total=done, validators=addresses, by=by, **counts)
+
+
+def _event_channels(user: dict) -> set[str]:
+    """Canais que o usuário do JWT pode escutar: a própria carteira e o papel."""
+    channels = {wallet_channel(user.get("sub") or "")}
+    role = user.get("role", "USER")
+    if role in {Role.REGULATOR.value, Role.FINANCIAL.value}:
+        channels.add(role_channel(role))
+    return channels
+
+
+def _proposal_event(kind: str, proposal: Proposal) -> dict:
+    return {
+        "type": kind,
+        "proposal_id": proposal.id,
+        "matricula": proposal.matricula,
+        "status": proposal.status.value,
+        "owner_wallet": proposal.owner_wallet,
+        "proposer_wallet": proposal.proposer_wallet,
+    }
+
+
+def _transfer_event(kind: str, transfer: Transfer) -> dict:
+    return {
+        "type": kind,
+        "proposal_id": transfer.proposal_id,
+        "matricula": transfer.matricula,
+        "status": transfer.status.value,
+        "owner_signed": transfer.owner_signed,
+        "buyer_signed": transfer.buyer_signed,
+        "regulator_signed": transfer.regulator_signed,
+        "financial_signed": transfer.financial_signed,
+        "tx_hash": transfer.tx_hash,
+    }
+
+
+def _notify_transfer(kind: str, transfer: Transfer):
+    roles = []
+    if transfer.status == TransferStatus.PENDING:
+        # Regulador e agente financeiro precisam saber que há assinatura pendente.
+        if not transfer.regulator_signed:
+            roles.append(Role.REGULATOR.value)
+        if not transfer.financial_signed:
+            roles.append(Role.FINANCIAL.value)
+    notify_wallets(
+        [transfer.owner_wallet, transfer.buyer_wallet],
+        _transfer_event(kind, transfer),
+        roles=roles,
+    )
+
+
+
+def _apply_owner_change(prop: Property, majority: str | None):
+    """
+    Depois de liquidar uma fração o dono do registro só muda se o comprador
+    ficou com a maioria; numa venda minoritária o vendedor segue dono e pode
+    ofertar o restante.
+    """
+    if majority and majority != prop.current_owner.lower():
+        prop.previous_owner = prop.current_owner
+        prop.current_owner = majority
+
+
 @app.get("/health")
 def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    payload, content_type = metrics_payload()
+    return Response(content=payload, media_type=content_type)
+
+
 @app.post("/auth/siwe/start")
 def start_siwe(db: Session = Depends(get_db)):
     nonce = generate_nonce(db)
@@ -109,11 +364,7 @@ def start_siwe(db: Session = Depends(get_db)):
 @app.post("/auth/siwe/verify", response_model=TokenOut)
 def verify_siwe(payload: VerifySiweIn, db: Session = Depends(get_db)):
     # Verifica se nonce existe (opcional: expirar/consumir)
-    n = (
-        db.query(Nonce)
-        .filter(Nonce.nonce == payload.message.split("Nonce: ")[-1].split("\n")[0])
-        .first()
-    )
+    n = repository.nonce_by_value(db, payload.message.split("Nonce: ")[-1].split("\n")[0])
     if not n:
         raise HTTPException(status_code=400, detail="Invalid nonce")
 
@@ -121,7 +372,7 @@ def verify_siwe(payload: VerifySiweIn, db: Session = Depends(get_db)):
     if not ok:
         raise HTTPException(status_code=401, detail="Signature mismatch")
 
-    user = db.query(User).filter(User.wallet == payload.address.lower()).first()
+    user = repository.user_by_wallet(db, payload.address)
     if not user:
         user = User(wallet=payload.address.lower(), role=Role.USER)
         db.add(user)
@@ -142,7 +393,7 @@ def assign_role(body: AssignRoleIn, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Invalid role")
 
     w = body.wallet.lower()
-    user = db.query(User).filter(User.wallet == w).first()
+    user = repository.user_by_wallet(db, w)
     if not user:
         user = User(wallet=w, role=role)
         db.add(user)
@@ -152,6 +403,50 @@ def assign_role(body: AssignRoleIn, db: Session = Depends(get_db)):
     return {"wallet": w, "role": role.value}
 
 
+@app.get("/admin/jobs", dependencies=[Depends(require_admin)])
+def jobs_status():
+    """Filas do runner de jobs: configuração, itens enfileirados e em execução."""
+    return jobs.stats()
+
+
+@app.get("/admin/profiling", dependencies=[Depends(require_admin)])
+def profiling_status():
+    """Configuração atual e perfis mais lentos agrupados por rota."""
+    return {**profiler.status(), "profiles": profiler.store.grouped()}
+
+
+@app.post("/admin/profiling", dependencies=[Depends(require_admin)])
+def configure_profiling(body: ProfilingConfigIn):
+    profiler.configure(enabled=body.enabled, sample_rate=body.sample_rate)
+    return profiler.status()
+
+
+@app.delete("/admin/profiling", dependencies=[Depends(require_admin)])
+def clear_profiling():
+    profiler.store.clear()
+    return {"cleared": True}
+
+
+@app.get("/admin/profiling/{profile_id}", dependencies=[Depends(require_admin)])
+def download_profile(profile_id: int, format: str = "speedscope"):
+    """Baixa um perfil em `speedscope` (JSON) ou `pstats` (marshal, abre com pstats/snakeviz)."""
+    profile = profiler.store.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado")
+    if format == "speedscope":
+        return JSONResponse(
+            profile.to_speedscope(),
+            headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.speedscope.json"'},
+        )
+    if format == "pstats":
+        return Response(
+            content=profile.to_pstats(),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.pstats"'},
+        )
+    raise HTTPException(status_code=400, detail="format deve ser speedscope ou pstats")
+
+
 @app.post("/properties", response_model=PropertyOut)
 def register_property(
     payload: PropertyCreate,
@@ -159,21 +454,16 @@ def register_property(
     db: Session = Depends(get_db),
 ):
     # Garante unicidade de matrícula
-    existing = db.query(Property).filter(Property.matricula == payload.matricula).first()
+    existing = repository.property_by_matricula(db, payload.matricula)
     if existing:
         raise HTTPException(status_code=409, detail="Matrícula já registrada")
 
-    try:
-        tx_hash = register_property_onchain(
-            matricula=payload.matricula,
-            previous_owner=payload.previous_owner,
-            current_owner=payload.current_owner,
-            latitude=payload.latitude,
-            longitude=payload.longitude,
-        )
-    except Exception as exc:
-        raise HTTPException(status_code=500, detail=f"Erro ao registrar no contrato: {exc}")
-
+    anchored = is_anchor_mode()
+    if not anchored:
+        # No contrato v2 as wallets viram address: o que ele recusaria volta aqui, não no job.
+        error = invalid_for_chain(payload.model_dump(include=set(CHAIN_FIELDS)))
+        if error:
+            raise HTTPException(status_code=422, detail=error)
     prop = Property(
         matricula=payload.matricula,
         previous_owner=payload.previous_owner,
@@ -181,25 +471,153 @@ def register_property(
         description=payload.description,
         latitude=payload.latitude,
         longitude=payload.longitude,
-        tx_hash=tx_hash,
+        tx_hash=CHAIN_PENDING,
         created_by=user.get("sub"),
     )
     db.add(prop)
+    # A folha/o job usam o id da propriedade, então precisa do flush antes.
+    db.flush()
+    ledger.register_owner(db, prop.matricula, prop.current_owner)
+    if anchored:
+        prop.tx_hash = enqueue_anchor(
+            db,
+            kind="property",
+            ref_id=prop.id,
+            matricula=prop.matricula,
+            previous_owner=prop.previous_owner,
+            current_owner=prop.current_owner,
+            latitude=prop.latitude,
+            longitude=prop.longitude,
+        )
+    else:
+        # O envio ao contrato roda na fila "chain"; tx_hash fica CHAIN_PENDING até lá.
+        jobs.enqueue("chain.register_property", db=db, property_id=prop.id)
     db.commit()
     db.refresh(prop)
+    if anchored:
+        anchor_batcher.notify()
     return prop
 
 
 @app.get("/properties", response_model=list[PropertyBrief])
-def list_properties(db: Session = Depends(get_db)):
-    props = db.query(Property).order_by(Property.created_at.desc()).all()
-    return props
+def list_properties(db: Session = Depends(get_read_db)):
+    stmt = select(*schema_columns(Property, PropertyBrief)).order_by(Property.created_at.desc())
+    return FastJSONResponse(select_rows(db, stmt))
+
+
+@app.get("/properties/search", response_model=PropertySearchOut)
+def search_property(q: str, limit: int = 20, offset: int = 0, db: Session = Depends(get_read_db)):
+    """Busca por trecho de matrícula ou endereço/descrição, ordenada por relevância."""
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Informe o termo de busca em q")
+    if limit < 1 or limit > 100 or offset < 0:
+        raise HTTPException(status_code=400, detail="limit deve estar entre 1 e 100 e offset >= 0")
+    # Um item a mais indica se há próxima página sem contar o total.
+    hits = search_properties(db, q, limit + 1, offset)
+    return {
+        "query": q,
+        "limit": limit,
+        "offset": offset,
+        "has_more": len(hits) > limit,
+        "items": [{**PropertyBrief.model_validate(prop).model_dump(), "score": score} for prop, score in hits[:limit]],
+    }
 
 
 @app.get("/properties/owner/{wallet}", response_model=list[PropertyBrief])
-def list_properties_by_owner(wallet: str, db: Session = Depends(get_db)):
-    props = db.query(Property).filter(Property.current_owner == wallet.lower()).order_by(Property.created_at.desc()).all()
-    return props
+def list_properties_by_owner(wallet: str, db: Session = Depends(get_read_db)):
+    stmt = (
+        select(*schema_columns(Property, PropertyBrief))
+        .where(Property.current_owner == wallet.lower())
+        .order_by(Property.created_at.desc())
+    )
+    return FastJSONResponse(select_rows(db, stmt))
+
+
+@app.get("/properties/{matricula}/proofs", response_model=list[AnchorProofOut])
+def list_property_proofs(matricula: str, db: Session = Depends(get_read_db)):
+    """Provas de inclusão Merkle do registro e das transferências da matrícula."""
+    rows = (
+        db.query(AnchorRecord, AnchorBatch)
+        .outerjoin(AnchorBatch, AnchorBatch.id == AnchorRecord.batch_id)
+        .filter(AnchorRecord.matricula == matricula)
+        .order_by(AnchorRecord.id.asc())
+        .all()
+    )
+    if not rows:
+        raise HTTPException(status_code=404, detail="Nenhum registro ancorado para a matrícula")
+    return [
+        {
+            "kind": record.kind,
+            "ref_id": record.ref_id,
+            "matricula": record.matricula,
+            "payload": record.payload,
+            "leaf_hash": record.leaf_hash,
+            "status": "ANCHORED" if batch and is_confirmed(batch) else "SUBMITTED" if batch else "PENDING",
+            "root": batch.root if batch else None,
+            "tx_hash": batch.tx_hash if batch else None,
+            "leaf_index": record.leaf_index,
+            "proof": json.loads(record.proof) if record.proof else [],
+            "created_at": record.created_at,
+        }
+        for record, batch in rows
+    ]
+
+
+@app.get("/properties/{matricula}/book", response_model=PropertyBookOut)
+def property_book(matricula: str, depth: int = 10, db: Session = Depends(get_db)):
+    """Frações por carteira e melhores ofertas abertas (agregados incrementais)."""
+    if depth < 1 or depth > 100:
+        raise HTTPException(status_code=400, detail="depth deve estar entre 1 e 100")
+    if not repository.property_exists(db, matricula):
+        raise HTTPException(status_code=404, detail="Propriedade não encontrada")
+    return ledger.read_book(db, matricula, depth)
+
+
+@app.get("/properties/{matricula}/onchain", response_model=OnchainPropertyOut)
+def property_onchain(matricula: str, db: Session = Depends(get_read_db)):
+    """Compara o dono no banco com o estado do contrato (leitura via cache)."""
+    prop = repository.property_by_matricula(db, matricula)
+    if not prop:
+        raise HTTPException(status_code=404, detail="Propriedade não encontrada")
+    try:
+        onchain, block_number, cached = onchain_cache.get(matricula)
+    except OnchainReadUnavailable as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+    except Exception as exc:
+        raise HTTPException(status_code=502, detail=f"Erro ao consultar o contrato: {exc}")
+    return {
+        "matricula": prop.matricula,
+        "db_owner": prop.current_owner,
+        "onchain": onchain,
+        "in_sync": onchain is not None and onchain["current_owner"] == prop.current_owner.lower(),
+        "block_number": block_number,
+        "cached": cached,
+    }
+
+
+@app.post("/anchors/verify", response_model=AnchorVerifyOut)
+def verify_anchor(body: AnchorVerifyIn, db: Session = Depends(get_db)):
+    """Verifica localmente uma prova de inclusão contra a raiz informada."""
+    try:
+        if body.payload is not None:
+            leaf = leaf_hash(body.payload)
+        elif body.leaf_hash:
+            leaf = from_hex(body.leaf_hash)
+        else:
+            raise HTTPException(status_code=400, detail="Informe payload ou leaf_hash")
+        root = from_hex(body.root)
+        proof = [from_hex(p) for p in body.proof]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Hash hexadecimal inválido")
+
+    batch = db.query(AnchorBatch).filter(AnchorBatch.root == to_hex(root)).first()
+    return {
+        "valid": verify_proof(leaf, proof, root),
+        "leaf_hash": to_hex(leaf),
+        "root": to_hex(root),
+        "anchored": batch is not None and is_confirmed(batch),
+        "tx_hash": batch.tx_hash if batch else None,
+    }
 
 
 @app.post("/proposals", response_model=ProposalOut)
@@ -209,27 +627,39 @@ def create_proposal(
     db: Session = Depends(get_db),
 ):
     """Registra proposta de compra/divisão e notifica o proprietário (mock)."""
-    prop = db.query(Property).filter(Property.matricula == payload.matricula).first()
+    prop = repository.property_by_matricula(db, payload.matricula)
     if not prop:
         raise HTTPException(status_code=404, detail="Propriedade não encontrada")
 
     proposal = Proposal(
         matricula=payload.matricula,
         proposer_wallet=user.get("sub"),
-        owner_wallet=prop.current_owner,
+        # Com a propriedade fracionada a oferta pode ser feita a qualquer cotista.
+        owner_wallet=payload.owner_wallet.lower() if payload.owner_wallet else prop.current_owner,
         amount=payload.amount,
         fraction=payload.fraction,
         message=payload.message,
         status=ProposalStatus.PENDING,
     )
     db.add(proposal)
+    db.flush()
+    try:
+        ledger.on_proposal_created(db, proposal)
+    except ledger.LedgerError as exc:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=str(exc))
     db.commit()
     db.refresh(proposal)
 
-    # Mock de notificação
-    print(
-        f"[notificacao] Proposta {proposal.id} registrada para {prop.current_owner} "
-        f"(matrícula {proposal.matricula})"
+    log.info(
+        "proposal.created",
+        proposal_id=proposal.id,
+        matricula=proposal.matricula,
+        owner=proposal.owner_wallet,
+    )
+    notify_wallets(
+        [proposal.owner_wallet, proposal.proposer_wallet],
+        _proposal_event("proposal.created", proposal),
     )
 
     return proposal
@@ -241,29 +671,47 @@ def list_proposals(
     status: str | None = None,
     owner: str | None = None,
     proposer: str | None = None,
-    db: Session = Depends(get_db),
+    since: datetime | None = None,
+    until: datetime | None = None,
+    db: Session = Depends(get_read_db),
 ):
     """
     Lista propostas. Público nesta POC para facilitar testes; em produção, restringir por JWT.
+    Com `since`/`until` inclui as rejeitadas já arquivadas no período.
     """
+    filters = {}
     q = db.query(Proposal)
     if matricula:
         q = q.filter(Proposal.matricula == matricula)
+        filters["matricula"] = matricula
     if status:
         try:
             q = q.filter(Proposal.status == ProposalStatus(status.upper()))
+            filters["status"] = ProposalStatus(status.upper())
         except Exception:
             pass
     if owner:
         q = q.filter(Proposal.owner_wallet == owner.lower())
+        filters["owner_wallet"] = owner.lower()
     if proposer:
         q = q.filter(Proposal.proposer_wallet == proposer.lower())
-
-    return q.order_by(Proposal.created_at.desc()).all()
+        filters["proposer_wallet"] = proposer.lower()
+    if since:
+        q = q.filter(Proposal.created_at >= since)
+    if until:
+        q = q.filter(Proposal.created_at < until)
+
+    rows = q.order_by(Proposal.created_at.desc()).all()
+    # Só propostas rejeitadas vão para o arquivo.
+    if (since or until) and filters.get("status", ProposalStatus.REJECTED) == ProposalStatus.REJECTED:
+        rows = archive.merge_desc(
+            rows, archive.archived_rows(db, "proposals", since=since, until=until, filters=filters)
+        )
+    return rows
 
 
 @app.get("/proposals/me", response_model=list[ProposalOut])
-def list_my_proposals(user=Depends(get_current_user), db: Session = Depends(get_db)):
+def list_my_proposals(user=Depends(get_current_user), db: Session = Depends(get_read_db)):
     """Atalho para propostas onde sou owner ou proposer."""
     sub = (user.get("sub") or "").lower()
     q = (
@@ -282,7 +730,7 @@ def decide_proposal(
     db: Session = Depends(get_db),
 ):
     """Permite ao proprietário aceitar ou rejeitar proposta."""
-    proposal = db.query(Proposal).filter(Proposal.id == proposal_id).first()
+    proposal = repository.proposal_by_id(db, proposal_id)
     if not proposal:
         raise HTTPException(status_code=404, detail="Proposta não encontrada")
 
@@ -294,19 +742,29 @@ def decide_proposal(
         raise HTTPException(status_code=400, detail="Proposta já decidida")
 
     decision = payload.decision.upper()
-    if decision == "ACCEPT":
-        proposal.status = ProposalStatus.ACCEPTED
-    elif decision == "REJECT":
-        proposal.status = ProposalStatus.REJECTED
-    else:
+    if decision not in {"ACCEPT", "REJECT"}:
         raise HTTPException(status_code=400, detail="Decision deve ser ACCEPT ou REJECT")
 
+    # O livro lê o status atual, então é atualizado antes da mudança.
+    try:
+        ledger.on_proposal_decided(db, proposal, accepted=decision == "ACCEPT")
+    except ledger.LedgerError as exc:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=str(exc))
+    proposal.status = ProposalStatus.ACCEPTED if decision == "ACCEPT" else ProposalStatus.REJECTED
+
     db.commit()
     db.refresh(proposal)
 
-    print(
-        f"[notificacao] Proposta {proposal.id} {proposal.status.value} para comprador "
-        f"{proposal.proposer_wallet}"
+    log.info(
+        "proposal.decided",
+        proposal_id=proposal.id,
+        status=proposal.status.value,
+        proposer=proposal.proposer_wallet,
+    )
+    notify_wallets(
+        [proposal.owner_wallet, proposal.proposer_wallet],
+        _proposal_event("proposal.decided", proposal),
     )
 
     return proposal
@@ -319,7 +777,7 @@ def initiate_transfer(
     db: Session = Depends(get_db),
 ):
     """Cria um fluxo de multiassinatura para transferência com base em proposta aceita."""
-    proposal = db.query(Proposal).filter(Proposal.id == proposal_id).first()
+    proposal = repository.proposal_by_id(db, proposal_id)
     if not proposal:
         raise HTTPException(status_code=404, detail="Proposta não encontrada")
     if proposal.status != ProposalStatus.ACCEPTED:
@@ -329,7 +787,7 @@ def initiate_transfer(
     if wallet != proposal.owner_wallet.lower():
         raise HTTPException(status_code=403, detail="Somente o proprietário inicia a transferência")
 
-    existing = db.query(Transfer).filter(Transfer.proposal_id == proposal_id).first()
+    existing = repository.transfer_by_proposal(db, proposal_id)
     if existing:
         return existing
 
@@ -342,6 +800,7 @@ def initiate_transfer(
     db.add(transfer)
     db.commit()
     db.refresh(transfer)
+    _notify_transfer("transfer.initiated", transfer)
     return transfer
 
 
@@ -349,10 +808,10 @@ def initiate_transfer(
 def get_transfer_by_proposal(
     proposal_id: int,
     user=Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     """Detalhe da transferência ligada à proposta."""
-    transfer = db.query(Transfer).filter(Transfer.proposal_id == proposal_id).first()
+    transfer = repository.transfer_by_proposal(db, proposal_id)
     if not transfer:
         raise HTTPException(status_code=404, detail="Transferência não encontrada")
     role = user.get("role", "USER")
@@ -373,7 +832,7 @@ def sign_transfer(
     db: Session = Depends(get_db),
 ):
     """Coleta assinaturas: proprietário, comprador, regulador, agente financeiro."""
-    transfer = db.query(Transfer).filter(Transfer.proposal_id == proposal_id).first()
+    transfer = repository.transfer_by_proposal(db, proposal_id)
     if not transfer:
         raise HTTPException(status_code=404, detail="Transferência não encontrada")
     if transfer.status != TransferStatus.PENDING:
@@ -398,10 +857,12 @@ def sign_transfer(
         raise HTTPException(status_code=403, detail="Sem permissão para assinar")
 
     if action == "REJECT":
+        ledger.on_transfer_settled(db, transfer, executed=False)
         transfer.status = TransferStatus.REJECTED
         db.commit()
         db.refresh(transfer)
-        print(f"[notificacao] Transferência rejeitada por {wallet}")
+        log.info("transfer.rejected", proposal_id=proposal_id, by=wallet)
+        _notify_transfer("transfer.rejected", transfer)
         return transfer
 
     # Verifica se todas as assinaturas foram coletadas
@@ -411,23 +872,34 @@ def sign_transfer(
         and transfer.regulator_signed
         and transfer.financial_signed
     ):
-        # Executa a transferência on-chain (mockável)
-        prop = db.query(Property).filter(Property.matricula == transfer.matricula).first()
+        # Executa a transferência; a escrita on-chain vai para a fila (ou para o lote Merkle).
+        prop = repository.property_by_matricula(db, transfer.matricula)
         if not prop:
             raise HTTPException(status_code=404, detail="Propriedade não encontrada")
         try:
-            tx_hash = register_property_onchain(
-                matricula=transfer.matricula,
-                previous_owner=prop.current_owner,
-                current_owner=transfer.buyer_wallet,
-                latitude=prop.latitude,
-                longitude=prop.longitude,
-            )
+            majority = ledger.on_transfer_settled(db, transfer, executed=True)
+        except ledger.LedgerError as exc:
+            db.rollback()
+            raise HTTPException(status_code=409, detail=str(exc))
+        try:
+            # Atualiza propriedade para refletir transferência.
+            _apply_owner_change(prop, majority)
+            if is_anchor_mode():
+                tx_hash = enqueue_anchor(
+                    db,
+                    kind="transfer",
+                    ref_id=transfer.id,
+                    matricula=transfer.matricula,
+                    previous_owner=prop.previous_owner,
+                    current_owner=prop.current_owner,
+                    latitude=prop.latitude,
+                    longitude=prop.longitude,
+                )
+            else:
+                tx_hash = CHAIN_PENDING
+                jobs.enqueue("chain.execute_transfer", db=db, transfer_id=transfer.id)
             transfer.tx_hash = tx_hash
             transfer.status = TransferStatus.EXECUTED
-            # Atualiza propriedade para refletir transferência.
-            prop.previous_owner = prop.current_owner
-            prop.current_owner = transfer.buyer_wallet
             prop.tx_hash = tx_hash
         except Exception as exc:
             db.rollback()
@@ -436,12 +908,227 @@ def sign_transfer(
     db.commit()
     db.refresh(transfer)
     if transfer.status == TransferStatus.EXECUTED:
-        print(
-            f"[notificacao] Transferência executada para {transfer.matricula} tx={transfer.tx_hash}"
+        log.info(
+            "transfer.executed",
+            proposal_id=proposal_id,
+            matricula=transfer.matricula,
+            tx_hash=transfer.tx_hash,
         )
+        anchor_batcher.notify()
+        _notify_transfer("transfer.executed", transfer)
+    else:
+        _notify_transfer("transfer.signed", transfer)
     return transfer
 
 
+@app.post("/transfers/sign-batch", response_model=TransferSignBatchOut)
+def sign_transfers_batch(
+    payload: TransferSignBatchIn,
+    user=Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Assina (ou rejeita) várias transferências pendentes de uma vez, para
+    regulador e agente financeiro. Tudo numa transação, com as linhas travadas;
+    cada item tem o próprio resultado e um item inválido não derruba os outros.
+    As que ficam com as quatro assinaturas vão juntas para a chain num único
+    job (ou no lote Merkle, em ANCHOR_MODE).
+    """
+    wallet = (user.get("sub") or "").lower()
+    role = user.get("role", "USER")
+    if role not in {Role.REGULATOR.value, Role.FINANCIAL.value}:
+        raise HTTPException(status_code=403, detail="Apenas regulador ou agente financeiro assinam em lote")
+    action = payload.action.upper()
+    if action not in {"SIGN", "REJECT"}:
+        raise HTTPException(status_code=400, detail="Action deve ser SIGN ou REJECT")
+    proposal_ids = list(dict.fromkeys(payload.proposal_ids))
+    if not proposal_ids:
+        raise HTTPException(status_code=400, detail="proposal_ids vazio")
+    if len(proposal_ids) > TRANSFER_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"Lote acima do máximo de {TRANSFER_BATCH_MAX} transferências")
+
+    # Trava transferências e propriedades em ordem fixa para lotes concorrentes não se travarem.
+    transfers = {
+        t.proposal_id: t
+        for t in db.execute(
+            select(Transfer).where(Transfer.proposal_id.in_(proposal_ids)).order_by(Transfer.id).with_for_update()
+        ).scalars()
+    }
+    matriculas = sorted({t.matricula for t in transfers.values() if t.status == TransferStatus.PENDING})
+    props = {}
+    if matriculas:
+        props = {
+            p.matricula: p
+            for p in db.execute(
+                select(Property).where(Property.matricula.in_(matriculas)).order_by(Property.id).with_for_update()
+            ).scalars()
+        }
+
+    items, executed, rejected, signed = [], [], [], []
+    for proposal_id in proposal_ids:
+        transfer = transfers.get(proposal_id)
+        if transfer is None:
+            items.append({"proposal_id": proposal_id, "ok": False, "error": "Transferência não encontrada"})
+            continue
+        if transfer.status != TransferStatus.PENDING:
+            items.append(
+                {
+                    "proposal_id": proposal_id,
+                    "ok": False,
+                    "status": transfer.status.value,
+                    "error": "Transferência já decidida",
+                }
+            )
+            continue
+
+        # Mesma precedência de sign_transfer: quem é parte assina como parte.
+        if wallet == transfer.owner_wallet.lower():
+            field = "owner_signed"
+        elif wallet == transfer.buyer_wallet.lower():
+            field = "buyer_signed"
+        elif role == Role.REGULATOR.value:
+            field = "regulator_signed"
+        else:
+            field = "financial_signed"
+        previous = getattr(transfer, field)
+        setattr(transfer, field, action == "SIGN")
+
+        if action == "REJECT":
+            ledger.on_transfer_settled(db, transfer, executed=False)
+            transfer.status = TransferStatus.REJECTED
+            rejected.append(transfer)
+        elif (
+            transfer.owner_signed
+            and transfer.buyer_signed
+            and transfer.regulator_signed
+            and transfer.financial_signed
+        ):
+            prop = props.get(transfer.matricula)
+            error = None if prop else "Propriedade não encontrada"
+            majority = None
+            if prop:
+                try:
+                    majority = ledger.on_transfer_settled(db, transfer, executed=True)
+                except ledger.LedgerError as exc:
+                    error = str(exc)
+            if error:
+                # on_transfer_settled valida antes de alterar saldos: basta desfazer a assinatura.
+                setattr(transfer, field, previous)
+                items.append({"proposal_id": proposal_id, "ok": False, "status": transfer.status.value, "error": error})
+                continue
+            try:
+                _apply_owner_change(prop, majority)
+                if is_anchor_mode():
+                    tx_hash = enqueue_anchor(
+                        db,
+                        kind="transfer",
+                        ref_id=transfer.id,
+                        matricula=transfer.matricula,
+                        previous_owner=prop.previous_owner,
+                        current_owner=prop.current_owner,
+                        latitude=prop.latitude,
+                        longitude=prop.longitude,
+                    )
+                else:
+                    tx_hash = CHAIN_PENDING
+            except Exception as exc:
+                db.rollback()
+                raise HTTPException(status_code=500, detail=f"Falha ao executar transferência: {exc}")
+            transfer.tx_hash = tx_hash
+            transfer.status = TransferStatus.EXECUTED
+            prop.tx_hash = tx_hash
+            executed.append(transfer)
+        else:
+            signed.append(transfer)
+        items.append(
+            {"proposal_id": proposal_id, "ok": True, "status": transfer.status.value, "tx_hash": transfer.tx_hash}
+        )
+
+    pending_chain = [t.id for t in executed if t.tx_hash == CHAIN_PENDING]
+    if pending_chain:
+        jobs.enqueue("chain.execute_transfers", db=db, transfer_ids=pending_chain)
+    # Resposta e eventos usam o estado em memória, sem recarregar cada linha após o commit.
+    db.expire_on_commit = False
+    db.commit()
+
+    log.info(
+        "transfer.batch_signed",
+        by=wallet,
+        action=action,
+        signed=len(signed),
+        executed=len(executed),
+        rejected=len(rejected),
+        failed=len(items) - len(signed) - len(executed) - len(rejected),
+    )
+    if executed:
+        anchor_batcher.notify()
+    for kind, group in (("transfer.executed", executed), ("transfer.rejected", rejected), ("transfer.signed", signed)):
+        for transfer in group:
+            _notify_transfer(kind, transfer)
+    return {
+        "signed": len(signed),
+        "executed": len(executed),
+        "rejected": len(rejected),
+        "failed": len(items) - len(signed) - len(executed) - len(rejected),
+        "items": items,
+    }
+
+
+@app.get("/events/stream")
+async def stream_events(request: Request, user=Depends(get_stream_user)):
+    """SSE com mudanças de propostas/transferências da carteira autenticada."""
+    sub = bus.subscribe(_event_channels(user))
+
+    async def gen():
+        try:
+            yield ": conectado\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), EVENTS_KEEPALIVE_SEC)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            bus.unsubscribe(sub)
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(gen(), media_type="text/event-stream", headers=headers)
+
+
+@app.websocket("/events/ws")
+async def ws_events(websocket: WebSocket, token: str | None = None):
+    """Mesmo fluxo do SSE via WebSocket (token JWT em `?token=`)."""
+    user = decode_token(token)
+    if user is None:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    sub = bus.subscribe(_event_channels(user))
+
+    async def drain_client():
+        # Só serve para detectar desconexão; mensagens do cliente são ignoradas.
+        while True:
+            await websocket.receive_text()
+
+    reader = asyncio.create_task(drain_client())
+    try:
+        while True:
+            get = asyncio.create_task(sub.queue.get())
+            done, _ = await asyncio.wait({get, reader}, return_when=asyncio.FIRST_COMPLETED)
+            if reader in done:
+                get.cancel()
+                break
+            await websocket.send_json(get.result())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        reader.cancel()
+        if reader.done() and not reader.cancelled():
+            reader.exception()
+        bus.unsubscribe(sub)
+
+
 @app.post("/pos/validate", response_model=PosValidationOut)
 def validate_pos(
     payload: PosValidationIn,
@@ -470,9 +1157,13 @@ def validate_pos(
     db.commit()
     db.refresh(record)
 
-    print(
-        f"[pos] tx {record.tx_reference} status={record.status.value} "
-        f"validadores={addresses} approvals={approvals}/{required}"
+    log.info(
+        "pos.validated",
+        tx_reference=record.tx_reference,
+        status=record.status.value,
+        validators=addresses,
+        approvals=approvals,
+        required=required,
     )
 
     return {
@@ -486,87 +1177,148 @@ def validate_pos(
     }
 
 
+@app.post("/pos/validate/batch")
+def validate_pos_batch(
+    payload: PosValidationBatchIn,
+    user=Depends(get_current_user),
+):
+    """
+    Valida um lote de transações de uma vez. A resposta é NDJSON com um
+    PosValidationOut por referência, na ordem enviada.
+    """
+    role = user.get("role", "USER")
+    if role not in {Role.REGULATOR.value, Role.FINANCIAL.value}:
+        raise HTTPException(status_code=403, detail="Apenas administradores podem validar")
+    if not payload.tx_references:
+        raise HTTPException(status_code=400, detail="tx_references vazio")
+    if len(payload.tx_references) > POS_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"Lote acima do máximo de {POS_BATCH_MAX} referências")
+    if any(not ref or len(ref) > 128 for ref in payload.tx_references):
+        raise HTTPException(status_code=400, detail="tx_reference deve ter de 1 a 128 caracteres")
+
+    stream = StreamingResponse(
+        _pos_batch_stream(payload.tx_references, payload.force_invalid, user.get("sub")),
+        media_type="application/x-ndjson",
+    )
+    mark_primary_reads(stream)
+    return stream
+
+
 @app.get("/pos/validations", response_model=list[PosValidationAudit])
 def list_pos_validations(
     tx_reference: str | None = None,
     status: str | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
     user=Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
-    """Lista validações PoS (apenas regulador/financeiro)."""
+    """
+    Lista validações PoS (apenas regulador/financeiro). Com `since`/`until`
+    inclui também o histórico arquivado do período.
+    """
     role = user.get("role", "USER")
     if role not in {Role.REGULATOR.value, Role.FINANCIAL.value}:
         raise HTTPException(status_code=403, detail="Apenas administradores podem consultar")
 
-    q = db.query(PosValidation)
+    filters = {}
+    columns = schema_columns(PosValidation, PosValidationAudit)
+    stmt = select(*columns)
     if tx_reference:
-        q = q.filter(PosValidation.tx_reference == tx_reference)
+        stmt = stmt.where(PosValidation.tx_reference == tx_reference)
+        filters["tx_reference"] = tx_reference
     if status:
         try:
-            q = q.filter(PosValidation.status == PosStatus(status.upper()))
+            stmt = stmt.where(PosValidation.status == PosStatus(status.upper()))
+            filters["status"] = PosStatus(status.upper())
         except Exception:
             pass
-
-    rows = q.order_by(PosValidation.created_at.desc()).all()
-    out = []
-    for r in rows:
-        validators = json.loads(r.selected_validators) if r.selected_validators else []
-        out.append(
-            {
-                "id": r.id,
-                "tx_reference": r.tx_reference,
-                "status": r.status.value,
-                "approvals": r.approvals,
-                "required": r.required,
-                "selected_validators": validators,
-                "tx_hash": r.tx_hash,
-                "created_at": r.created_at,
-            }
+    if since:
+        stmt = stmt.where(PosValidation.created_at >= since)
+    if until:
+        stmt = stmt.where(PosValidation.created_at < until)
+
+    rows = select_rows(db, stmt.order_by(PosValidation.created_at.desc()))
+    if since or until:
+        cold = archive.archived_rows(db, "pos_validations", since=since, until=until, filters=filters)
+        rows = archive.merge_desc(
+            rows,
+            [{column.key: getattr(r, column.key) for column in columns} for r in cold],
+            created_at=lambda row: row["created_at"],
         )
-    return out
+    for row in rows:
+        # Guardado como texto JSON; orjson.loads é bem mais rápido que json.loads.
+        row["selected_validators"] = orjson.loads(row["selected_validators"]) if row["selected_validators"] else []
+    return FastJSONResponse(rows)
 
 
 @app.get("/audit/transfers", response_model=list[TransferAudit])
 def audit_all_transfers(
     user=Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     """Lista todas as transferências iniciadas com status atual (apenas regulador)."""
     role = user.get("role", "USER")
     if role != Role.REGULATOR.value:
         raise HTTPException(status_code=403, detail="Apenas regulador pode consultar histórico")
 
-    transfers = db.query(Transfer).order_by(Transfer.created_at.desc()).all()
-    return transfers
+    stmt = select(*schema_columns(Transfer, TransferAudit)).order_by(Transfer.created_at.desc())
+    return FastJSONResponse(select_rows(db, stmt))
+
+
+@app.get("/audit/export")
+def audit_export(
+    table: str,
+    format: str = "ndjson",
+    since: datetime | None = None,
+    until: datetime | None = None,
+    after_id: int = 0,
+    limit: int | None = None,
+    user=Depends(get_current_user),
+):
+    """
+    Exporta uma tabela inteira em streaming (apenas regulador). Para retomar,
+    repita a chamada com `after_id` igual ao último id recebido.
+    """
+    if user.get("role", "USER") != Role.REGULATOR.value:
+        raise HTTPException(status_code=403, detail="Apenas regulador pode exportar")
+    if table not in EXPORT_TABLES:
+        raise HTTPException(status_code=400, detail=f"table deve ser um de: {', '.join(EXPORT_TABLES)}")
+    fmt = format.lower()
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format deve ser um de: {', '.join(EXPORT_FORMATS)}")
+    if not format_available(fmt):
+        raise HTTPException(status_code=501, detail="Exportação parquet requer pyarrow instalado")
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=400, detail="limit deve ser positivo")
+
+    ext, media_type = EXPORT_FORMATS[fmt]
+    filename = f"{table}-after-{after_id}.{ext}"
+    log.info("audit.export", table=table, format=fmt, after_id=after_id, by=user.get("sub"))
+    return StreamingResponse(
+        export_stream(table, fmt, since=since, until=until, after_id=after_id, limit=limit),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
 @app.get("/audit/{matricula}", response_model=AuditOut)
 def audit_history(
     matricula: str,
     user=Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     """Retorna histórico auditável para regulador."""
     role = user.get("role", "USER")
     if role != Role.REGULATOR.value:
         raise HTTPException(status_code=403, detail="Apenas regulador pode consultar histórico")
 
-    prop = db.query(Property).filter(Property.matricula == matricula).first()
+    prop = repository.property_by_matricula(db, matricula)
     if not prop:
         raise HTTPException(status_code=404, detail="Propriedade não encontrada")
 
-    proposals = (
-        db.query(Proposal)
-        .filter(Proposal.matricula == matricula)
-        .order_by(Proposal.created_at.asc())
-        .all()
-    )
-    transfers = (
-        db.query(Transfer)
-        .filter(Transfer.matricula == matricula)
-        .order_by(Transfer.created_at.asc())
-        .all()
-    )
+    proposals = repository.proposals_by_matricula(db, matricula)
+    transfers = repository.transfers_by_matricula(db, matricula)
 
     return {
         "matricula": prop.matricula,
@@ -1,4 +1,4 @@
-from sqlalchemy import String, Enum, DateTime, func, Float, Text
+from sqlalchemy import String, Enum, DateTime, func, Float, Text, Index, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column
 from .database import Base
 import enum
@@ -96,4 +96,129 @@ class PosValidation(Base):
     required: Mapped[int] = mapped_column(default=3)
     status: Mapped[PosStatus] = mapped_column(Enum(PosStatus), default=PosStatus.PENDING)
     tx_hash: Mapped[str | None] = mapped_column(String(128), nullable=True)
+    # Chave de partição no Postgres e filtro das listagens por período.
+    created_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+
+class AnchorBatch(Base):
+    __tablename__ = "anchor_batches"
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    root: Mapped[str] = mapped_column(String(66), unique=True, index=True)
+    tx_hash: Mapped[str] = mapped_column(String(128))
+    leaf_count: Mapped[int] = mapped_column()
     created_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class AnchorRecord(Base):
+    """Registro ou transferência aguardando (ou já incluído em) uma raiz Merkle."""
+
+    __tablename__ = "anchor_records"
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    kind: Mapped[str] = mapped_column(String(16))
+    ref_id: Mapped[int] = mapped_column()
+    matricula: Mapped[str] = mapped_column(String(128), index=True)
+    payload: Mapped[str] = mapped_column(Text)
+    leaf_hash: Mapped[str] = mapped_column(String(66), index=True)
+    batch_id: Mapped[int | None] = mapped_column(nullable=True, index=True)
+    leaf_index: Mapped[int | None] = mapped_column(nullable=True)
+    proof: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class Job(Base):
+    """Fila durável do JobRunner (JOBS_BACKEND=postgres)."""
+
+    __tablename__ = "jobs"
+    __table_args__ = (Index("ix_jobs_claim", "queue", "status", "run_at"),)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    queue: Mapped[str] = mapped_column(String(32))
+    name: Mapped[str] = mapped_column(String(64))
+    payload: Mapped[str] = mapped_column(Text)
+    status: Mapped[str] = mapped_column(String(16), default="queued")
+    attempts: Mapped[int] = mapped_column(default=0)
+    max_retries: Mapped[int] = mapped_column(default=5)
+    run_at: Mapped[str] = mapped_column(DateTime(timezone=True))
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[str] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
+class PropertyShare(Base):
+    """Livro de frações: participação de cada carteira em pontos-base (10000 = 100%)."""
+
+    __tablename__ = "property_shares"
+    __table_args__ = (UniqueConstraint("matricula", "owner_wallet", name="uq_property_shares_owner"),)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    matricula: Mapped[str] = mapped_column(String(128), index=True)
+    owner_wallet: Mapped[str] = mapped_column(String(64), index=True)
+    shares_bps: Mapped[int] = mapped_column()
+    # Parte de shares_bps reservada em propostas aceitas ainda não liquidadas.
+    committed_bps: Mapped[int] = mapped_column(default=0)
+    updated_at: Mapped[str] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
+class PropertyBook(Base):
+    """Agregados da matrícula mantidos a cada proposta/decisão/transferência."""
+
+    __tablename__ = "property_books"
+    matricula: Mapped[str] = mapped_column(String(128), primary_key=True)
+    total_offered_bps: Mapped[int] = mapped_column(default=0)
+    total_committed_bps: Mapped[int] = mapped_column(default=0)
+    open_bids: Mapped[int] = mapped_column(default=0)
+    best_bid_proposal_id: Mapped[int | None] = mapped_column(nullable=True)
+    best_bid_price: Mapped[float | None] = mapped_column(Float, nullable=True)
+    updated_at: Mapped[str] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
+class BookBid(Base):
+    """Propostas em aberto; o índice (matricula, unit_price) serve melhor oferta e profundidade."""
+
+    __tablename__ = "book_bids"
+    __table_args__ = (Index("ix_book_bids_price", "matricula", "unit_price"),)
+    proposal_id: Mapped[int] = mapped_column(primary_key=True)
+    matricula: Mapped[str] = mapped_column(String(128))
+    proposer_wallet: Mapped[str] = mapped_column(String(64))
+    fraction_bps: Mapped[int] = mapped_column()
+    amount: Mapped[float] = mapped_column(Float)
+    # Preço normalizado para 100% da propriedade, para comparar frações diferentes.
+    unit_price: Mapped[float] = mapped_column(Float)
+
+
+class ArchiveSegment(Base):
+    """Arquivo frio com linhas movidas para fora do banco (ver app/archive.py)."""
+
+    __tablename__ = "archive_segments"
+    __table_args__ = (Index("ix_archive_segments_range", "table_name", "range_start", "range_end"),)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    table_name: Mapped[str] = mapped_column(String(64))
+    range_start: Mapped[str] = mapped_column(DateTime(timezone=True))
+    range_end: Mapped[str] = mapped_column(DateTime(timezone=True))
+    row_count: Mapped[int] = mapped_column()
+    path: Mapped[str] = mapped_column(String(512))
+    format: Mapped[str] = mapped_column(String(16))
+    created_at: Mapped[str] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class ShardBucket(Base):
+    """Mapa bucket -> shard (ver app/sharding.py). Fica no banco principal; buckets sem linha ficam no s0."""
+
+    __tablename__ = "shard_buckets"
+    bucket: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    shard: Mapped[str] = mapped_column(String(16))
+    updated_at: Mapped[str] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
+class ShardSequence(Base):
+    """Próximo id livre das tabelas distribuídas, para os ids não colidirem entre shards."""
+
+    __tablename__ = "shard_sequences"
+    name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    next_id: Mapped[int] = mapped_column()
@@ -0,0 +1,256 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# Campos padrão do LogRecord que não entram no JSON como contexto.
+_RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED:
+                data[key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+class _FieldsAdapter(logging.LoggerAdapter):
+    """Permite `log.info("evento", campo=valor)`; kwargs extras viram contexto."""
+
+    def process(self, msg, kwargs):
+        std = {k: kwargs.pop(k) for k in ("exc_info", "stack_info", "stacklevel") if k in kwargs}
+        extra = {**(self.extra or {}), **kwargs.pop("extra", {}), **kwargs}
+        return msg, {**std, "extra": extra}
+
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+def setup_logging():
+    """
+    Liga o logger "app" a um QueueHandler: o handler da requisição só enfileira
+    e uma thread separada escreve no stdout, sem bloquear a request em I/O.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    q: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(q)
+    queue_handler.setFormatter(JsonFormatter())
+    stream = logging.StreamHandler(sys.stdout)
+
+    root = logging.getLogger("app")
+    root.setLevel(LOG_LEVEL)
+    root.handlers = [queue_handler]
+    root.propagate = False
+
+    _listener = logging.handlers.QueueListener(q, stream)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def reset_logging_after_fork():
+    """A thread do QueueListener não sobrevive ao fork; recria fila e listener no worker."""
+    global _listener
+    _listener = None
+    setup_logging()
+
+
+def get_logger(name: str) -> logging.LoggerAdapter:
+    return _FieldsAdapter(logging.getLogger(name), {})
+
+
+# --- Métricas -----------------------------------------------------------------
+
+_FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Latência das requisições HTTP por rota",
+    ["method", "route", "status"],
+)
+DB_QUERY_LATENCY = Histogram(
+    "db_query_duration_seconds",
+    "Tempo de execução de statements SQL",
+    ["operation"],
+    buckets=_FAST_BUCKETS,
+)
+CHAIN_SUBMIT_LATENCY = Histogram(
+    "chain_submit_duration_seconds",
+    "Tempo de register_property_onchain",
+    ["mode", "outcome"],
+)
+RPC_REQUEST_LATENCY = Histogram(
+    "rpc_request_duration_seconds",
+    "Latência das chamadas JSON-RPC por endpoint",
+    ["endpoint", "outcome"],
+)
+RPC_HEDGED_READS = Counter(
+    "rpc_hedged_reads_total",
+    "Leituras JSON-RPC repetidas em um segundo endpoint",
+    ["winner"],
+)
+SIGNATURE_RECOVERY_LATENCY = Histogram(
+    "siwe_signature_recovery_seconds",
+    "Tempo de recuperação da assinatura SIWE",
+    buckets=_FAST_BUCKETS,
+)
+JWT_DECODE_LATENCY = Histogram(
+    "jwt_decode_seconds",
+    "Tempo de decodificação do JWT",
+    buckets=_FAST_BUCKETS,
+)
+POS_ROUND_LATENCY = Histogram(
+    "pos_round_duration_seconds",
+    "Duração de uma rodada de validação PoS",
+    buckets=_FAST_BUCKETS,
+)
+JOB_DURATION = Histogram(
+    "job_duration_seconds",
+    "Execução de jobs em segundo plano",
+    ["queue", "name", "outcome"],
+)
+ONCHAIN_CACHE_REQUESTS = Counter(
+    "onchain_cache_requests_total",
+    "Consultas ao cache de estado on-chain",
+    ["result"],
+)
+DB_READ_ROUTE = Counter(
+    "db_read_route_total",
+    "Sessões de leitura por destino (réplica ou primário)",
+    ["target"],
+)
+# Atualizados nos eventos de checkout/checkin do pool (funciona também com vários workers).
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "Conexões em uso no pool", multiprocess_mode="livesum"
+)
+DB_POOL_SATURATION = Gauge(
+    "db_pool_saturation", "Conexões em uso / capacidade do pool", multiprocess_mode="livemax"
+)
+
+
+@contextmanager
+def timed(histogram, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        target = histogram.labels(**labels) if labels else histogram
+        target.observe(time.perf_counter() - start)
+
+
+def instrument_engine(engine: Engine, pool_metrics: bool = True):
+    """Registra listeners de engine para medir queries e expor o uso do pool."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append((cursor, time.perf_counter()))
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        _, start = conn.info["query_start"].pop()
+        operation = statement.lstrip().split(" ", 1)[0].upper() or "OTHER"
+        DB_QUERY_LATENCY.labels(operation=operation).observe(time.perf_counter() - start)
+
+    @event.listens_for(engine, "handle_error")
+    def _on_error(exception_context):
+        # Statement que falhou não dispara after_cursor_execute: tira a entrada dele da
+        # pilha, senão ela cresce e o próximo _after mede a partir do início errado.
+        conn, context = exception_context.connection, exception_context.execution_context
+        stack = conn.info.get("query_start") if conn is not None else None
+        if stack and context is not None and stack[-1][0] is context.cursor:
+            stack.pop()
+
+    def _record_pool(returning: int):
+        # engine.pool muda após dispose() (ex.: pós-fork), então é lido a cada evento.
+        pool = engine.pool
+        if not hasattr(pool, "checkedout"):
+            return
+        in_use = max(pool.checkedout() - returning, 0)
+        capacity = pool.size() + max(getattr(pool, "_max_overflow", 0), 0)
+        DB_POOL_CHECKED_OUT.set(in_use)
+        DB_POOL_SATURATION.set(in_use / capacity if capacity else 0.0)
+
+    if not pool_metrics:
+        # Os gauges do pool descrevem só o primário.
+        return
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        _record_pool(0)
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        # O evento dispara antes da conexão voltar para a fila.
+        _record_pool(1)
+
+
+class MetricsMiddleware:
+    """Middleware ASGI puro (sem BaseHTTPMiddleware) que mede latência por rota."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                method=scope["method"],
+                # Usa o template da rota para não explodir a cardinalidade.
+                route=getattr(route, "path", "unmatched"),
+                status=str(status["code"]),
+            ).observe(time.perf_counter() - start)
+
+
+def metrics_payload() -> tuple[bytes, str]:
+    # Com vários workers (gunicorn) cada processo grava em PROMETHEUS_MULTIPROC_DIR
+    # e o scrape agrega todos, independente de qual worker atendeu.
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import CollectorRegistry, multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,256 @@
+"""
+Leitura do estado on-chain com cache read-through.
+
+Cada entrada guarda o bloco em que foi lida e expira após ONCHAIN_CACHE_TTL_S;
+antes disso, só é descartada se um evento PropertyRegistered da matrícula
+aparecer em um bloco posterior ao da leitura (consultado no máximo a cada
+ONCHAIN_EVENT_POLL_S). Leitura feita num bloco anterior ao último sincronizado
+é devolvida mas não guardada: os eventos entre os dois já foram processados.
+Misses são lidos em lote via Multicall (ver blockchain.read_properties_onchain).
+
+Reconciliação do registro inteiro (DB x contrato), com prazo máximo:
+
+    python -m app.onchain --deadline 60 --batch-size 200
+    python -m app.onchain --after-id 150000      # continua de onde parou
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from sqlalchemy import select
+
+from app.blockchain import (
+    current_block_number,
+    matricula_hash,
+    read_properties_onchain,
+    registered_since,
+)
+from app.database import SessionLocal
+from app.models import AnchorRecord, Property
+from app.observability import ONCHAIN_CACHE_REQUESTS, get_logger
+
+
+ONCHAIN_CACHE_TTL_S = float(os.getenv("ONCHAIN_CACHE_TTL_S", "30"))
+ONCHAIN_CACHE_SIZE = int(os.getenv("ONCHAIN_CACHE_SIZE", "10000"))
+ONCHAIN_EVENT_POLL_S = float(os.getenv("ONCHAIN_EVENT_POLL_S", "2"))
+ONCHAIN_BATCH_SIZE = int(os.getenv("ONCHAIN_BATCH_SIZE", "100"))
+# Acima disso é mais barato esvaziar o cache do que varrer os logs.
+ONCHAIN_MAX_LOG_RANGE = int(os.getenv("ONCHAIN_MAX_LOG_RANGE", "2000"))
+
+log = get_logger(__name__)
+
+
+@dataclass
+class _Entry:
+    key: str
+    value: dict | None
+    block: int
+    expires: float
+
+
+class OnchainCache:
+    def __init__(
+        self,
+        ttl: float = ONCHAIN_CACHE_TTL_S,
+        size: int = ONCHAIN_CACHE_SIZE,
+        poll: float = ONCHAIN_EVENT_POLL_S,
+        batch_size: int = ONCHAIN_BATCH_SIZE,
+    ):
+        self.ttl = ttl
+        self.size = size
+        self.poll = poll
+        self.batch_size = batch_size
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_block: int | None = None
+        self._next_poll = 0.0
+
+    def get(self, matricula: str) -> tuple[dict | None, int, bool]:
+        """(struct on-chain ou None, bloco da leitura, veio do cache)."""
+        return self.get_many([matricula])[matricula]
+
+    def get_many(self, matriculas: list[str]) -> dict[str, tuple[dict | None, int, bool]]:
+        self._sync_events()
+        now = time.monotonic()
+        out, misses = {}, []
+        with self._lock:
+            for matricula in matriculas:
+                entry = self._entries.get(matricula)
+                if entry is not None and entry.expires > now:
+                    self._entries.move_to_end(matricula)
+                    out[matricula] = (entry.value, entry.block, True)
+                else:
+                    misses.append(matricula)
+        ONCHAIN_CACHE_REQUESTS.labels(result="hit").inc(len(out))
+        if not misses:
+            return out
+
+        ONCHAIN_CACHE_REQUESTS.labels(result="miss").inc(len(misses))
+        block, values = read_properties_onchain(misses, batch_size=self.batch_size)
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            # Leitura anterior ao último bloco sincronizado: um evento entre os dois já foi
+            # processado sem esta entrada, então ela não vai para o cache.
+            cacheable = self._last_block is None or block >= self._last_block
+            for matricula in misses:
+                value = values.get(matricula)
+                out[matricula] = (value, block, False)
+                if cacheable:
+                    key = "0x" + matricula_hash(matricula).hex()
+                    self._entries[matricula] = _Entry(key, value, block, expires)
+                    self._entries.move_to_end(matricula)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return out
+
+    def invalidate(self, matricula: str):
+        with self._lock:
+            self._entries.pop(matricula, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _sync_events(self):
+        now = time.monotonic()
+        if now < self._next_poll:
+            return
+        self._next_poll = now + self.poll
+        head = current_block_number()
+        last = self._last_block
+        if last is not None and head <= last:
+            return
+        changed = None
+        if last is not None and head - last <= ONCHAIN_MAX_LOG_RANGE:
+            changed = registered_since(last + 1, head)
+        stale = []
+        with self._lock:
+            if last is not None and changed is None:
+                self._entries.clear()
+            elif changed:
+                # Entrada lida no próprio head já viu o evento.
+                stale = [m for m, entry in self._entries.items() if entry.key in changed and entry.block < head]
+                for matricula in stale:
+                    del self._entries[matricula]
+            # Só avança depois de invalidar: get_many não guarda leituras anteriores a este bloco.
+            self._last_block = max(head, self._last_block or head)
+        if stale:
+            log.info("onchain.cache_invalidated", entries=len(stale), from_block=last + 1, to_block=head)
+
+
+onchain_cache = OnchainCache()
+
+
+# --- reconciliação --------------------------------------------------------------
+
+
+def reconcile(
+    *,
+    batch_size: int = ONCHAIN_BATCH_SIZE,
+    workers: int = 4,
+    deadline_s: float = 60.0,
+    after_id: int = 0,
+    max_mismatches: int = 100,
+) -> dict:
+    """
+    Compara o dono no banco com o do contrato para todas as propriedades, em
+    lotes de multicall paralelos fixados num único bloco. Para ao esgotar o
+    prazo e devolve `next_after_id` para retomar.
+    """
+    start = time.monotonic()
+    block = current_block_number()
+    report = {
+        "block_number": block,
+        "checked": 0,
+        "in_sync": 0,
+        "mismatched": 0,
+        "missing": 0,
+        "mismatches": [],
+        "complete": False,
+        "next_after_id": after_id,
+    }
+    cursor = after_id
+
+    def read(chunk):
+        return read_properties_onchain([row.matricula for row in chunk], block=block, batch_size=batch_size)[1]
+
+    with SessionLocal() as db, ThreadPoolExecutor(max_workers=workers) as pool:
+        while time.monotonic() - start < deadline_s:
+            page = db.execute(
+                select(Property.id, Property.matricula, Property.current_owner)
+                .where(Property.id > cursor)
+                .order_by(Property.id)
+                .limit(batch_size * workers)
+            ).all()
+            if not page:
+                report["complete"] = True
+                break
+            # Propriedades que passaram pela ancoragem Merkle não têm struct no contrato. anchor_records
+            # só existe no s0, então é consultada à parte e não como subquery do select acima.
+            anchored = set(
+                db.execute(
+                    select(AnchorRecord.matricula).where(AnchorRecord.matricula.in_({row.matricula for row in page}))
+                ).scalars()
+            )
+            rows = [row for row in page if row.matricula not in anchored]
+            chunks = [rows[i : i + batch_size] for i in range(0, len(rows), batch_size)]
+            for chunk, values in zip(chunks, pool.map(read, chunks)):
+                for row in chunk:
+                    onchain = values.get(row.matricula)
+                    report["checked"] += 1
+                    if onchain is None:
+                        report["missing"] += 1
+                        status = "missing"
+                    elif onchain["current_owner"] != row.current_owner.lower():
+                        report["mismatched"] += 1
+                        status = "mismatched"
+                    else:
+                        report["in_sync"] += 1
+                        continue
+                    if len(report["mismatches"]) < max_mismatches:
+                        report["mismatches"].append(
+                            {
+                                "matricula": row.matricula,
+                                "status": status,
+                                "db_owner": row.current_owner,
+                                "onchain_owner": onchain["current_owner"] if onchain else None,
+                            }
+                        )
+            cursor = page[-1].id
+
+    report["next_after_id"] = cursor
+    report["elapsed_s"] = round(time.monotonic() - start, 3)
+    log.info(
+        "onchain.reconciled",
+        **{k: v for k, v in report.items() if k != "mismatches"},
+    )
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=ONCHAIN_BATCH_SIZE, help="Chamadas por multicall")
+    parser.add_argument("--workers", type=int, default=4, help="Multicalls em paralelo")
+    parser.add_argument("--deadline", type=float, default=60.0, help="Tempo máximo em segundos")
+    parser.add_argument("--after-id", type=int, default=0, help="Retoma após este id de propriedade")
+    args = parser.parse_args(argv)
+
+    report = reconcile(
+        batch_size=args.batch_size,
+        workers=args.workers,
+        deadline_s=args.deadline,
+        after_id=args.after_id,
+    )
+    print(json.dumps(report, indent=2))
+    # 1 sinaliza divergência para quem agenda o job (cron/CI).
+    return 1 if report["mismatched"] or report["missing"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
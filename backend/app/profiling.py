@@ -0,0 +1,277 @@
+import contextvars
+import functools
+import heapq
+import inspect
+import itertools
+import marshal
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from fastapi.routing import APIRoute
+
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0.01"))
+PROFILING_TOP_N = int(os.getenv("PROFILING_TOP_N", "10"))
+PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "1"))
+
+
+class RequestProfile:
+    """Amostras de pilha coletadas durante uma requisição (uma contagem por thread)."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, interval: float):
+        self.id = next(self._ids)
+        self.interval = interval
+        self.method = ""
+        self.route = ""
+        self.duration = 0.0
+        self.started_at = time.time()
+        self.samples: dict[str, Counter] = {}
+        self._threads: dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def attach_thread(self, label: str):
+        with self._lock:
+            self._threads[threading.get_ident()] = label
+
+    def detach_thread(self):
+        with self._lock:
+            self._threads.pop(threading.get_ident(), None)
+
+    def sample(self):
+        with self._lock:
+            threads = dict(self._threads)
+        frames = sys._current_frames()
+        for ident, label in threads.items():
+            frame = frames.get(ident)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.setdefault(label, Counter())[tuple(stack)] += 1
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "route": self.route,
+            "duration_ms": round(self.duration * 1000, 3),
+            "started_at": self.started_at,
+            "samples": sum(sum(c.values()) for c in self.samples.values()),
+        }
+
+    def to_speedscope(self) -> dict:
+        frames: list[dict] = []
+        index: dict[tuple, int] = {}
+        profiles = []
+        for label, counter in self.samples.items():
+            samples, weights = [], []
+            for stack, count in counter.items():
+                ids = []
+                for key in stack:
+                    if key not in index:
+                        index[key] = len(frames)
+                        frames.append({"name": key[2], "file": key[0], "line": key[1]})
+                    ids.append(index[key])
+                samples.append(ids)
+                weights.append(count * self.interval)
+            profiles.append(
+                {
+                    "type": "sampled",
+                    "name": f"{self.method} {self.route} [{label}]",
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+            )
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{self.method} {self.route} #{self.id}",
+            "exporter": "app.profiling",
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+    def to_pstats(self) -> bytes:
+        """
+        Converte as amostras no formato que `pstats.Stats` lê (dict marshal).
+        Contagens de chamada são aproximadas pelo número de amostras.
+        """
+        stats: dict[tuple, list] = {}
+        for counter in self.samples.values():
+            for stack, count in counter.items():
+                t = count * self.interval
+                seen = set()
+                for depth, key in enumerate(stack):
+                    entry = stats.setdefault(key, [0, 0, 0.0, 0.0, {}])
+                    if key not in seen:
+                        seen.add(key)
+                        entry[0] += count
+                        entry[1] += count
+                        entry[3] += t
+                    if depth == len(stack) - 1:
+                        entry[2] += t
+                    if depth > 0:
+                        caller = entry[4].setdefault(stack[depth - 1], [0, 0, 0.0, 0.0])
+                        caller[0] += count
+                        caller[1] += count
+                        caller[3] += t
+                        if depth == len(stack) - 1:
+                            caller[2] += t
+        return marshal.dumps(
+            {
+                key: (cc, nc, tt, ct, {c: tuple(v) for c, v in callers.items()})
+                for key, (cc, nc, tt, ct, callers) in stats.items()
+            }
+        )
+
+
+class ProfileStore:
+    """Guarda os N perfis mais lentos por rota (heap mínimo limitado)."""
+
+    def __init__(self, top_n: int):
+        self.top_n = top_n
+        self._by_route: dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def add(self, profile: RequestProfile):
+        key = f"{profile.method} {profile.route}"
+        with self._lock:
+            heap = self._by_route.setdefault(key, [])
+            item = (profile.duration, profile.id, profile)
+            if len(heap) < self.top_n:
+                heapq.heappush(heap, item)
+            elif profile.duration > heap[0][0]:
+                heapq.heapreplace(heap, item)
+
+    def get(self, profile_id: int) -> RequestProfile | None:
+        with self._lock:
+            for heap in self._by_route.values():
+                for _, pid, profile in heap:
+                    if pid == profile_id:
+                        return profile
+        return None
+
+    def grouped(self) -> dict[str, list[dict]]:
+        with self._lock:
+            return {
+                key: [p.summary() for _, _, p in sorted(heap, reverse=True)]
+                for key, heap in self._by_route.items()
+            }
+
+    def clear(self):
+        with self._lock:
+            self._by_route.clear()
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = PROFILING_ENABLED
+        self.sample_rate = PROFILING_SAMPLE_RATE
+        self.interval = PROFILING_INTERVAL_MS / 1000
+        self.store = ProfileStore(PROFILING_TOP_N)
+        # Um perfil por vez por processo: evita que requisições concorrentes
+        # poluam as amostras umas das outras.
+        self._busy = threading.Lock()
+
+    def configure(self, enabled: bool | None = None, sample_rate: float | None = None):
+        if enabled is not None:
+            self.enabled = enabled
+        if sample_rate is not None:
+            self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+
+    def status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "interval_ms": self.interval * 1000,
+            "top_n": self.store.top_n,
+        }
+
+
+profiler = Profiler()
+_current: contextvars.ContextVar[RequestProfile | None] = contextvars.ContextVar(
+    "current_profile", default=None
+)
+
+
+def _sampler_loop(profile: RequestProfile, stop: threading.Event):
+    while not stop.wait(profile.interval):
+        profile.sample()
+
+
+class ProfilingMiddleware:
+    """
+    Amostra uma fração das requisições. Desligado, custa apenas a checagem de
+    `profiler.enabled` por requisição.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            not profiler.enabled
+            or scope["type"] != "http"
+            or random.random() >= profiler.sample_rate
+            or not profiler._busy.acquire(blocking=False)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(profiler.interval)
+        token = _current.set(profile)
+        profile.attach_thread("event-loop")
+        stop = threading.Event()
+        sampler = threading.Thread(target=_sampler_loop, args=(profile, stop), daemon=True)
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profile.duration = time.perf_counter() - start
+            stop.set()
+            sampler.join()
+            profile.detach_thread()
+            _current.reset(token)
+            profiler._busy.release()
+            route = scope.get("route")
+            profile.method = scope["method"]
+            profile.route = getattr(route, "path", "unmatched")
+            profiler.store.add(profile)
+
+
+def _profile_sync_endpoint(endpoint):
+    """Registra a thread do threadpool que executa o endpoint síncrono no perfil ativo."""
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        profile.attach_thread("worker")
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            profile.detach_thread()
+
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    def __init__(self, path: str, endpoint, **kwargs):
+        if not inspect.iscoroutinefunction(endpoint):
+            endpoint = _profile_sync_endpoint(endpoint)
+        super().__init__(path, endpoint, **kwargs)
@@ -0,0 +1,275 @@
+"""
+Rate limiting por rota com token bucket, antes de qualquer acesso ao banco.
+
+Cada regra define taxa (fichas/s), rajada e a chave do bucket: `ip` (cliente)
+ou `sub` (carteira do JWT, com fallback para o IP sem token válido). Regras
+padrão em DEFAULT_RATE_LIMITS; RATE_LIMITS (JSON) sobrescreve ou desliga
+(`null`) por rota, por exemplo:
+
+    {"POST /pos/validate": {"rate": 1, "burst": 5, "key": "sub"}}
+
+Rotas de lote cobram uma ficha por item: `cost` nomeia a lista do corpo JSON
+cujo tamanho é o custo (limitado à rajada, então `burst` é o maior lote que
+passa de uma vez). O middleware lê o corpo e o repassa intacto ao handler.
+
+RATE_LIMIT_BACKEND=memory (padrão) usa buckets no processo, divididos em
+shards com lock próprio; com vários workers o limite efetivo é por worker.
+RATE_LIMIT_BACKEND=redis usa um script Lua atômico em qualquer servidor
+compatível com Redis (RATE_LIMIT_REDIS_URL; requer `pip install redis`).
+"""
+import json
+import math
+import os
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+
+import orjson
+
+from starlette.responses import JSONResponse
+from starlette.routing import compile_path
+
+from app.deps import decode_token
+from app.observability import get_logger
+
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+RATE_LIMIT_SHARDS = int(os.getenv("RATE_LIMIT_SHARDS", "16"))
+# Atrás de proxy reverso o IP real vem no X-Forwarded-For.
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"
+
+DEFAULT_RATE_LIMITS = {
+    # Cada chamada grava um nonce no banco.
+    "POST /auth/siwe/start": {"rate": 0.5, "burst": 10, "key": "ip"},
+    # Recuperação de assinatura custa ~10ms de CPU.
+    "POST /auth/siwe/verify": {"rate": 1, "burst": 10, "key": "ip"},
+    "POST /pos/validate": {"rate": 2, "burst": 20, "key": "sub"},
+    "POST /properties": {"rate": 2, "burst": 20, "key": "sub"},
+    # Uma ficha por referência; a rajada cobre um lote de POS_BATCH_MAX (padrão 10000).
+    "POST /pos/validate/batch": {"rate": 100, "burst": 10000, "key": "sub", "cost": "tx_references"},
+    # Trava transferências e propriedades e enfileira chain por item; rajada = TRANSFER_BATCH_MAX.
+    "POST /transfers/sign-batch": {"rate": 10, "burst": 1000, "key": "sub", "cost": "proposal_ids"},
+}
+
+log = get_logger(__name__)
+
+
+@dataclass
+class RateRule:
+    method: str
+    path: str  # template da rota; também usado como label nas métricas
+    rate: float
+    burst: int
+    key: str
+    cost: str | None = None  # lista do corpo JSON cujo tamanho é o custo; None = 1 ficha
+    regex: object = None
+
+    def matches(self, method: str, path: str) -> bool:
+        return method == self.method and self.regex.match(path) is not None
+
+
+def load_rules() -> list[RateRule]:
+    config = dict(DEFAULT_RATE_LIMITS)
+    env = os.getenv("RATE_LIMITS")
+    if env:
+        try:
+            config.update(json.loads(env))
+        except Exception as exc:
+            log.warning("ratelimit.invalid_config", error=str(exc))
+    rules = []
+    for route, cfg in config.items():
+        if not cfg:
+            continue
+        method, path = route.split(" ", 1)
+        rules.append(
+            RateRule(
+                method=method.upper(),
+                path=path,
+                rate=float(cfg["rate"]),
+                burst=int(cfg.get("burst", 1)),
+                key=cfg.get("key", "ip"),
+                cost=cfg.get("cost"),
+                regex=compile_path(path)[0],
+            )
+        )
+    return rules
+
+
+# --- stores -------------------------------------------------------------------------
+
+
+class MemoryStore:
+    """Buckets em memória divididos em shards para reduzir contenção de lock."""
+
+    def __init__(self, shards: int = RATE_LIMIT_SHARDS, max_keys_per_shard: int = 10_000):
+        self._shards = [({}, threading.Lock()) for _ in range(max(shards, 1))]
+        self.max_keys_per_shard = max_keys_per_shard
+
+    async def take(self, key: str, rate: float, burst: int, cost: float = 1.0) -> tuple[bool, float]:
+        """(permitido, segundos até haver fichas)."""
+        buckets, lock = self._shards[zlib.crc32(key.encode()) % len(self._shards)]
+        now = time.monotonic()
+        with lock:
+            tokens, updated, _ = buckets.get(key, (float(burst), now, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= cost:
+                allowed, retry_after = True, 0.0
+                tokens -= cost
+            else:
+                allowed, retry_after = False, (cost - tokens) / rate
+            # Guarda quando o bucket volta a ficar cheio para poder descartá-lo depois.
+            buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+            if len(buckets) > self.max_keys_per_shard:
+                self._evict(buckets, now)
+        return allowed, retry_after
+
+    @staticmethod
+    def _evict(buckets: dict, now: float):
+        # Bucket que já teria reenchido equivale a um bucket novo: pode sair.
+        for key in [k for k, (_, _, full_at) in buckets.items() if full_at <= now]:
+            del buckets[key]
+
+
+_TOKEN_BUCKET_LUA = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+else
+  retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(retry_after)}
+"""
+
+
+class RedisStore:
+    """Token bucket atômico via Lua; compartilhado entre workers e instâncias."""
+
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL, prefix: str = "ratelimit:"):
+        import redis.asyncio as redis
+
+        self._client = redis.from_url(url)
+        self._script = self._client.register_script(_TOKEN_BUCKET_LUA)
+        self.prefix = prefix
+
+    async def take(self, key: str, rate: float, burst: int, cost: float = 1.0) -> tuple[bool, float]:
+        try:
+            allowed, retry_after = await self._script(keys=[self.prefix + key], args=[rate, burst, cost])
+        except Exception as exc:
+            # Falha aberta: indisponibilidade do Redis não derruba a API.
+            log.warning("ratelimit.store_unavailable", error=str(exc))
+            return True, 0.0
+        return bool(int(allowed)), float(retry_after)
+
+
+def build_store():
+    if RATE_LIMIT_BACKEND == "redis":
+        return RedisStore()
+    return MemoryStore()
+
+
+# --- middleware --------------------------------------------------------------------
+
+
+def _client_ip(scope) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        for name, value in scope.get("headers", ()):
+            if name == b"x-forwarded-for":
+                return value.decode().split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def _bearer_sub(scope) -> str | None:
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, token = value.decode().partition(" ")
+            if scheme.lower() == "bearer" and token:
+                payload = decode_token(token)
+                return (payload or {}).get("sub")
+            return None
+    return None
+
+
+async def _body_cost(receive, field: str) -> tuple[int, object]:
+    """Tamanho da lista `field` do corpo JSON e um receive que repassa o corpo já lido."""
+    messages = []
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request" or not message.get("more_body"):
+            break
+    body = b"".join(message.get("body", b"") for message in messages if message["type"] == "http.request")
+    try:
+        items = orjson.loads(body).get(field)
+    except Exception:
+        # Corpo inválido: o handler responde 422; cobra como uma chamada.
+        items = None
+    cost = len(items) if isinstance(items, list) else 1
+
+    async def replay():
+        return messages.pop(0) if messages else await receive()
+
+    return max(cost, 1), replay
+
+
+class RateLimitMiddleware:
+    """Middleware ASGI puro; responde 429 com Retry-After sem chegar ao handler."""
+
+    def __init__(self, app, rules: list[RateRule] | None = None, store=None, enabled: bool = RATE_LIMIT_ENABLED):
+        self.app = app
+        self.rules = load_rules() if rules is None else rules
+        self.store = store or build_store()
+        self.enabled = enabled
+
+    def _rule_for(self, method: str, path: str) -> RateRule | None:
+        for rule in self.rules:
+            if rule.matches(method, path):
+                return rule
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rule = self._rule_for(scope["method"], scope["path"])
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        subject = _bearer_sub(scope) if rule.key == "sub" else None
+        identity = f"sub:{subject.lower()}" if subject else f"ip:{_client_ip(scope)}"
+        cost = 1
+        if rule.cost:
+            cost, receive = await _body_cost(receive, rule.cost)
+        allowed, retry_after = await self.store.take(
+            f"{rule.method} {rule.path}|{identity}", rule.rate, rule.burst, min(cost, rule.burst)
+        )
+        if allowed:
+            await self.app(scope, receive, send)
+            return
+
+        wait = max(math.ceil(retry_after), 1)
+        # Sem roteamento, as métricas usariam "unmatched"; a regra carrega o template.
+        scope["route"] = rule
+        response = JSONResponse(
+            {"detail": f"Muitas requisições; tente novamente em {wait}s"},
+            status_code=429,
+            headers={"Retry-After": str(wait)},
+        )
+        await response(scope, receive, send)
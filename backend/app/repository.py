@@ -0,0 +1,63 @@
+"""
+Consultas repetidas dos handlers como statements pré-montados.
+
+Cada statement é construído uma vez na importação, com `bindparam` no lugar
+dos valores, então a chave de cache do SQLAlchemy é a mesma em toda
+requisição: não há montagem da expressão nem recompilação do SQL
+(`query_cache_size` do engine). No Postgres com psycopg 3 o driver ainda
+prepara no servidor os statements repetidos (DB_PREPARE_THRESHOLD, ver
+app/database.py).
+
+`python -m benchmarks.queries` confere o orçamento de queries por rota e
+que nenhuma consulta é recompilada depois do aquecimento.
+"""
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import Session
+
+from app.models import Nonce, Property, Proposal, Transfer, User
+
+
+PROPERTY_BY_MATRICULA = select(Property).where(Property.matricula == bindparam("matricula"))
+PROPERTY_EXISTS = select(Property.id).where(Property.matricula == bindparam("matricula")).limit(1)
+TRANSFER_BY_PROPOSAL = select(Transfer).where(Transfer.proposal_id == bindparam("proposal_id")).limit(1)
+USER_BY_WALLET = select(User).where(User.wallet == bindparam("wallet"))
+NONCE_BY_VALUE = select(Nonce).where(Nonce.nonce == bindparam("nonce"))
+PROPOSALS_BY_MATRICULA = (
+    select(Proposal).where(Proposal.matricula == bindparam("matricula")).order_by(Proposal.created_at.asc())
+)
+TRANSFERS_BY_MATRICULA = (
+    select(Transfer).where(Transfer.matricula == bindparam("matricula")).order_by(Transfer.created_at.asc())
+)
+
+
+def property_by_matricula(db: Session, matricula: str) -> Property | None:
+    return db.execute(PROPERTY_BY_MATRICULA, {"matricula": matricula}).scalar_one_or_none()
+
+
+def property_exists(db: Session, matricula: str) -> bool:
+    return db.execute(PROPERTY_EXISTS, {"matricula": matricula}).first() is not None
+
+
+def proposal_by_id(db: Session, proposal_id: int) -> Proposal | None:
+    # Pela chave primária: usa o identity map antes de ir ao banco.
+    return db.get(Proposal, proposal_id)
+
+
+def transfer_by_proposal(db: Session, proposal_id: int) -> Transfer | None:
+    return db.execute(TRANSFER_BY_PROPOSAL, {"proposal_id": proposal_id}).scalar_one_or_none()
+
+
+def user_by_wallet(db: Session, wallet: str) -> User | None:
+    return db.execute(USER_BY_WALLET, {"wallet": wallet.lower()}).scalar_one_or_none()
+
+
+def nonce_by_value(db: Session, nonce: str) -> Nonce | None:
+    return db.execute(NONCE_BY_VALUE, {"nonce": nonce}).scalar_one_or_none()
+
+
+def proposals_by_matricula(db: Session, matricula: str) -> list[Proposal]:
+    return list(db.execute(PROPOSALS_BY_MATRICULA, {"matricula": matricula}).scalars())
+
+
+def transfers_by_matricula(db: Session, matricula: str) -> list[Transfer]:
+    return list(db.execute(TRANSFERS_BY_MATRICULA, {"matricula": matricula}).scalars())
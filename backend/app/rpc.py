@@ -0,0 +1,246 @@
+"""
+Provider JSON-RPC com vários endpoints (ETH_RPC_URLS, separados por vírgula).
+
+Cada endpoint guarda a latência das últimas chamadas e a taxa de erro. Um erro
+de transporte, HTTP 429/5xx ou limite de taxa do provedor tira o endpoint do
+rodízio por RPC_COOLDOWN_S (dobrando a cada falha seguida, até
+RPC_COOLDOWN_MAX_S); erros JSON-RPC comuns (revert, nonce) são respostas
+válidas e voltam para quem chamou.
+
+- Leituras vão ao endpoint saudável mais rápido. Se ele não responde dentro do
+  p95 da própria latência (limitado a RPC_HEDGE_MIN_MS..RPC_HEDGE_MAX_MS), a
+  mesma chamada sai para o segundo melhor e vale a primeira resposta. Em falha
+  o próximo endpoint é tentado na hora.
+- `eth_sendRawTransaction` vai em paralelo para RPC_BROADCAST endpoints. A
+  transação assinada é a mesma em todos, então "already known" conta como
+  sucesso e o hash é o keccak da transação.
+
+`blockchain._connect_web3` usa este provider quando há mais de uma URL. Para
+testar localmente: vários `python -m app.chain_sim --port N --latency-ms X`.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+from web3 import HTTPProvider
+from web3.providers.base import JSONBaseProvider
+
+from app.observability import RPC_HEDGED_READS, RPC_REQUEST_LATENCY, get_logger
+
+RPC_TIMEOUT_S = float(os.getenv("RPC_TIMEOUT_S", "10"))
+RPC_HEDGE_MIN_MS = float(os.getenv("RPC_HEDGE_MIN_MS", "50"))
+RPC_HEDGE_MAX_MS = float(os.getenv("RPC_HEDGE_MAX_MS", "2000"))
+# Atraso do hedge enquanto o endpoint não tem amostras suficientes para o p95.
+RPC_HEDGE_DEFAULT_MS = float(os.getenv("RPC_HEDGE_DEFAULT_MS", "500"))
+RPC_BROADCAST = max(int(os.getenv("RPC_BROADCAST", "2")), 1)
+RPC_COOLDOWN_S = float(os.getenv("RPC_COOLDOWN_S", "5"))
+RPC_COOLDOWN_MAX_S = float(os.getenv("RPC_COOLDOWN_MAX_S", "120"))
+RPC_WINDOW = int(os.getenv("RPC_WINDOW", "200"))
+_MIN_SAMPLES = 20
+
+WRITE_METHODS = {"eth_sendRawTransaction"}
+# Códigos que os provedores usam para limite de taxa / indisponibilidade temporária.
+_RATE_LIMIT_CODES = {-32005, -32090, 429}
+_KNOWN_TX_MARKERS = ("already known", "known transaction", "already imported")
+
+log = get_logger(__name__)
+
+
+class RpcEndpointError(RuntimeError):
+    """Falha do endpoint (transporte, HTTP ou limite de taxa), não da chamada."""
+
+
+class Endpoint:
+    def __init__(self, index: int, url: str):
+        self.index = index
+        self.label = str(index)  # a URL costuma ter token; não vai para métricas nem logs
+        self.provider = HTTPProvider(url, request_kwargs={"timeout": RPC_TIMEOUT_S})
+        self.latencies: deque[float] = deque(maxlen=RPC_WINDOW)
+        self.outcomes: deque[bool] = deque(maxlen=RPC_WINDOW)
+        self.failures = 0
+        self.down_until = 0.0
+        self._lock = threading.Lock()
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.down_until
+
+    def error_rate(self) -> float:
+        return (self.outcomes.count(False) / len(self.outcomes)) if self.outcomes else 0.0
+
+    def p95(self) -> float | None:
+        if len(self.latencies) < _MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+
+    def score(self) -> float:
+        """Menor é melhor: mediana da latência penalizada pela taxa de erro."""
+        if not self.latencies:
+            return 0.0  # sem amostras: experimenta
+        ordered = sorted(self.latencies)
+        return ordered[len(ordered) // 2] * (1 + 4 * self.error_rate())
+
+    def hedge_delay(self) -> float:
+        p95 = self.p95()
+        delay_ms = RPC_HEDGE_DEFAULT_MS if p95 is None else p95 * 1000
+        return min(max(delay_ms, RPC_HEDGE_MIN_MS), RPC_HEDGE_MAX_MS) / 1000
+
+    def record(self, elapsed: float, ok: bool, retry_after: float | None = None):
+        with self._lock:
+            self.outcomes.append(ok)
+            if ok:
+                self.latencies.append(elapsed)
+                self.failures = 0
+                return
+            self.failures += 1
+            cooldown = min(RPC_COOLDOWN_S * 2 ** (self.failures - 1), RPC_COOLDOWN_MAX_S)
+            self.down_until = time.monotonic() + max(cooldown, retry_after or 0)
+
+
+def _retry_after(exc: Exception) -> float | None:
+    response = getattr(exc, "response", None)
+    value = response.headers.get("Retry-After") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def _error_message(response: dict) -> str:
+    error = response.get("error") or {}
+    return str(error.get("message", "")).lower() if isinstance(error, dict) else str(error).lower()
+
+
+class FailoverProvider(JSONBaseProvider):
+    def __init__(self, urls: list[str]):
+        super().__init__()
+        if not urls:
+            raise ValueError("FailoverProvider precisa de ao menos uma URL")
+        self.endpoints = [Endpoint(index, url) for index, url in enumerate(urls)]
+        self._executor = ThreadPoolExecutor(max_workers=max(4, 2 * len(urls)), thread_name_prefix="rpc")
+
+    def __str__(self):
+        return f"FailoverProvider({len(self.endpoints)} endpoints)"
+
+    def ranked(self) -> list[Endpoint]:
+        """Saudáveis do melhor para o pior; os em cooldown no fim, pelo que volta primeiro."""
+        now = time.monotonic()
+        healthy = sorted((e for e in self.endpoints if e.healthy(now)), key=Endpoint.score)
+        cooling = sorted((e for e in self.endpoints if not e.healthy(now)), key=lambda e: e.down_until)
+        return healthy + cooling
+
+    def _call(self, endpoint: Endpoint, method, params) -> dict:
+        start = time.perf_counter()
+        try:
+            response = endpoint.provider.make_request(method, params)
+        except Exception as exc:
+            elapsed = time.perf_counter() - start
+            endpoint.record(elapsed, ok=False, retry_after=_retry_after(exc))
+            RPC_REQUEST_LATENCY.labels(endpoint=endpoint.label, outcome="error").observe(elapsed)
+            log.warning("rpc.endpoint_error", endpoint=endpoint.label, method=method, error=str(exc))
+            raise RpcEndpointError(str(exc)) from exc
+        elapsed = time.perf_counter() - start
+        error = response.get("error")
+        if isinstance(error, dict) and error.get("code") in _RATE_LIMIT_CODES:
+            endpoint.record(elapsed, ok=False)
+            RPC_REQUEST_LATENCY.labels(endpoint=endpoint.label, outcome="rate_limited").observe(elapsed)
+            log.warning("rpc.endpoint_rate_limited", endpoint=endpoint.label, method=method)
+            raise RpcEndpointError(_error_message(response))
+        endpoint.record(elapsed, ok=True)
+        RPC_REQUEST_LATENCY.labels(endpoint=endpoint.label, outcome="ok").observe(elapsed)
+        return response
+
+    def make_request(self, method, params):
+        if method in WRITE_METHODS:
+            return self._broadcast(method, params)
+        return self._hedged_read(method, params)
+
+    def _hedged_read(self, method, params) -> dict:
+        queue = iter(self.ranked())
+        pending = {}
+
+        def launch() -> bool:
+            endpoint = next(queue, None)
+            if endpoint is None:
+                return False
+            pending[self._executor.submit(self._call, endpoint, method, params)] = endpoint
+            return True
+
+        launch()
+        primary = next(iter(pending.values()))
+        hedged = False
+        last_exc: Exception | None = None
+        while pending:
+            timeout = None if hedged else primary.hedge_delay()
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # Mais lento que o p95: manda a mesma leitura para o próximo endpoint.
+                hedged = True
+                launch()
+                continue
+            for future in done:
+                endpoint = pending.pop(future)
+                try:
+                    response = future.result()
+                except RpcEndpointError as exc:
+                    last_exc = exc
+                    continue
+                if hedged:
+                    RPC_HEDGED_READS.labels(winner="primary" if endpoint is primary else "hedge").inc()
+                return response
+            if not pending:
+                launch()
+        raise RpcEndpointError(f"nenhum endpoint respondeu {method}: {last_exc}")
+
+    def _broadcast(self, method, params) -> dict:
+        ranked = self.ranked()
+        errors: list[dict] = []
+        last_exc: Exception | None = None
+        for start in range(0, len(ranked), RPC_BROADCAST):
+            futures = [
+                self._executor.submit(self._call, endpoint, method, params)
+                for endpoint in ranked[start : start + RPC_BROADCAST]
+            ]
+            for future in as_completed(futures):
+                try:
+                    response = future.result()
+                except RpcEndpointError as exc:
+                    last_exc = exc
+                    continue
+                if "error" not in response:
+                    return response
+                if any(marker in _error_message(response) for marker in _KNOWN_TX_MARKERS):
+                    return {"jsonrpc": "2.0", "id": response.get("id"), "result": _raw_tx_hash(params[0])}
+                errors.append(response)
+            if errors:
+                # O nó recusou a transação (nonce, saldo): repetir em outros não muda isso.
+                return errors[0]
+        raise RpcEndpointError(f"nenhum endpoint aceitou {method}: {last_exc}")
+
+    def status(self) -> list[dict]:
+        now = time.monotonic()
+        return [
+            {
+                "endpoint": e.index,
+                "healthy": e.healthy(now),
+                "p95_ms": round(e.p95() * 1000, 1) if e.p95() is not None else None,
+                "error_rate": round(e.error_rate(), 3),
+                "samples": len(e.latencies),
+            }
+            for e in self.endpoints
+        ]
+
+
+def _raw_tx_hash(raw) -> str:
+    from eth_utils import keccak
+
+    data = bytes.fromhex(raw.removeprefix("0x")) if isinstance(raw, str) else bytes(raw)
+    return "0x" + keccak(data).hex()
+
+
+def rpc_urls() -> list[str]:
+    """ETH_RPC_URLS (lista) ou, sem ela, ETH_RPC_URL."""
+    raw = os.getenv("ETH_RPC_URLS") or os.getenv("ETH_RPC_URL") or ""
+    return [url.strip() for url in raw.split(",") if url.strip()]
@@ -56,6 +56,18 @@ class PropertyBrief(BaseModel):
         from_attributes = True
 
 
+class PropertySearchHit(PropertyBrief):
+    score: float = Field(..., description="Relevância (maior é melhor)")
+
+
+class PropertySearchOut(BaseModel):
+    query: str
+    limit: int
+    offset: int
+    has_more: bool
+    items: list[PropertySearchHit]
+
+
 class ProposalCreate(BaseModel):
     matricula: str = Field(..., min_length=3, max_length=128)
     amount: float = Field(..., gt=0, description="Valor ofertado em moeda fiat ou ETH (mock).")
@@ -63,6 +75,9 @@ class ProposalCreate(BaseModel):
         None, ge=0.01, le=100, description="Percentual da fração desejada (0.01 a 100)."
     )
     message: Optional[str] = Field(None, max_length=512)
+    owner_wallet: Optional[str] = Field(
+        None, description="Cotista que vende a fração (padrão: dono atual da propriedade)."
+    )
 
 
 class ProposalOut(ProposalCreate):
@@ -100,11 +115,37 @@ class TransferActionIn(BaseModel):
     action: str = Field(..., description="SIGN ou REJECT")
 
 
+class TransferSignBatchIn(BaseModel):
+    proposal_ids: list[int] = Field(..., description="Propostas cujas transferências serão assinadas")
+    action: str = Field("SIGN", description="SIGN ou REJECT, aplicado a todas")
+
+
+class TransferBatchItemOut(BaseModel):
+    proposal_id: int
+    ok: bool
+    status: Optional[str] = None
+    tx_hash: Optional[str] = None
+    error: Optional[str] = None
+
+
+class TransferSignBatchOut(BaseModel):
+    signed: int
+    executed: int
+    rejected: int
+    failed: int
+    items: list[TransferBatchItemOut]
+
+
 class PosValidationIn(BaseModel):
     tx_reference: str = Field(..., description="Identificador da transação a validar")
     force_invalid: bool = Field(False, description="Simula rejeição para testes")
 
 
+class PosValidationBatchIn(BaseModel):
+    tx_references: list[str] = Field(..., description="Transações a validar, na ordem da resposta")
+    force_invalid: bool = Field(False, description="Simula rejeição de todas para testes")
+
+
 class PosValidationOut(BaseModel):
     id: int
     tx_reference: str
@@ -167,3 +208,78 @@ class AuditOut(BaseModel):
     description: Optional[str] = None
     proposals: list[ProposalAudit]
     transfers: list[TransferAudit]
+
+
+class ProfilingConfigIn(BaseModel):
+    enabled: Optional[bool] = None
+    sample_rate: Optional[float] = Field(None, ge=0, le=1, description="Fração de requisições amostradas")
+
+
+class AnchorProofOut(BaseModel):
+    kind: str
+    ref_id: int
+    matricula: str
+    payload: str
+    leaf_hash: str
+    status: str = Field(..., description="PENDING até fechar o lote, SUBMITTED até o recibo, depois ANCHORED")
+    root: Optional[str] = None
+    tx_hash: Optional[str] = None
+    leaf_index: Optional[int] = None
+    proof: list[str] = []
+    created_at: Optional[datetime] = None
+
+
+class AnchorVerifyIn(BaseModel):
+    root: str = Field(..., description="Raiz Merkle (0x + 64 hex)")
+    proof: list[str] = Field(default_factory=list, description="Irmãos da folha até a raiz")
+    payload: Optional[str] = Field(None, description="Payload canônico; alternativa a leaf_hash")
+    leaf_hash: Optional[str] = None
+
+
+class AnchorVerifyOut(BaseModel):
+    valid: bool
+    leaf_hash: str
+    root: str
+    anchored: bool = Field(..., description="Raiz conhecida por este backend")
+    tx_hash: Optional[str] = None
+
+
+class OnchainProperty(BaseModel):
+    previous_owner: Optional[str] = None
+    current_owner: str
+    latitude_e6: int
+    longitude_e6: int
+    registered_at: int
+    submitted_by: str
+
+
+class OnchainPropertyOut(BaseModel):
+    matricula: str
+    db_owner: str
+    onchain: Optional[OnchainProperty] = None
+    in_sync: bool
+    block_number: int
+    cached: bool
+
+
+class BookBidOut(BaseModel):
+    proposal_id: int
+    proposer_wallet: str
+    fraction: float = Field(..., description="Percentual ofertado")
+    amount: float
+    unit_price: float = Field(..., description="Valor equivalente a 100% da propriedade")
+
+
+class BookOwnerOut(BaseModel):
+    wallet: str
+    fraction: float
+
+
+class PropertyBookOut(BaseModel):
+    matricula: str
+    total_offered: float
+    total_committed: float
+    open_bids: int
+    best_bid: Optional[BookBidOut] = None
+    bids: list[BookBidOut]
+    owners: list[BookOwnerOut]
@@ -0,0 +1,248 @@
+"""
+Busca por matrícula e descrição de propriedades.
+
+No Postgres usa índices GIN de trigramas (`pg_trgm`) em `matricula` e
+`description` e um índice de `tsvector` sobre os dois campos. O ranking é o
+maior entre similaridade de trigramas, `ts_rank_cd` e o casamento de trecho
+(ILIKE), que também usa o índice de trigramas. Os índices são criados no
+startup junto com o schema ou, em bancos existentes, por:
+
+    python -m app.search --setup
+
+Em outros bancos (SQLite nos testes) cai para um índice de n-gramas em
+memória, no mesmo formato de trigramas do pg_trgm. Ele é montado no primeiro
+uso e depois só lê as propriedades com id maior que o último indexado, já que
+matrícula e descrição não mudam após o registro. Ids pulados abaixo do último
+indexado (transação que pegou o id antes e fez commit depois) ficam pendentes
+e são relidos a cada busca por até SEARCH_NGRAM_GAP_S segundos.
+"""
+import argparse
+import heapq
+import math
+import os
+import sys
+import threading
+import time
+import unicodedata
+from collections import Counter
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+from app.database import shard_engines
+from app.models import Property
+from app.observability import get_logger
+
+
+SEARCH_TS_CONFIG = os.getenv("SEARCH_TS_CONFIG", "portuguese")
+# Fração mínima de trigramas da consulta presentes no campo (como pg_trgm.similarity_threshold).
+SEARCH_MIN_SCORE = float(os.getenv("SEARCH_MIN_SCORE", "0.3"))
+# Por quanto tempo um id pulado ainda pode aparecer por commit atrasado (e quantos guardar por salto).
+SEARCH_NGRAM_GAP_S = float(os.getenv("SEARCH_NGRAM_GAP_S", "60"))
+SEARCH_NGRAM_GAP_IDS = int(os.getenv("SEARCH_NGRAM_GAP_IDS", "1000"))
+
+log = get_logger(__name__)
+
+_TSVECTOR = f"to_tsvector('{SEARCH_TS_CONFIG}', coalesce(matricula, '') || ' ' || coalesce(description, ''))"
+
+SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_properties_matricula_trgm ON properties USING gin (matricula gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_properties_description_trgm ON properties USING gin (description gin_trgm_ops)",
+    f"CREATE INDEX IF NOT EXISTS ix_properties_search_tsv ON properties USING gin ({_TSVECTOR})",
+]
+
+# A expressão de tsvector é a mesma do índice, para o planner usá-lo.
+_PG_SEARCH = text(
+    f"""
+    SELECT id,
+           greatest(
+               similarity(matricula, :q),
+               word_similarity(:q, coalesce(description, '')),
+               ts_rank_cd({_TSVECTOR}, tsq),
+               CASE WHEN matricula ILIKE :like THEN 1.0 ELSE 0.0 END
+           ) AS score
+    FROM properties, websearch_to_tsquery('{SEARCH_TS_CONFIG}', :q) AS tsq
+    WHERE matricula ILIKE :like
+       OR description ILIKE :like
+       OR matricula % :q
+       OR :q <% description
+       OR {_TSVECTOR} @@ tsq
+    ORDER BY score DESC, id DESC
+    LIMIT :limit OFFSET :offset
+    """
+)
+
+
+def ensure_indexes(bind) -> bool:
+    """Cria extensão e índices de busca no Postgres; nos demais bancos não faz nada."""
+    if bind.dialect.name != "postgresql":
+        return False
+    with bind.begin() as conn:
+        for ddl in SEARCH_DDL:
+            conn.execute(text(ddl))
+    return True
+
+
+def normalize(value: str | None) -> str:
+    """Minúsculas, sem acentos, só letras/dígitos separados por espaço."""
+    if not value:
+        return ""
+    value = unicodedata.normalize("NFKD", value.lower())
+    chars = [c if c.isalnum() else " " for c in value if not unicodedata.combining(c)]
+    return " ".join("".join(chars).split())
+
+
+def trigrams(value: str) -> set[str]:
+    """Trigramas por palavra com o mesmo preenchimento do pg_trgm ("  ab" ... "b ")."""
+    grams = set()
+    for word in normalize(value).split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class NgramIndex:
+    """Índice invertido trigram -> ids de propriedade, atualizado por id crescente."""
+
+    def __init__(self):
+        self._matricula: dict[str, set[int]] = {}
+        self._description: dict[str, set[int]] = {}
+        self._keys: dict[int, str] = {}
+        self._last_id = 0
+        # Ids menores que _last_id ainda não vistos (rollback ou commit atrasado) -> quando foram pulados.
+        self._gaps: dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _add(self, prop_id: int, matricula: str, description: str | None):
+        for gram in trigrams(matricula):
+            self._matricula.setdefault(gram, set()).add(prop_id)
+        for gram in trigrams(description):
+            self._description.setdefault(gram, set()).add(prop_id)
+        self._keys[prop_id] = normalize(matricula)
+        if prop_id > self._last_id:
+            now = time.monotonic()
+            for gap in range(max(self._last_id + 1, prop_id - SEARCH_NGRAM_GAP_IDS), prop_id):
+                self._gaps[gap] = now
+            self._last_id = prop_id
+        else:
+            self._gaps.pop(prop_id, None)
+
+    def catch_up(self, db: Session, batch_size: int = 10_000) -> int:
+        columns = select(Property.id, Property.matricula, Property.description)
+        added = 0
+        expired = time.monotonic() - SEARCH_NGRAM_GAP_S
+        self._gaps = {prop_id: since for prop_id, since in self._gaps.items() if since > expired}
+        if self._gaps:
+            rows = db.execute(columns.where(Property.id.in_(sorted(self._gaps)))).all()
+            for row in rows:
+                self._add(row.id, row.matricula, row.description)
+            added += len(rows)
+        while True:
+            rows = db.execute(columns.where(Property.id > self._last_id).order_by(Property.id).limit(batch_size)).all()
+            for row in rows:
+                self._add(row.id, row.matricula, row.description)
+            added += len(rows)
+            if len(rows) < batch_size:
+                return added
+
+    @staticmethod
+    def _score(postings: dict[str, set[int]], grams: set[str], need: int) -> Counter:
+        """
+        Conta trigramas da consulta por id. Quem atinge `need` contém pelo menos
+        um dos len(grams) - need + 1 trigramas mais raros, então só eles geram
+        candidatos; os comuns ("rua", "sp") só são testados nos candidatos.
+        """
+        ordered = sorted(grams, key=lambda gram: len(postings.get(gram, ())))
+        split = len(ordered) - need + 1
+        hits = Counter()
+        for gram in ordered[:split]:
+            hits.update(postings.get(gram, ()))
+        for gram in ordered[split:]:
+            posting = postings.get(gram)
+            if not posting:
+                continue
+            for prop_id in hits:
+                if prop_id in posting:
+                    hits[prop_id] += 1
+        return hits
+
+    def search(self, db: Session, q: str, limit: int, offset: int) -> list[tuple[int, float]]:
+        grams = trigrams(q)
+        if not grams:
+            return []
+        needle = normalize(q)
+        need = max(1, math.ceil(SEARCH_MIN_SCORE * len(grams)))
+        with self._lock:
+            added = self.catch_up(db)
+            if added:
+                log.info("search.ngram_indexed", added=added, total=len(self._keys))
+            by_matricula = self._score(self._matricula, grams, need)
+            by_description = self._score(self._description, grams, need)
+            scores = {}
+            for prop_id in by_matricula.keys() | by_description.keys():
+                score = max(by_matricula[prop_id], by_description[prop_id]) / len(grams)
+                if needle in self._keys[prop_id]:
+                    score = 1.0
+                if score >= SEARCH_MIN_SCORE:
+                    scores[prop_id] = score
+        top = heapq.nlargest(offset + limit, scores.items(), key=lambda item: (item[1], item[0]))
+        return top[offset:]
+
+
+ngram_index = NgramIndex()
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_properties(db: Session, q: str, limit: int = 20, offset: int = 0) -> list[tuple[Property, float]]:
+    """(propriedade, score) ordenados por relevância."""
+    q = q.strip()
+    if not q:
+        return []
+    if db.get_bind().dialect.name == "postgresql":
+        params = {"q": q, "like": f"%{_escape_like(q)}%", "limit": limit, "offset": offset}
+        if len(shard_engines) == 1:
+            ranked = [(row.id, float(row.score)) for row in db.execute(_PG_SEARCH, params)]
+        else:
+            # Cada shard devolve suas offset+limit melhores; a página sai da junção.
+            params.update(limit=offset + limit, offset=0)
+            per_shard = [
+                [
+                    (row.id, float(row.score))
+                    for row in db.execute(_PG_SEARCH, params, bind_arguments={"shard_id": shard})
+                ]
+                for shard in shard_engines
+            ]
+            merged = heapq.merge(*per_shard, key=lambda item: (item[1], item[0]), reverse=True)
+            ranked = list(merged)[offset : offset + limit]
+    else:
+        ranked = ngram_index.search(db, q, limit, offset)
+    if not ranked:
+        return []
+    props = {p.id: p for p in db.query(Property).filter(Property.id.in_([prop_id for prop_id, _ in ranked]))}
+    return [(props[prop_id], score) for prop_id, score in ranked if prop_id in props]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--setup", action="store_true", help="Cria a extensão pg_trgm e os índices de busca")
+    args = parser.parse_args(argv)
+    if not args.setup:
+        parser.print_help()
+        return 2
+
+    if not all([ensure_indexes(shard) for shard in shard_engines.values()]):
+        print("Índices de busca só se aplicam ao Postgres; outros bancos usam o índice em memória.")
+        return 1
+    print("Índices de busca criados/atualizados.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,527 @@
+"""
+Sharding por matrícula entre vários bancos.
+
+Propriedades, propostas, transferências e o livro de frações (tabelas em
+SHARDED_TABLES) são distribuídos por um hash estável da matrícula: a matrícula
+cai em um de SHARD_BUCKETS buckets e a tabela `shard_buckets` do banco
+principal diz em qual shard está cada bucket. Buckets sem linha ficam no "s0"
+(DATABASE_URL), então ligar DATABASE_SHARD_URLS não move nada até rodar o
+rebalanceamento. As demais tabelas ficam só no s0.
+
+A sessão (`ShardedRegistrySession`) escolhe o shard pela matrícula da linha
+ao gravar e pelo filtro `matricula == ...`/`in_(...)` ao consultar. Consultas
+sem matrícula (por carteira, por id, listagens) vão a todos os shards e os
+resultados são intercalados pela ORDER BY do statement, com LIMIT/OFFSET
+aplicados depois da junção. Agregações não são combinadas (vem uma linha por
+shard) e joins entre tabela distribuída e global não são suportados.
+
+Os ids das tabelas distribuídas vêm de `shard_sequences` no s0, e não do
+autoincremento de cada banco, para serem únicos entre shards e sobreviverem
+a mudanças de shard.
+
+    python -m app.sharding --status
+    python -m app.sharding --rebalance [--exclude s2]   # redistribui buckets e move as linhas
+    python -m app.sharding --sweep                      # só move linhas fora do lugar
+
+O rebalanceamento copia as linhas para o destino, confirma e só então apaga da
+origem; interrompido, basta rodar de novo. Workers leem o mapa a cada
+SHARD_MAP_REFRESH_S: rode `--sweep` de novo depois desse intervalo para mover o
+que foi gravado no shard antigo durante a troca.
+"""
+import argparse
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import delete, event, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.horizontal_shard import ShardedSession, execute_and_instances, set_shard_id
+from sqlalchemy.orm import object_session
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList, ColumnElement, UnaryExpression
+from sqlalchemy.sql.util import find_tables
+
+from app.database import Base, engine, shard_engines
+from app.observability import get_logger
+
+
+# Fixo depois que há dados: mudar o número de buckets muda o destino das matrículas.
+SHARD_BUCKETS = int(os.getenv("SHARD_BUCKETS", "1024"))
+SHARD_MAP_REFRESH_S = float(os.getenv("SHARD_MAP_REFRESH_S", "30"))
+# Ids reservados por ida ao s0. Com 1 os ids seguem a ordem de criação entre
+# processos (exportação e índice de busca retomam por id); maior reduz idas ao s0.
+SHARD_ID_BLOCK = int(os.getenv("SHARD_ID_BLOCK", "1"))
+SHARD_MOVE_BATCH = int(os.getenv("SHARD_MOVE_BATCH", "1000"))
+
+CATALOG = "s0"
+SHARDED_TABLES = ("properties", "proposals", "transfers", "property_shares", "property_books", "book_bids")
+# Tabelas distribuídas com id autoincremento (as outras usam matrícula/proposal_id como chave).
+ALLOCATED_IDS = ("properties", "proposals", "transfers", "property_shares")
+
+log = get_logger(__name__)
+
+
+def bucket_of(matricula: str) -> int:
+    """Hash estável entre processos (o hash() do Python muda a cada execução)."""
+    digest = hashlib.blake2b(matricula.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % SHARD_BUCKETS
+
+
+def is_sharded(table_name: str) -> bool:
+    return table_name in SHARDED_TABLES
+
+
+class ShardMap:
+    """bucket -> shard, relido do s0 a cada `refresh_s`."""
+
+    def __init__(self, refresh_s: float = SHARD_MAP_REFRESH_S):
+        self.refresh_s = refresh_s
+        self._map: dict[int, str] = {}
+        self._loaded_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def refresh(self, force: bool = False):
+        if not force and time.monotonic() - self._loaded_at < self.refresh_s:
+            return
+        with self._lock:
+            if not force and time.monotonic() - self._loaded_at < self.refresh_s:
+                return
+            from app.models import ShardBucket
+
+            with engine.connect() as conn:
+                mapping = dict(conn.execute(select(ShardBucket.bucket, ShardBucket.shard)).all())
+            unknown = set(mapping.values()) - set(shard_engines)
+            if unknown:
+                # Dados nesses shards ficariam invisíveis; melhor falhar do que ler errado.
+                raise RuntimeError(f"shard_buckets aponta para shards não configurados: {sorted(unknown)}")
+            self._map = mapping
+            self._loaded_at = time.monotonic()
+
+    def shard_for(self, matricula: str) -> str:
+        self.refresh()
+        return self._map.get(bucket_of(matricula), CATALOG)
+
+    def assignments(self) -> dict[int, str]:
+        self.refresh(force=True)
+        return {bucket: self._map.get(bucket, CATALOG) for bucket in range(SHARD_BUCKETS)}
+
+
+shard_map = ShardMap()
+
+
+class IdAllocator:
+    """Reserva faixas de ids em `shard_sequences` (s0), uma transação curta por faixa."""
+
+    def __init__(self, block: int = SHARD_ID_BLOCK):
+        self.block = max(block, 1)
+        self._ranges: dict[str, tuple[int, int]] = {}
+        self._lock = threading.Lock()
+
+    def next(self, name: str, conn=None) -> int:
+        if conn is not None:
+            # Na transação do chamador e sem cache: um rollback desfaz a reserva junto.
+            return self._reserve(conn, name, 1) - 1
+        with self._lock:
+            current, end = self._ranges.get(name, (0, 0))
+            if current >= end:
+                try:
+                    with engine.begin() as new_conn:
+                        end = self._reserve(new_conn, name, self.block)
+                except IntegrityError:
+                    # Outro processo criou a sequência ao mesmo tempo; agora ela existe.
+                    with engine.begin() as new_conn:
+                        end = self._reserve(new_conn, name, self.block)
+                current = end - self.block
+            self._ranges[name] = (current + 1, end)
+            return current
+
+    def reserve(self, name: str, size: int) -> range:
+        """Faixa de `size` ids numa transação própria (carga em massa, ver app/load.py)."""
+        try:
+            with engine.begin() as conn:
+                end = self._reserve(conn, name, size)
+        except IntegrityError:
+            with engine.begin() as conn:
+                end = self._reserve(conn, name, size)
+        return range(end - size, end)
+
+    def _reserve(self, conn, name: str, size: int) -> int:
+        """Fim (exclusivo) da faixa reservada."""
+        from app.models import ShardSequence
+
+        end = conn.scalar(
+            update(ShardSequence)
+            .where(ShardSequence.name == name)
+            .values(next_id=ShardSequence.next_id + size)
+            .returning(ShardSequence.next_id)
+        )
+        if end is None:
+            # Primeira reserva: continua depois do maior id existente em qualquer shard.
+            table = Base.metadata.tables[name]
+            end = 1 + max(_max_id(shard, table) for shard in shard_engines.values()) + size
+            conn.execute(insert(ShardSequence).values(name=name, next_id=end))
+        return end
+
+
+def _max_id(bind, table) -> int:
+    with bind.connect() as conn:
+        return conn.scalar(select(func.max(table.c.id))) or 0
+
+
+id_allocator = IdAllocator()
+
+
+def _assign_id(mapper, connection, target):
+    name = mapper.local_table.name
+    if name not in ALLOCATED_IDS or target.id is not None:
+        return
+    if engine.dialect.name == "sqlite":
+        # SQLite tem um só escritor: outra conexão no s0 esperaria a transação desta sessão.
+        session = object_session(target)
+        target.id = id_allocator.next(name, session.connection(bind_arguments={"shard_id": CATALOG}))
+    else:
+        target.id = id_allocator.next(name)
+
+
+def install():
+    """Liga a alocação de ids; chamado por app.database quando há shards."""
+    if not event.contains(Base, "before_insert", _assign_id):
+        event.listen(Base, "before_insert", _assign_id, propagate=True)
+
+
+# --- escolha de shard ---------------------------------------------------------------
+
+
+def _shard_chooser(mapper, instance, clause=None, **kw):
+    if instance is not None and is_sharded(mapper.local_table.name):
+        return shard_map.shard_for(instance.matricula)
+    return CATALOG
+
+
+def _identity_chooser(mapper, primary_key, *, lazy_loaded_from=None, **kw):
+    if lazy_loaded_from is not None:
+        return [lazy_loaded_from.identity_token]
+    if not is_sharded(mapper.local_table.name):
+        return [CATALOG]
+    if mapper.primary_key[0].name == "matricula":
+        return [shard_map.shard_for(primary_key[0])]
+    return list(shard_engines)
+
+
+def _target_table(orm_context):
+    tables = {table.name for table in find_tables(orm_context.statement, include_crud=True)}
+    sharded = tables & set(SHARDED_TABLES)
+    if sharded and tables - sharded:
+        # As tabelas globais só existem no s0: nos outros shards o statement veria tabelas vazias.
+        raise ValueError(f"statement mistura tabelas distribuídas e globais: {sorted(tables)}")
+    mapper = orm_context.bind_mapper
+    if mapper is not None:
+        return mapper.local_table.name
+    statement = orm_context.statement
+    table = getattr(statement, "table", None)
+    if table is not None:
+        return table.name
+    return next(iter(sharded)) if sharded else None
+
+
+def _bind_value(bind: BindParameter, params):
+    if bind.value is not None or bind.callable is not None:
+        return bind.effective_value
+    if isinstance(params, dict):
+        return params.get(bind.key)
+    return None
+
+
+def _matriculas(clause, params) -> set | None:
+    """Matrículas fixadas pelo WHERE (só termos ligados por AND); None se não há filtro."""
+    if clause is None:
+        return None
+    if isinstance(clause, BooleanClauseList) and clause.operator is operators.and_:
+        for sub in clause.clauses:
+            found = _matriculas(sub, params)
+            if found is not None:
+                return found
+        return None
+    if (
+        isinstance(clause, BinaryExpression)
+        and getattr(clause.left, "key", None) == "matricula"
+        and isinstance(clause.right, BindParameter)
+    ):
+        value = _bind_value(clause.right, params)
+        if value is None:
+            return None
+        if clause.operator is operators.eq:
+            return {value}
+        if clause.operator is operators.in_op:
+            return set(value)
+    return None
+
+
+def _execute_chooser(orm_context) -> list[str]:
+    table = _target_table(orm_context)
+    if table is None or not is_sharded(table):
+        return [CATALOG]
+    matriculas = _matriculas(getattr(orm_context.statement, "whereclause", None), orm_context.parameters)
+    if matriculas is None:
+        return list(shard_engines)
+    # in_([]) não retorna nada; basta um shard.
+    return sorted({shard_map.shard_for(m) for m in matriculas}) or [CATALOG]
+
+
+# --- execução com junção ordenada -------------------------------------------------------
+
+
+def _explicit_shard(orm_context):
+    """Shard fixado pelo chamador, na mesma precedência de execute_and_instances."""
+    for option in orm_context._non_compile_orm_options:
+        if isinstance(option, set_shard_id):
+            return option.shard_id
+    if orm_context.is_select:
+        options = orm_context.load_options
+    elif orm_context.is_update or orm_context.is_delete:
+        options = orm_context.update_delete_options
+    else:
+        options = None
+    if options is not None and options._identity_token is not None:
+        return options._identity_token
+    return orm_context.execution_options.get("_sa_shard_id") or orm_context.bind_arguments.get("shard_id")
+
+
+def _sort_keys(statement) -> list[tuple[str, bool]] | None:
+    """(coluna, desc) da ORDER BY; None se algum termo não é uma coluna simples."""
+    keys = []
+    for clause in statement._order_by_clauses:
+        descending = isinstance(clause, UnaryExpression) and clause.modifier is operators.desc_op
+        element = clause.element if isinstance(clause, UnaryExpression) else clause
+        name = getattr(element, "key", None)
+        if name is None or not isinstance(element, ColumnElement):
+            return None
+        keys.append((name, descending))
+    return keys
+
+
+def _row_key(columns: list[str], keys: list[tuple[str, bool]]):
+    getters = []
+    for name, _ in keys:
+        if name in columns:
+            index = columns.index(name)
+            getters.append(lambda row, index=index: row[index])
+        else:
+            # Linha com a entidade ORM inteira.
+            getters.append(lambda row, name=name: getattr(row[0], name))
+
+    def key(row):
+        values = []
+        for getter in getters:
+            value = getter(row)
+            values.append((value is None, value))
+        return tuple(values)
+
+    return key
+
+
+def _invoke(orm_context, shard_id, statement=None):
+    bind_arguments = dict(orm_context.bind_arguments)
+    bind_arguments["shard_id"] = shard_id
+    orm_context.update_execution_options(identity_token=shard_id)
+    return orm_context.invoke_statement(statement=statement, bind_arguments=bind_arguments)
+
+
+def _execute_merged(orm_context):
+    if _explicit_shard(orm_context) is not None:
+        return execute_and_instances(orm_context)
+    shard_ids = _execute_chooser(orm_context)
+    if len(shard_ids) == 1:
+        return _invoke(orm_context, shard_ids[0])
+
+    statement = orm_context.statement
+    keys = _sort_keys(statement) if orm_context.is_select else None
+    limit = statement._limit if orm_context.is_select else None
+    offset = (statement._offset or 0) if orm_context.is_select else 0
+    if not keys and limit is None and not offset:
+        results = [_invoke(orm_context, shard_id) for shard_id in shard_ids]
+        return results[0].merge(*results[1:])
+
+    # Cada shard devolve até offset+limit linhas já ordenadas; a página sai da junção.
+    per_shard = statement
+    if limit is not None or offset:
+        per_shard = statement.limit(None if limit is None else limit + offset).offset(None)
+    frozen = [_invoke(orm_context, shard_id, per_shard).freeze() for shard_id in shard_ids]
+    parts = [part.rewrite_rows() for part in frozen]
+    if keys:
+        key = _row_key(list(frozen[0].metadata.keys), keys)
+        if len({descending for _, descending in keys}) == 1:
+            rows = heapq.merge(*parts, key=key, reverse=keys[0][1])
+        else:
+            rows = list(itertools.chain(*parts))
+            for index in reversed(range(len(keys))):
+                rows.sort(key=lambda row, index=index: key(row)[index], reverse=keys[index][1])
+    else:
+        rows = itertools.chain(*parts)
+    end = None if limit is None else offset + limit
+    return frozen[0].with_new_rows(list(itertools.islice(rows, offset, end)))()
+
+
+class ShardedRegistrySession(ShardedSession):
+    def __init__(self, **kwargs):
+        super().__init__(
+            shard_chooser=_shard_chooser,
+            identity_chooser=_identity_chooser,
+            execute_chooser=_execute_chooser,
+            shards=shard_engines,
+            **kwargs,
+        )
+        # Troca a junção por concatenação do ShardedSession pela junção ordenada.
+        event.remove(self, "do_orm_execute", execute_and_instances)
+        event.listen(self, "do_orm_execute", _execute_merged, retval=True)
+
+    def get_bind(self, mapper=None, *, shard_id=None, instance=None, clause=None, **kw):
+        if mapper is None and shard_id is None and instance is None:
+            # SQL textual e get_bind() sem argumentos vão para o s0.
+            shard_id = CATALOG
+        return super().get_bind(mapper, shard_id=shard_id, instance=instance, clause=clause, **kw)
+
+
+# --- rebalanceamento ---------------------------------------------------------------
+
+
+def plan_rebalance(current: dict[int, str], shards: list[str]) -> dict[int, str]:
+    """Divide os buckets por igual entre `shards`, mantendo no lugar o que já está dentro da cota."""
+    base, extra = divmod(SHARD_BUCKETS, len(shards))
+    quota = {shard: base + (index < extra) for index, shard in enumerate(shards)}
+    load = Counter()
+    plan, spare = {}, []
+    for bucket in range(SHARD_BUCKETS):
+        shard = current.get(bucket, CATALOG)
+        if shard in quota and load[shard] < quota[shard]:
+            plan[bucket] = shard
+            load[shard] += 1
+        else:
+            spare.append(bucket)
+    for bucket in spare:
+        shard = next(shard for shard in shards if load[shard] < quota[shard])
+        plan[bucket] = shard
+        load[shard] += 1
+    return plan
+
+
+def save_map(plan: dict[int, str]):
+    from app.models import ShardBucket
+
+    with engine.begin() as conn:
+        conn.execute(delete(ShardBucket))
+        rows = [{"bucket": bucket, "shard": shard} for bucket, shard in sorted(plan.items()) if shard != CATALOG]
+        if rows:
+            conn.execute(insert(ShardBucket), rows)
+    shard_map.refresh(force=True)
+
+
+def _move_rows(table, source: str, rows: list[dict]) -> int:
+    """Copia para o shard certo (pulando o que já foi copiado) e apaga da origem."""
+    key = table.primary_key.columns.values()[0]
+    by_target: dict[str, list[dict]] = {}
+    for row in rows:
+        by_target.setdefault(shard_map.shard_for(row["matricula"]), []).append(row)
+    moved = 0
+    for target, batch in by_target.items():
+        if target == source:
+            continue
+        ids = [row[key.name] for row in batch]
+        with shard_engines[target].begin() as conn:
+            present = set(conn.scalars(select(key).where(key.in_(ids))))
+            missing = [row for row in batch if row[key.name] not in present]
+            if missing:
+                conn.execute(insert(table), missing)
+        with shard_engines[source].begin() as conn:
+            conn.execute(delete(table).where(key.in_(ids)))
+        moved += len(batch)
+    return moved
+
+
+def sweep() -> dict[str, int]:
+    """Move para o shard do mapa atual toda linha que está em outro; devolve linhas movidas por tabela."""
+    shard_map.refresh(force=True)
+    report = {}
+    for name in SHARDED_TABLES:
+        table = Base.metadata.tables[name]
+        key = table.primary_key.columns.values()[0]
+        moved = 0
+        for source, bind in shard_engines.items():
+            after = None
+            while True:
+                stmt = select(table).order_by(key).limit(SHARD_MOVE_BATCH)
+                if after is not None:
+                    stmt = stmt.where(key > after)
+                with bind.connect() as conn:
+                    rows = [dict(row) for row in conn.execute(stmt).mappings()]
+                if not rows:
+                    break
+                after = rows[-1][key.name]
+                moved += _move_rows(table, source, rows)
+        report[name] = moved
+    if any(report.values()):
+        log.info("sharding.swept", **report)
+    return report
+
+
+def rebalance(exclude: list[str] | None = None) -> dict[str, int]:
+    shards = [shard for shard in shard_engines if shard not in (exclude or [])]
+    if not shards:
+        raise ValueError("Nenhum shard restante para receber os buckets")
+    plan = plan_rebalance(shard_map.assignments(), shards)
+    save_map(plan)
+    log.info("sharding.rebalanced", buckets=dict(Counter(plan.values())))
+    return sweep()
+
+
+def status() -> dict:
+    buckets = Counter(shard_map.assignments().values())
+    rows = {}
+    for shard, bind in shard_engines.items():
+        with bind.connect() as conn:
+            rows[shard] = {
+                name: conn.scalar(select(func.count()).select_from(Base.metadata.tables[name]))
+                for name in SHARDED_TABLES
+            }
+    return {
+        "buckets": SHARD_BUCKETS,
+        "shards": {shard: {"buckets": buckets.get(shard, 0), "rows": rows[shard]} for shard in shard_engines},
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--status", action="store_true", help="Buckets e linhas por shard")
+    parser.add_argument("--rebalance", action="store_true", help="Redistribui os buckets e move as linhas")
+    parser.add_argument("--sweep", action="store_true", help="Move linhas que estão fora do shard do mapa")
+    parser.add_argument("--exclude", action="append", default=[], help="Shard a esvaziar (repetível)")
+    args = parser.parse_args(argv)
+    if not (args.status or args.rebalance or args.sweep):
+        parser.print_help()
+        return 2
+    if len(shard_engines) == 1 and not args.status:
+        print("Só um banco configurado; defina DATABASE_SHARD_URLS para distribuir.")
+        return 1
+
+    from app import models  # noqa: F401  registra as tabelas no metadata
+
+    if args.rebalance:
+        print(json.dumps(rebalance(args.exclude), indent=2))
+    elif args.sweep:
+        print(json.dumps(sweep(), indent=2))
+    if args.status:
+        print(json.dumps(status(), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    # Como script este módulo é __main__; reimporta para usar o mesmo mapa da sessão.
+    from app.sharding import main as _main
+
+    sys.exit(_main())
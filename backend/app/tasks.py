@@ -0,0 +1,364 @@
+"""
+Jobs registrados no runner (app/jobs.py): escrita on-chain, publicação de
+eventos e limpeza periódica. Os handlers de main.py só enfileiram.
+"""
+import os
+import secrets
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, or_, select, update
+
+from app import archive
+from app.archive import ARCHIVE_ENABLED, NONCE_TTL_S
+from app.blockchain import (
+    encode_register_args,
+    register_properties_onchain,
+    register_property_onchain,
+    transaction_status,
+)
+from app.database import SessionLocal
+from app.events import bus, notify_wallets
+from app.jobs import jobs
+from app.models import Job, Nonce, Property, Transfer
+from app.observability import get_logger
+from app import repository
+
+
+# tx_hash provisório enquanto o job de chain não conclui.
+CHAIN_PENDING = "chain-pending"
+# Registro reservado por um job ("chain-sending:<token>") e, já assinado, com o hash
+# gravado antes do envio ("chain-signed:<hash>"); ver _swap e recover_chain_job.
+CHAIN_SENDING = "chain-sending"
+CHAIN_SIGNED = "chain-signed"
+# Registro que o contrato não aceita (ex.: wallet que não é address no v2); repetir não resolve.
+CHAIN_FAILED = "chain-failed"
+# Campos da propriedade que vão para registerProperty.
+CHAIN_FIELDS = ("matricula", "previous_owner", "current_owner", "latitude", "longitude")
+JOBS_RETENTION_S = float(os.getenv("JOBS_RETENTION_S", "604800"))
+MAINTENANCE_INTERVAL_S = float(os.getenv("MAINTENANCE_INTERVAL_S", "3600"))
+# Registro CHAIN_PENDING sem job vivo (ou reservado sem progresso) por mais que isso é recuperado.
+CHAIN_RECOVER_AFTER_S = float(os.getenv("CHAIN_RECOVER_AFTER_S", "300"))
+CHAIN_RECOVER_BATCH = int(os.getenv("CHAIN_RECOVER_BATCH", "100"))
+
+log = get_logger(__name__)
+
+
+class ChainClaimLost(RuntimeError):
+    """A recuperação devolveu o registro à fila antes do envio; este job não envia."""
+
+
+def _chain_item(prop: Property) -> dict:
+    return {name: getattr(prop, name) for name in CHAIN_FIELDS}
+
+
+def invalid_for_chain(item: dict) -> str | None:
+    """Motivo pelo qual o encoder do contrato recusa o item, ou None se ele é válido."""
+    try:
+        encode_register_args(**item)
+    except ValueError as exc:
+        return str(exc)
+    return None
+
+
+def _swap(model, ids, old: tuple[str, ...], new: str) -> set[int]:
+    """
+    Compare-and-set de tx_hash: só as linhas ainda em `old` passam a `new`. Devolve
+    os ids trocados; com `new` único (token ou hash) isso diz quem ficou com a linha.
+    """
+    ids = sorted(ids)
+    if not ids:
+        return set()
+    with SessionLocal() as db:
+        db.execute(update(model).where(model.id.in_(ids), model.tx_hash.in_(old)).values(tx_hash=new))
+        db.commit()
+        return set(db.execute(select(model.id).where(model.id.in_(ids), model.tx_hash == new)).scalars())
+
+
+def _claim_marker() -> str:
+    return f"{CHAIN_SENDING}:{secrets.token_hex(8)}"
+
+
+def _mark_property_failed(property_id: int):
+    _swap(Property, [property_id], (CHAIN_PENDING,), CHAIN_FAILED)
+
+
+def _mark_transfers_failed(transfer_ids: list[int]):
+    _swap(Transfer, transfer_ids, (CHAIN_PENDING,), CHAIN_FAILED)
+
+
+@jobs.task("chain.register_property", queue="chain", on_failure=_mark_property_failed)
+def register_property_job(property_id: int):
+    with SessionLocal() as db:
+        prop = db.get(Property, property_id)
+        # Idempotente: repetição após sucesso não reenvia.
+        if prop is None or prop.tx_hash != CHAIN_PENDING:
+            return
+        item = _chain_item(prop)
+        wallets = [prop.created_by, prop.current_owner]
+    error = invalid_for_chain(item)
+    if error:
+        _swap(Property, [property_id], (CHAIN_PENDING,), CHAIN_FAILED)
+        log.error("property.onchain_invalid", matricula=item["matricula"], error=error)
+        return
+    # Outro job (de outro processo ou reenfileirado pela recuperação) pode ter a mesma linha.
+    marker = _claim_marker()
+    if not _swap(Property, [property_id], (CHAIN_PENDING,), marker):
+        return
+    signed = [marker]
+
+    def on_signed(tx_hash: str):
+        state = f"{CHAIN_SIGNED}:{tx_hash}"
+        if not _swap(Property, [property_id], (marker,), state):
+            raise ChainClaimLost(item["matricula"])
+        signed.append(state)
+
+    try:
+        tx_hash = register_property_onchain(**item, on_signed=on_signed)
+    except Exception:
+        # Sem hash gravado nada saiu: volta para a fila. Já assinado, a recuperação confere o recibo.
+        _swap(Property, [property_id], (marker,), CHAIN_PENDING)
+        raise
+    _swap(Property, [property_id], tuple(signed), tx_hash)
+    log.info("property.onchain", matricula=item["matricula"], tx_hash=tx_hash)
+    notify_wallets(wallets, {"type": "property.onchain", "matricula": item["matricula"], "tx_hash": tx_hash})
+
+
+def _mark_transfer_failed(transfer_id: int):
+    _mark_transfers_failed([transfer_id])
+
+
+@jobs.task("chain.execute_transfer", queue="chain", on_failure=_mark_transfer_failed)
+def execute_transfer_job(transfer_id: int):
+    execute_transfers_job([transfer_id])
+
+
+@jobs.task("chain.execute_transfers", queue="chain", on_failure=_mark_transfers_failed)
+def execute_transfers_job(transfer_ids: list[int]):
+    """
+    Envia à chain as transferências executadas de um lote de assinaturas numa
+    única submissão (ver register_properties_onchain). As transferências (e a
+    propriedade, se pendente) são reservadas antes do envio e cada hash é
+    gravado assim que sai; numa repetição só vai o que ainda está pendente.
+    """
+    marker = _claim_marker()
+    claimed = _swap(Transfer, transfer_ids, (CHAIN_PENDING,), marker)
+    if not claimed:
+        return
+    with SessionLocal() as db:
+        # Várias frações da mesma matrícula no lote viram um único registro do estado final.
+        pending: dict[str, tuple[Property, list[Transfer]]] = {}
+        for transfer_id in transfer_ids:
+            if transfer_id not in claimed:
+                continue
+            transfer = db.get(Transfer, transfer_id)
+            if transfer.matricula not in pending:
+                prop = repository.property_by_matricula(db, transfer.matricula)
+                if prop is None:
+                    log.error(
+                        "transfer.onchain_missing_property", transfer_id=transfer_id, matricula=transfer.matricula
+                    )
+                    continue
+                pending[transfer.matricula] = (prop, [])
+            pending[transfer.matricula][1].append(transfer)
+        owned = _swap(Property, [prop.id for prop, _ in pending.values()], (CHAIN_PENDING,), marker)
+
+        # A propriedade já reflete a transferência no banco; o contrato recebe o estado atual.
+        items, groups = [], []
+        for matricula, (prop, transfers) in pending.items():
+            item = _chain_item(prop)
+            error = invalid_for_chain(item)
+            ids = ([prop.id] if prop.id in owned else [], [transfer.id for transfer in transfers])
+            if error is None:
+                items.append(item)
+                groups.append((matricula, ids, transfers))
+                continue
+            _swap(Property, ids[0], (marker,), CHAIN_FAILED)
+            _swap(Transfer, ids[1], (marker,), CHAIN_FAILED)
+            log.error("transfer.onchain_invalid", matricula=matricula, error=error)
+    # Reservadas sem propriedade encontrada voltam a pendentes (a recuperação tenta de novo).
+    grouped = {transfer.id for _, transfers in pending.values() for transfer in transfers}
+    _swap(Transfer, claimed - grouped, (marker,), CHAIN_PENDING)
+    if not groups:
+        return
+
+    signed: dict[int, str] = {}
+
+    def on_signed(index: int, tx_hash: str):
+        property_ids, ids = groups[index][1]
+        state = f"{CHAIN_SIGNED}:{tx_hash}"
+        if len(_swap(Transfer, ids, (marker,), state)) != len(ids):
+            raise ChainClaimLost(groups[index][0])
+        _swap(Property, property_ids, (marker,), state)
+        signed[index] = state
+
+    done = []
+    sent = 0
+    try:
+        for index, tx_hash in enumerate(register_properties_onchain(items, on_signed=on_signed)):
+            matricula, (property_ids, ids), transfers = groups[index]
+            states = (marker, signed[index]) if index in signed else (marker,)
+            _swap(Property, property_ids, states, tx_hash)
+            _swap(Transfer, ids, states, tx_hash)
+            sent = index + 1
+            for transfer in transfers:
+                done.append(
+                    (
+                        [transfer.owner_wallet, transfer.buyer_wallet],
+                        {
+                            "type": "transfer.onchain",
+                            "proposal_id": transfer.proposal_id,
+                            "matricula": matricula,
+                            "tx_hash": tx_hash,
+                        },
+                    )
+                )
+    except Exception:
+        # O que não chegou a ser assinado volta para a fila; assinado fica para a recuperação conferir.
+        for _, (property_ids, ids), _ in groups[sent:]:
+            _swap(Property, property_ids, (marker,), CHAIN_PENDING)
+            _swap(Transfer, ids, (marker,), CHAIN_PENDING)
+        raise
+
+    for wallets, event in done:
+        log.info("transfer.onchain", proposal_id=event["proposal_id"], tx_hash=event["tx_hash"])
+        notify_wallets(wallets, event)
+
+
+@jobs.task("events.publish", queue="notifications", max_retries=2)
+def publish_event_job(channels: list[str], event: dict):
+    bus.publish(channels, event)
+
+
+@jobs.task("maintenance.purge_nonces", queue="maintenance")
+def purge_nonces_job():
+    """Nonces SIWE só servem para o login corrente; os antigos só crescem a tabela."""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=NONCE_TTL_S)
+    with SessionLocal() as db:
+        result = db.execute(delete(Nonce).where(Nonce.created_at < cutoff))
+        db.commit()
+    if result.rowcount:
+        log.info("maintenance.nonces_purged", count=result.rowcount)
+
+
+@jobs.task("maintenance.purge_jobs", queue="maintenance")
+def purge_jobs_job():
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=JOBS_RETENTION_S)
+    with SessionLocal() as db:
+        result = db.execute(delete(Job).where(Job.status == "done", Job.updated_at < cutoff))
+        db.commit()
+    if result.rowcount:
+        log.info("maintenance.jobs_purged", count=result.rowcount)
+
+
+@jobs.task("maintenance.archive", queue="maintenance", max_retries=1)
+def archive_job():
+    archive.run()
+
+
+@jobs.task("maintenance.partitions", queue="maintenance", max_retries=1)
+def partitions_job():
+    """Partições futuras das tabelas particionadas; independe de ARCHIVE_ENABLED."""
+    archive.ensure_all_partitions()
+
+
+# (tipo, id) -> (tx_hash, quando o registro foi visto nesse estado sem job vivo pela primeira vez).
+_orphans: dict[tuple[str, int], tuple[str, float]] = {}
+
+
+def _live_ids() -> tuple[set[int], set[int]]:
+    properties = {kwargs["property_id"] for kwargs in jobs.live("chain.register_property")}
+    transfers = {kwargs["transfer_id"] for kwargs in jobs.live("chain.execute_transfer")}
+    for kwargs in jobs.live("chain.execute_transfers"):
+        transfers.update(kwargs["transfer_ids"])
+    return properties, transfers
+
+
+def _in_flight(model):
+    return select(model.id, model.tx_hash).where(
+        or_(
+            model.tx_hash == CHAIN_PENDING,
+            model.tx_hash.startswith(f"{CHAIN_SENDING}:"),
+            model.tx_hash.startswith(f"{CHAIN_SIGNED}:"),
+        )
+    )
+
+
+def _settle_claim(model, id_: int, state: str) -> bool:
+    """
+    Reserva parada (processo caiu ou job travou): volta para CHAIN_PENDING só se
+    nada saiu. Com hash gravado, o nó decide: incluída ou no mempool vira o
+    hash, revertida vira CHAIN_FAILED e desconhecida é reenviada. True quando a
+    linha voltou a pendente.
+    """
+    if state.startswith(f"{CHAIN_SENDING}:"):
+        return bool(_swap(model, [id_], (state,), CHAIN_PENDING))
+    tx_hash = state.removeprefix(f"{CHAIN_SIGNED}:")
+    status = transaction_status(tx_hash)
+    if status in ("confirmed", "pending"):
+        _swap(model, [id_], (state,), tx_hash)
+        return False
+    if status == "reverted":
+        _swap(model, [id_], (state,), CHAIN_FAILED)
+        log.error("maintenance.chain_reverted", table=model.__tablename__, id=id_, tx_hash=tx_hash)
+        return False
+    return bool(_swap(model, [id_], (state,), CHAIN_PENDING))
+
+
+@jobs.task("maintenance.recover_chain", queue="maintenance", max_retries=1)
+def recover_chain_job():
+    """
+    Devolve à fila "chain" registros e transferências presos em CHAIN_PENDING:
+    o backend em memória perde na parada os jobs que aguardavam repetição. Um
+    registro só volta depois de ficar CHAIN_RECOVER_AFTER_S no mesmo estado sem
+    job vivo, o que dá tempo a jobs de outros processos (que este não enxerga)
+    de concluir; se um deles ainda estiver na fila, a reserva no envio impede o
+    registro duplicado. Reservas paradas passam por _settle_claim. Os que
+    esgotam as tentativas viram CHAIN_FAILED pelo on_failure das tasks.
+    """
+    live_properties, live_transfers = _live_ids()
+    with SessionLocal() as db:
+        properties = db.execute(_in_flight(Property)).all()
+        transfers = db.execute(_in_flight(Transfer)).all()
+    seen = {("property", row.id): row.tx_hash for row in properties if row.id not in live_properties}
+    seen.update({("transfer", row.id): row.tx_hash for row in transfers if row.id not in live_transfers})
+    now = time.monotonic()
+    for key in set(_orphans) - set(seen):
+        del _orphans[key]
+    due = []
+    for key, state in seen.items():
+        if _orphans.get(key, (None,))[0] != state:
+            _orphans[key] = (state, now)
+        elif now - _orphans[key][1] >= CHAIN_RECOVER_AFTER_S:
+            del _orphans[key]
+            due.append((key, state))
+    if not due:
+        return
+    requeue = []
+    for (kind, id_), state in due:
+        model = Property if kind == "property" else Transfer
+        if state == CHAIN_PENDING or _settle_claim(model, id_, state):
+            requeue.append((kind, id_))
+    for kind, id_ in requeue:
+        if kind == "property":
+            jobs.enqueue("chain.register_property", property_id=id_)
+    transfer_ids = sorted(id_ for kind, id_ in requeue if kind == "transfer")
+    for start in range(0, len(transfer_ids), CHAIN_RECOVER_BATCH):
+        jobs.enqueue("chain.execute_transfers", transfer_ids=transfer_ids[start : start + CHAIN_RECOVER_BATCH])
+    log.warning(
+        "maintenance.chain_recovered",
+        properties=len(requeue) - len(transfer_ids),
+        transfers=len(transfer_ids),
+        settled=len(due) - len(requeue),
+    )
+
+
+# Com arquivamento ligado os nonces vencidos vão para o arquivo em vez de sumir.
+if ARCHIVE_ENABLED:
+    jobs.every(MAINTENANCE_INTERVAL_S, "maintenance.archive")
+else:
+    jobs.every(MAINTENANCE_INTERVAL_S, "maintenance.purge_nonces")
+jobs.every(MAINTENANCE_INTERVAL_S, "maintenance.purge_jobs")
+jobs.every(MAINTENANCE_INTERVAL_S, "maintenance.partitions")
+# Metade do prazo: um órfão volta à fila entre CHAIN_RECOVER_AFTER_S e 1,5x esse tempo.
+jobs.every(CHAIN_RECOVER_AFTER_S / 2, "maintenance.recover_chain")
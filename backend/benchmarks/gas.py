@@ -0,0 +1,165 @@
+"""
+Compara o custo de PropertyRegistry (v1) e PropertyRegistryV2 numa EVM local.
+
+Uso (a partir de backend/):
+    pip install "eth-tester[py-evm]" py-solc-x
+    python -m benchmarks.gas --samples 50
+    python -m benchmarks.gas --calldata-only      # sem EVM: só tamanho/custo do calldata
+
+Para cada versão: deploy, primeiro registro (slots novos), re-registro com troca
+de dono (o caminho das transferências) e anchorRoot. Reporta gasUsed médio e os
+bytes de calldata (com o custo intrínseco de 16/4 gas por byte não-zero/zero).
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+from pathlib import Path
+
+from app.blockchain import PROPERTY_REGISTRY_ABI, PROPERTY_REGISTRY_V2_ABI, encode_register_args
+
+
+CONTRACTS_DIR = Path(__file__).resolve().parent.parent / "contracts"
+CONTRACTS = {
+    1: ("PropertyRegistry.sol", "PropertyRegistry", PROPERTY_REGISTRY_ABI),
+    2: ("PropertyRegistryV2.sol", "PropertyRegistryV2", PROPERTY_REGISTRY_V2_ABI),
+}
+SOLC_VERSION = "0.8.20"
+
+
+def _samples(count: int, seed: int) -> list[dict]:
+    rng = random.Random(seed)
+
+    def wallet():
+        return "0x" + "".join(rng.choice("0123456789abcdef") for _ in range(40))
+
+    return [
+        {
+            "matricula": f"{rng.randint(10_000, 99_999)}-{rng.choice('ABCDEFGH')}{i:05d}",
+            "previous_owner": None,
+            "current_owner": wallet(),
+            "next_owner": wallet(),
+            "latitude": rng.uniform(-33.7, 5.2),
+            "longitude": rng.uniform(-73.9, -34.8),
+        }
+        for i in range(count)
+    ]
+
+
+def _register_args(sample: dict, version: int, transfer: bool = False) -> tuple:
+    return encode_register_args(
+        matricula=sample["matricula"],
+        previous_owner=sample["current_owner"] if transfer else sample["previous_owner"],
+        current_owner=sample["next_owner"] if transfer else sample["current_owner"],
+        latitude=sample["latitude"],
+        longitude=sample["longitude"],
+        version=version,
+    )
+
+
+def _calldata(abi: list[dict], args: tuple) -> bytes:
+    from eth_abi import encode
+    from eth_utils import function_abi_to_4byte_selector
+
+    fn = next(item for item in abi if item.get("name") == "registerProperty")
+    types = [inp["type"] for inp in fn["inputs"]]
+    return function_abi_to_4byte_selector(fn) + encode(types, list(args))
+
+
+def calldata_report(samples: list[dict]) -> dict:
+    out = {}
+    for version, (_, _, abi) in CONTRACTS.items():
+        sizes, costs = [], []
+        for sample in samples:
+            data = _calldata(abi, _register_args(sample, version))
+            sizes.append(len(data))
+            costs.append(sum(16 if b else 4 for b in data))
+        out[f"v{version}"] = {
+            "calldata_bytes": round(statistics.mean(sizes), 1),
+            "calldata_gas": round(statistics.mean(costs), 1),
+        }
+    return out
+
+
+def _compile(filename: str, name: str) -> tuple[list, str]:
+    import solcx
+
+    if SOLC_VERSION not in {str(v) for v in solcx.get_installed_solc_versions()}:
+        solcx.install_solc(SOLC_VERSION)
+    compiled = solcx.compile_files(
+        [str(CONTRACTS_DIR / filename)],
+        output_values=["abi", "bin"],
+        solc_version=SOLC_VERSION,
+        optimize=True,
+        optimize_runs=200,
+    )
+    key = next(k for k in compiled if k.endswith(f":{name}"))
+    return compiled[key]["abi"], compiled[key]["bin"]
+
+
+def gas_report(samples: list[dict]) -> dict:
+    from eth_tester import EthereumTester, PyEVMBackend
+    from web3 import Web3
+
+    w3 = Web3(Web3.EthereumTesterProvider(EthereumTester(PyEVMBackend())))
+    sender = w3.eth.accounts[0]
+    out = {}
+    for version, (filename, name, _) in CONTRACTS.items():
+        abi, bytecode = _compile(filename, name)
+        factory = w3.eth.contract(abi=abi, bytecode=bytecode)
+        deploy = w3.eth.wait_for_transaction_receipt(factory.constructor().transact({"from": sender}))
+        contract = w3.eth.contract(address=deploy.contractAddress, abi=abi)
+
+        def gas_of(call):
+            tx_hash = call.transact({"from": sender})
+            return w3.eth.wait_for_transaction_receipt(tx_hash).gasUsed
+
+        register = [gas_of(contract.functions.registerProperty(*_register_args(s, version))) for s in samples]
+        transfer = [
+            gas_of(contract.functions.registerProperty(*_register_args(s, version, transfer=True)))
+            for s in samples
+        ]
+        anchor = gas_of(contract.functions.anchorRoot(bytes(31) + b"\x01"))
+        out[f"v{version}"] = {
+            "deploy_gas": deploy.gasUsed,
+            "register_gas": round(statistics.mean(register)),
+            "transfer_gas": round(statistics.mean(transfer)),
+            "anchor_root_gas": anchor,
+        }
+    return out
+
+
+def _savings(report: dict, key: str) -> float | None:
+    v1, v2 = report["v1"].get(key), report["v2"].get(key)
+    if not v1 or v2 is None:
+        return None
+    return round(1 - v2 / v1, 3)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--calldata-only", action="store_true")
+    args = parser.parse_args(argv)
+
+    samples = _samples(args.samples, args.seed)
+    report = calldata_report(samples)
+    if not args.calldata_only:
+        try:
+            gas = gas_report(samples)
+        except ImportError as exc:
+            print(f"EVM local indisponível ({exc}); instale eth-tester[py-evm] e py-solc-x.", file=sys.stderr)
+            return 2
+        for version, values in gas.items():
+            report[version].update(values)
+
+    keys = sorted(report["v1"])
+    report["savings"] = {key: _savings(report, key) for key in keys}
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
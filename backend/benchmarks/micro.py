@@ -0,0 +1,372 @@
+"""
+Micro-benchmarks das funções mais chamadas (auth, serialização, seleção PoS).
+
+Uso (a partir de backend/):
+    python -m benchmarks.micro                       # roda tudo, compara e grava histórico
+    python -m benchmarks.micro -k jwt --rounds 30
+    python -m benchmarks.micro --threshold 0.15      # falha se a mediana piorar mais de 15%
+
+Cada execução é anexada ao histórico (JSON lines). A referência de cada
+benchmark é a mediana das últimas `--window` execuções registradas.
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_HISTORY = HERE / "micro_history.jsonl"
+AUTH_SERVICE_DIR = HERE.parent.parent / "auth-service" / "app"
+
+BENCHMARKS = {}
+
+
+def benchmark(name: str):
+    """Registra uma fábrica que prepara os dados e devolve a função medida."""
+
+    def decorator(factory):
+        BENCHMARKS[name] = factory
+        return factory
+
+    return decorator
+
+
+# --- benchmarks ---------------------------------------------------------------
+
+
+@benchmark("auth.verify_signature")
+def _verify_signature():
+    from eth_account import Account
+    from eth_account.messages import encode_defunct
+
+    from app.auth import build_siwe_message, verify_signature
+
+    acct = Account.from_key(b"\x01" * 32)
+    message = build_siwe_message(acct.address, "deadbeef" * 4)
+    signature = Account.sign_message(encode_defunct(text=message), acct.key).signature.hex()
+    return lambda: verify_signature(acct.address, message, signature)
+
+
+@benchmark("auth.issue_jwt")
+def _issue_jwt():
+    from app.auth import issue_jwt
+    from app.models import Role
+
+    user = SimpleNamespace(wallet="0x" + "ab" * 20, role=Role.REGULATOR)
+    return lambda: issue_jwt(user)
+
+
+@benchmark("deps.jwt_decode")
+def _jwt_decode():
+    from app.auth import issue_jwt
+    from app.deps import decode_token
+    from app.models import Role
+
+    token = issue_jwt(SimpleNamespace(wallet="0x" + "ab" * 20, role=Role.USER))
+    return lambda: decode_token(token)
+
+
+@benchmark("pos.select_validators")
+def _select_validators():
+    from app.main import _select_validators
+
+    return _select_validators
+
+
+@benchmark("pos.run_pos_validation")
+def _run_pos_validation():
+    from app.main import _run_pos_validation
+
+    return lambda: _run_pos_validation("tx-bench")
+
+
+def _property_rows(n: int):
+    now = datetime.now(timezone.utc)
+    return [
+        SimpleNamespace(
+            id=i,
+            matricula=f"MAT-{i:08d}",
+            current_owner="0x" + f"{i:040x}",
+            previous_owner=None,
+            description=f"Imóvel {i}",
+            tx_hash=f"mock-{i:032x}",
+            created_at=now,
+        )
+        for i in range(n)
+    ]
+
+
+@benchmark("schemas.property_brief_list_1k")
+def _property_brief_list():
+    from pydantic import TypeAdapter
+
+    from app.schemas import PropertyBrief
+
+    adapter = TypeAdapter(list[PropertyBrief])
+    rows = _property_rows(1_000)
+    # Mesmo caminho do FastAPI: valida a partir de atributos e serializa em JSON.
+    return lambda: adapter.dump_json(adapter.validate_python(rows, from_attributes=True))
+
+
+@benchmark("schemas.audit_out_100x50")
+def _audit_out_list():
+    from pydantic import TypeAdapter
+
+    from app.schemas import AuditOut
+
+    now = datetime.now(timezone.utc)
+    proposals = [
+        SimpleNamespace(
+            id=i,
+            proposer_wallet="0x" + "11" * 20,
+            owner_wallet="0x" + "22" * 20,
+            amount=1000.0 + i,
+            fraction=50.0,
+            status="PENDING",
+            created_at=now,
+        )
+        for i in range(50)
+    ]
+    transfers = [
+        SimpleNamespace(
+            id=i,
+            proposal_id=i,
+            matricula="MAT-1",
+            owner_wallet="0x" + "22" * 20,
+            buyer_wallet="0x" + "11" * 20,
+            status="EXECUTED",
+            tx_hash=f"mock-{i:032x}",
+            created_at=now,
+        )
+        for i in range(50)
+    ]
+    audits = [
+        {
+            "matricula": f"MAT-{i}",
+            "current_owner": "0x" + "11" * 20,
+            "previous_owner": "0x" + "22" * 20,
+            "tx_hash": "mock",
+            "description": None,
+            "proposals": proposals,
+            "transfers": transfers,
+        }
+        for i in range(100)
+    ]
+    adapter = TypeAdapter(list[AuditOut])
+    return lambda: adapter.dump_json(adapter.validate_python(audits, from_attributes=True))
+
+
+def _seeded_properties(n: int):
+    """Sessão no banco do benchmark com pelo menos `n` propriedades."""
+    from sqlalchemy import func, insert, select
+
+    from app.database import SessionLocal, init_schema
+    from app.models import Property
+
+    init_schema()
+    with SessionLocal() as db:
+        have = db.scalar(select(func.count()).select_from(Property))
+        if have < n:
+            db.execute(
+                insert(Property),
+                [
+                    {
+                        "matricula": f"MAT-{i:08d}",
+                        "current_owner": "0x" + f"{i:040x}",
+                        "description": f"Imóvel {i}",
+                        "latitude": -23.5,
+                        "longitude": -46.6,
+                        "tx_hash": f"mock-{i:032x}",
+                    }
+                    for i in range(have, n)
+                ],
+            )
+            db.commit()
+    return SessionLocal
+
+
+@benchmark("api.list_properties_10k_orm")
+def _list_properties_orm():
+    from pydantic import TypeAdapter
+
+    from app.models import Property
+    from app.schemas import PropertyBrief
+
+    session_factory = _seeded_properties(10_000)
+    adapter = TypeAdapter(list[PropertyBrief])
+
+    def run():
+        # Caminho anterior: objetos ORM -> validação from_attributes -> dict JSON -> json.dumps.
+        with session_factory() as db:
+            rows = db.query(Property).order_by(Property.created_at.desc()).all()
+            content = adapter.dump_python(adapter.validate_python(rows, from_attributes=True), mode="json")
+            return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+    return run
+
+
+@benchmark("api.list_properties_10k_fast")
+def _list_properties_fast():
+    from sqlalchemy import select
+
+    from app.fastjson import FastJSONResponse, schema_columns, select_rows
+    from app.models import Property
+    from app.schemas import PropertyBrief
+
+    session_factory = _seeded_properties(10_000)
+    stmt = select(*schema_columns(Property, PropertyBrief)).order_by(Property.created_at.desc())
+
+    def run():
+        with session_factory() as db:
+            return FastJSONResponse(select_rows(db, stmt)).body
+
+    return run
+
+
+@benchmark("auth_service.hash_password")
+def _hash_password():
+    # auth-service também usa o pacote "app"; carrega com outro nome para não colidir.
+    for key, value in {"JWT_SECRET": "bench", "SMTP_PORT": "587"}.items():
+        os.environ.setdefault(key, value)
+    spec = importlib.util.spec_from_file_location(
+        "auth_service_app",
+        AUTH_SERVICE_DIR / "__init__.py",
+        submodule_search_locations=[str(AUTH_SERVICE_DIR)],
+    )
+    package = importlib.util.module_from_spec(spec)
+    sys.modules["auth_service_app"] = package
+    spec.loader.exec_module(package)
+    from auth_service_app.auth import hash_password
+
+    return lambda: hash_password("s3nh4-de-benchmark")
+
+
+# --- runner -------------------------------------------------------------------
+
+
+def measure(fn, rounds: int, min_round_time: float) -> dict:
+    """Calibra o número de chamadas por rodada e mede `rounds` rodadas."""
+    fn()  # aquecimento
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_round_time or loops >= 1_000_000:
+            break
+        loops *= 10 if elapsed < min_round_time / 10 else 2
+
+    per_call = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        per_call.append((time.perf_counter() - start) / loops)
+
+    median = statistics.median(per_call)
+    return {
+        "rounds": rounds,
+        "loops": loops,
+        "min_us": round(min(per_call) * 1e6, 3),
+        "median_us": round(median * 1e6, 3),
+        "mean_us": round(statistics.fmean(per_call) * 1e6, 3),
+        "stddev_us": round(statistics.pstdev(per_call) * 1e6, 3),
+        "ops": round(1 / median, 1) if median else None,
+    }
+
+
+def load_history(path: Path) -> list[dict]:
+    if not path.exists():
+        return []
+    with path.open() as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def reference(history: list[dict], name: str, window: int) -> float | None:
+    values = [run["results"][name]["median_us"] for run in history if name in run.get("results", {})]
+    return statistics.median(values[-window:]) if values else None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", "--filter", default="", help="Roda apenas benchmarks cujo nome contém o texto")
+    parser.add_argument("--rounds", type=int, default=15)
+    parser.add_argument("--min-round-time", type=float, default=0.02, help="Segundos mínimos por rodada")
+    parser.add_argument("--history", default=str(DEFAULT_HISTORY))
+    parser.add_argument("--window", type=int, default=5, help="Execuções anteriores usadas como referência")
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("MICRO_BENCH_THRESHOLD", "0.25")))
+    parser.add_argument("--no-save", action="store_true", help="Não grava a execução no histórico")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    # _select_validators vive em app.main, que ainda precisa de DATABASE_URL na importação.
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='micro-')}/micro.db")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    sys.path.insert(0, str(HERE.parent))
+
+    history_path = Path(args.history)
+    history = load_history(history_path)
+    results, skipped, regressions, errors = {}, {}, [], []
+
+    print(f"{'benchmark':34} {'median':>12} {'min':>12} {'ops/s':>12}  vs ref")
+    for name, factory in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        try:
+            fn = factory()
+            stats = measure(fn, args.rounds, args.min_round_time)
+        except ImportError as exc:
+            # Dependência de outro serviço ausente neste ambiente.
+            skipped[name] = str(exc)
+            print(f"{name:34} {'skipped':>12}  ({exc})")
+            continue
+        except Exception as exc:
+            errors.append(f"{name}: {exc!r}")
+            print(f"{name:34} {'error':>12}  ({exc!r})")
+            continue
+        results[name] = stats
+        ref = reference(history, name, args.window)
+        delta = ""
+        if ref:
+            change = stats["median_us"] / ref - 1
+            delta = f"{change:+.1%}"
+            if change > args.threshold:
+                regressions.append(f"{name}: {stats['median_us']}us vs ref {ref}us ({delta})")
+                delta += "  REGRESSÃO"
+        print(
+            f"{name:34} {stats['median_us']:>10.2f}us {stats['min_us']:>10.2f}us "
+            f"{stats['ops']:>12}  {delta}"
+        )
+
+    if not args.no_save and results:
+        run = {
+            "timestamp": int(time.time()),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": results,
+            "skipped": skipped,
+        }
+        with history_path.open("a") as fh:
+            fh.write(json.dumps(run) + "\n")
+
+    for problem in regressions:
+        print(f"REGRESSÃO: {problem}", file=sys.stderr)
+    for problem in errors:
+        print(f"ERRO: {problem}", file=sys.stderr)
+    return 1 if regressions or errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
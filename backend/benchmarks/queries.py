@@ -0,0 +1,198 @@
+"""
+Orçamento de queries por rota e checagem do cache de statements.
+
+Uso (a partir de backend/):
+    python -m benchmarks.queries                  # compara com query_budget.json
+    python -m benchmarks.queries --update         # grava o orçamento atual
+    python -m benchmarks.queries --json
+
+Roda o fluxo principal (login, registro, proposta, transferência com as quatro
+assinaturas, PoS unitário e em lote, auditoria, book e busca) contra um SQLite temporário, duas
+vezes. Um listener no engine conta, por rota, os statements executados e os
+que precisaram ser compilados (cache miss). A primeira passada aquece o cache;
+na segunda nenhuma rota pode compilar SQL e nenhuma pode passar do número de
+queries registrado no orçamento. Sai com código 1 se houver regressão.
+"""
+import argparse
+import contextvars
+import json
+import os
+import sys
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+
+
+HERE = Path(__file__).resolve().parent
+DEFAULT_BUDGET = HERE / "query_budget.json"
+
+_request_stats = contextvars.ContextVar("request_stats", default=None)
+
+
+class QueryCounter:
+    """Middleware ASGI que agrega por rota as queries feitas durante cada requisição."""
+
+    def __init__(self, app):
+        self.app = app
+        self.routes = defaultdict(lambda: {"calls": 0, "queries": 0, "max_queries": 0, "compiled": 0})
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = {"queries": 0, "compiled": 0}
+        token = _request_stats.set(stats)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_stats.reset(token)
+            route = scope.get("route")
+            key = f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+            agg = self.routes[key]
+            agg["calls"] += 1
+            agg["queries"] += stats["queries"]
+            agg["max_queries"] = max(agg["max_queries"], stats["queries"])
+            agg["compiled"] += stats["compiled"]
+
+    def reset(self):
+        self.routes.clear()
+
+    def listen(self, engine):
+        from sqlalchemy import event
+        from sqlalchemy.engine.default import CACHE_MISS
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def _count(conn, cursor, statement, parameters, context, executemany):
+            stats = _request_stats.get()
+            if stats is None:
+                # Threads de fundo (jobs, âncoras) não entram na conta.
+                return
+            stats["queries"] += 1
+            if context is not None and context.cache_hit == CACHE_MISS:
+                stats["compiled"] += 1
+
+
+def _login(client, account):
+    from eth_account.messages import encode_defunct
+
+    from app.auth import build_siwe_message
+
+    nonce = client.post("/auth/siwe/start").json()["nonce"]
+    message = build_siwe_message(account.address, nonce)
+    signature = account.sign_message(encode_defunct(text=message)).signature.hex()
+    r = client.post("/auth/siwe/verify", json={"address": account.address, "message": message, "signature": signature})
+    r.raise_for_status()
+    return {"Authorization": "Bearer " + r.json()["token"]}
+
+
+def _scenario(client, accounts, n: int):
+    owner, buyer, regulator, financial = accounts
+    ho, hb, hr, hf = (_login(client, account) for account in accounts)
+    matricula = f"Q-{n:04d}"
+
+    def ok(r):
+        assert r.status_code == 200, (r.request.url, r.status_code, r.text)
+        return r.json()
+
+    ok(
+        client.post(
+            "/properties",
+            headers=ho,
+            json={
+                "matricula": matricula,
+                "current_owner": owner.address.lower(),
+                "latitude": -23.5,
+                "longitude": -46.6,
+                "description": f"Casa {n} na rua A",
+            },
+        )
+    )
+    ok(client.get("/properties"))
+    ok(client.get(f"/properties/owner/{owner.address}"))
+    ok(client.get("/properties/search", params={"q": "casa rua"}))
+    proposal = ok(client.post("/proposals", headers=hb, json={"matricula": matricula, "amount": 10, "fraction": 50}))
+    ok(client.get(f"/properties/{matricula}/book"))
+    ok(client.get("/proposals/me", headers=ho))
+    ok(client.post(f"/proposals/{proposal['id']}/decision", headers=ho, json={"decision": "ACCEPT"}))
+    ok(client.post(f"/transfers/{proposal['id']}/initiate", headers=ho))
+    for headers in (ho, hb, hr, hf):
+        ok(client.post(f"/transfers/{proposal['id']}/sign", headers=headers, json={"action": "SIGN"}))
+    ok(client.get(f"/transfers/{proposal['id']}", headers=hb))
+    ok(client.post("/pos/validate", headers=hr, json={"tx_reference": f"tx-{n}"}))
+    batch = client.post("/pos/validate/batch", headers=hf, json={"tx_references": [f"tx-{n}-{i}" for i in range(50)]})
+    assert batch.status_code == 200 and batch.text.count("\n") == 50, batch.text
+    ok(client.get("/pos/validations", headers=hr))
+    ok(client.get("/audit/transfers", headers=hr))
+    ok(client.get(f"/audit/{matricula}", headers=hr))
+
+
+def run() -> dict:
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp(prefix='queries-')}/q.db")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ.setdefault("ETH_MOCK", "true")
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+    sys.path.insert(0, str(HERE.parent))
+
+    from eth_account import Account
+    from fastapi.testclient import TestClient
+
+    import app.main
+    from app.database import engine
+
+    counter = QueryCounter(app.main.app)
+    counter.listen(engine)
+    accounts = [Account.create() for _ in range(4)]
+    with TestClient(counter) as client:
+        for account, role in [(accounts[2], "REGULATOR"), (accounts[3], "FINANCIAL")]:
+            client.post(
+                "/admin/assign-role", json={"wallet": account.address, "role": role, "admin_secret": "changeme-admin"}
+            ).raise_for_status()
+        _scenario(client, accounts, 1)
+        counter.reset()
+        _scenario(client, accounts, 2)
+    return {key: dict(value) for key, value in sorted(counter.routes.items())}
+
+
+def compare(routes: dict, budget: dict) -> list[str]:
+    problems = []
+    for key, stats in routes.items():
+        if stats["compiled"]:
+            problems.append(f"{key}: {stats['compiled']} statement(s) compilado(s) com o cache aquecido")
+        limit = budget.get(key)
+        if limit is None:
+            problems.append(f"{key}: rota fora do orçamento (rode com --update)")
+        elif stats["max_queries"] > limit:
+            problems.append(f"{key}: {stats['max_queries']} queries (orçamento {limit})")
+    return problems
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", default=str(DEFAULT_BUDGET))
+    parser.add_argument("--update", action="store_true", help="Grava as contagens atuais como orçamento")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    routes = run()
+    budget_path = Path(args.budget)
+    if args.update:
+        budget = {key: stats["max_queries"] for key, stats in routes.items()}
+        budget_path.write_text(json.dumps(budget, indent=2, sort_keys=True) + "\n")
+        print(f"Orçamento gravado em {budget_path} ({len(budget)} rotas).")
+        return 0
+
+    budget = json.loads(budget_path.read_text()) if budget_path.exists() else {}
+    if args.json:
+        print(json.dumps(routes, indent=2))
+    else:
+        for key, stats in routes.items():
+            limit = budget.get(key, "-")
+            print(f"{key:<45} {stats['max_queries']:>3} queries (orçamento {limit}) compilados {stats['compiled']}")
+    problems = compare(routes, budget)
+    for problem in problems:
+        print("REGRESSÃO", problem)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""Agregação de latências e comparação com baseline."""
+import math
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Percentil por nearest-rank (q em 0..100)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(q / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: dict[str, list[float]], errors: dict[str, int], duration: float) -> dict:
+    operations = {}
+    total = 0
+    for op, values in sorted(latencies.items()):
+        values = sorted(values)
+        total += len(values)
+        operations[op] = {
+            "count": len(values),
+            "errors": errors.get(op, 0),
+            "mean_ms": round(sum(values) / len(values) * 1000, 3),
+            "p50_ms": round(percentile(values, 50) * 1000, 3),
+            "p95_ms": round(percentile(values, 95) * 1000, 3),
+            "p99_ms": round(percentile(values, 99) * 1000, 3),
+        }
+    return {
+        "duration_s": round(duration, 3),
+        "requests": total,
+        "errors": sum(errors.values()),
+        "throughput_rps": round(total / duration, 2) if duration else 0.0,
+        "operations": operations,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float, min_count: int = 20) -> list[str]:
+    """
+    Lista regressões: throughput abaixo de (1 - tolerance) do baseline ou p95
+    de uma operação acima de (1 + tolerance). Operações com poucas amostras são ignoradas.
+    """
+    problems = []
+    base_rps = baseline.get("throughput_rps", 0)
+    if base_rps and current["throughput_rps"] < base_rps * (1 - tolerance):
+        problems.append(f"throughput {current['throughput_rps']} rps < baseline {base_rps} rps")
+    for op, base in baseline.get("operations", {}).items():
+        cur = current["operations"].get(op)
+        if not cur or min(cur["count"], base["count"]) < min_count:
+            continue
+        if cur["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            problems.append(f"{op}: p95 {cur['p95_ms']}ms > baseline {base['p95_ms']}ms")
+    return problems
@@ -0,0 +1,138 @@
+"""
+Benchmark de carga da API.
+
+Uso (a partir de backend/):
+    python -m benchmarks.run --properties 10000 --proposals 20000 --iterations 500
+    python -m benchmarks.run --baseline benchmarks/baseline.json --tolerance 0.2
+    python -m benchmarks.run --save-baseline benchmarks/baseline.json
+
+Sem --database-url usa um SQLite temporário. Com --base-url o workload roda
+contra um servidor já no ar (que deve apontar para o mesmo banco semeado).
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--base-url", default=None, help="Servidor externo; padrão roda a app em processo")
+    parser.add_argument("--properties", type=int, default=2_000)
+    parser.add_argument("--proposals", type=int, default=4_000)
+    parser.add_argument("--transfers", type=int, default=500)
+    parser.add_argument("--validations", type=int, default=2_000)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--iterations", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--chain",
+        choices=["mock", "sim"],
+        default="mock",
+        help="sim usa o nó simulado (latência/blocos via SIM_*) para medir o custo de chain",
+    )
+    parser.add_argument("--output", default=None, help="Arquivo JSON do resultado (padrão stdout)")
+    parser.add_argument("--baseline", default=None, help="Compara com um resultado anterior")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--save-baseline", default=None, help="Grava o resultado como novo baseline")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    # Precisa vir antes de importar app.*: a configuração é lida na importação.
+    if not args.database_url:
+        tmp = tempfile.mkdtemp(prefix="bench-")
+        args.database_url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["ETH_MOCK"] = "true"
+    os.environ["CHAIN_BACKEND"] = args.chain
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    # Todos os usuários simulados saem do mesmo cliente; o limiter distorceria a medição.
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+    from benchmarks.report import compare, summarize
+    from benchmarks.seed import seed
+    from benchmarks.workload import Recorder, Workload
+
+    t0 = time.perf_counter()
+    matriculas = seed(
+        properties=args.properties,
+        proposals=args.proposals,
+        transfers=args.transfers,
+        validations=args.validations,
+        seed=args.seed,
+    )
+    seed_time = time.perf_counter() - t0
+
+    recorder = Recorder()
+    if args.base_url:
+        import httpx
+
+        client_cm = httpx.Client(base_url=args.base_url, timeout=60)
+    else:
+        from fastapi.testclient import TestClient
+
+        from app.main import app
+
+        client_cm = TestClient(app)
+
+    with client_cm as client:
+        workload = Workload(client, recorder, matriculas, seed=args.seed, users=args.users)
+        workload.setup()
+        # Descarta as medições do aquecimento (login inicial de cada usuário).
+        recorder.latencies.clear()
+        recorder.errors.clear()
+        duration = workload.run(args.iterations, args.concurrency)
+
+    result = summarize(recorder.latencies, recorder.errors, duration)
+    result["meta"] = {
+        "database": args.database_url.split("://", 1)[0],
+        "target": args.base_url or "in-process",
+        "volumes": {
+            "properties": args.properties,
+            "proposals": args.proposals,
+            "transfers": args.transfers,
+            "validations": args.validations,
+        },
+        "users": args.users,
+        "concurrency": args.concurrency,
+        "iterations": args.iterations,
+        "seed": args.seed,
+        "chain": args.chain,
+        "seed_time_s": round(seed_time, 3),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "timestamp": int(time.time()),
+    }
+
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as fh:
+            fh.write(text + "\n")
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        problems = compare(result, baseline, args.tolerance)
+        for problem in problems:
+            print(f"REGRESSÃO: {problem}", file=sys.stderr)
+        if problems:
+            return 1
+        print(f"Sem regressões (tolerância {args.tolerance:.0%}).", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""Popula o banco com volumes configuráveis para os benchmarks."""
+import json
+import random
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app.database import Base, engine
+from app.models import (
+    PosStatus,
+    PosValidation,
+    Property,
+    Proposal,
+    ProposalStatus,
+    Transfer,
+    TransferStatus,
+)
+
+
+BATCH = 5_000
+
+
+def _wallet(rng: random.Random) -> str:
+    return "0x" + "".join(rng.choice("0123456789abcdef") for _ in range(40))
+
+
+def _bulk(session: Session, model, rows: list[dict]):
+    for i in range(0, len(rows), BATCH):
+        session.execute(insert(model), rows[i : i + BATCH])
+
+
+def seed(
+    *,
+    properties: int,
+    proposals: int,
+    transfers: int,
+    validations: int,
+    seed: int = 42,
+) -> list[str]:
+    """
+    Insere linhas sintéticas com insert() em lote (sem ORM por linha) e
+    devolve as matrículas criadas para o workload reutilizar.
+    """
+    rng = random.Random(seed)
+    Base.metadata.create_all(bind=engine)
+
+    owners = [_wallet(rng) for _ in range(max(properties // 10, 1))]
+    prop_rows = [
+        {
+            "matricula": f"SEED-{seed}-{i:08d}",
+            "previous_owner": None,
+            "current_owner": rng.choice(owners),
+            "description": f"Imóvel sintético {i} na quadra {rng.randint(1, 500)}",
+            "latitude": rng.uniform(-33.0, 5.0),
+            "longitude": rng.uniform(-73.0, -35.0),
+            "tx_hash": f"mock-{rng.getrandbits(128):032x}",
+            "created_by": None,
+        }
+        for i in range(properties)
+    ]
+    matriculas = [r["matricula"] for r in prop_rows]
+    owner_of = {r["matricula"]: r["current_owner"] for r in prop_rows}
+
+    proposal_rows = []
+    for _ in range(proposals if matriculas else 0):
+        m = rng.choice(matriculas)
+        proposal_rows.append(
+            {
+                "matricula": m,
+                "proposer_wallet": _wallet(rng),
+                "owner_wallet": owner_of[m],
+                "amount": round(rng.uniform(1_000, 1_000_000), 2),
+                "fraction": rng.choice([None, 25.0, 50.0, 100.0]),
+                "message": None,
+                "status": rng.choice(list(ProposalStatus)),
+            }
+        )
+
+    with Session(engine) as session:
+        _bulk(session, Property, prop_rows)
+        proposal_ids: list[int] = []
+        for i in range(0, len(proposal_rows), BATCH):
+            proposal_ids.extend(
+                session.scalars(
+                    insert(Proposal).returning(Proposal.id, sort_by_parameter_order=True),
+                    proposal_rows[i : i + BATCH],
+                )
+            )
+        session.commit()
+
+        accepted = [
+            (pid, row)
+            for pid, row in zip(proposal_ids, proposal_rows)
+            if row["status"] == ProposalStatus.ACCEPTED
+        ]
+        transfer_rows = [
+            {
+                "proposal_id": pid,
+                "matricula": row["matricula"],
+                "owner_wallet": row["owner_wallet"],
+                "buyer_wallet": row["proposer_wallet"],
+                "owner_signed": True,
+                "buyer_signed": True,
+                "regulator_signed": rng.random() < 0.5,
+                "financial_signed": rng.random() < 0.5,
+                "status": rng.choice(list(TransferStatus)),
+                "tx_hash": None,
+            }
+            for pid, row in accepted[:transfers]
+        ]
+        validation_rows = [
+            {
+                "tx_reference": f"seed-tx-{i}",
+                "selected_validators": json.dumps(["0xvalidator1", "0xvalidator2", "0xvalidator3"]),
+                "approvals": 3,
+                "required": 3,
+                "status": PosStatus.VALIDATED,
+                "tx_hash": f"pos-mock-{rng.getrandbits(64):016x}",
+            }
+            for i in range(validations)
+        ]
+        _bulk(session, Transfer, transfer_rows)
+        _bulk(session, PosValidation, validation_rows)
+        session.commit()
+
+    return matriculas
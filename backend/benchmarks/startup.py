@@ -0,0 +1,76 @@
+"""
+Mede o cold start do backend em processos novos (sem cache de módulos).
+
+Uso (a partir de backend/):
+    python -m benchmarks.startup --runs 7
+    python -m benchmarks.startup --app-dir /caminho/para/outro/checkout/backend   # comparar versões
+
+Reporta a mediana de: importar app.main, executar o lifespan (startup completo)
+e se web3/eth_account foram carregados no caminho mock.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+
+PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import app.main
+t1 = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(app.main.app):
+    t2 = time.perf_counter()
+print(json.dumps({
+    "import_s": t1 - t0,
+    "startup_s": t2 - t0,
+    "web3_loaded": "web3" in sys.modules,
+    "eth_account_loaded": "eth_account" in sys.modules,
+}))
+"""
+
+
+def run_once(app_dir: Path, env: dict) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=app_dir,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--app-dir", default=str(Path(__file__).resolve().parent.parent))
+    parser.add_argument("--database-url", default=None)
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    env.setdefault("ETH_MOCK", "true")
+    env["LOG_LEVEL"] = "WARNING"
+    env["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp(prefix='startup-')}/s.db"
+
+    samples = [run_once(Path(args.app_dir), env) for _ in range(args.runs)]
+    result = {
+        "runs": args.runs,
+        "app_dir": args.app_dir,
+        "import_s_median": round(statistics.median(s["import_s"] for s in samples), 3),
+        "startup_s_median": round(statistics.median(s["startup_s"] for s in samples), 3),
+        "web3_loaded": any(s["web3_loaded"] for s in samples),
+        "eth_account_loaded": any(s["eth_account_loaded"] for s in samples),
+    }
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+"""Workload roteirizado (SIWE, registro, propostas, multiassinatura, auditoria)."""
+import hashlib
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+
+from eth_account import Account
+from eth_account.messages import encode_defunct
+
+
+# Peso relativo de cada cenário por iteração.
+SCENARIOS = {
+    "login": 2,
+    "register": 2,
+    "proposal": 3,
+    "multisig": 1,
+    "audit": 4,
+    "list": 1,
+}
+
+
+def _account(seed: int, label: str) -> Account:
+    key = hashlib.sha256(f"bench-{seed}-{label}".encode()).digest()
+    return Account.from_key(key)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def call(self, op: str, fn, *args, **kwargs):
+        start = time.perf_counter()
+        resp = fn(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.latencies[op].append(elapsed)
+            if resp.status_code >= 400:
+                self.errors[op] += 1
+        return resp
+
+
+class Workload:
+    def __init__(self, client, recorder: Recorder, matriculas: list[str], *, seed: int, users: int):
+        self.client = client
+        self.rec = recorder
+        self.seed = seed
+        self.matriculas = list(matriculas)
+        self.users = [_account(seed, f"user-{i}") for i in range(users)]
+        self.regulator = _account(seed, "regulator")
+        self.financial = _account(seed, "financial")
+        self.headers: dict[str, dict] = {}
+        # Propriedades registradas pelo workload: matrícula -> dono (Account).
+        self.owned: dict[str, Account] = {}
+        self._lock = threading.Lock()
+        self._counter = 0
+
+    # --- helpers ---------------------------------------------------------
+
+    def login(self, acct: Account) -> dict:
+        from app.auth import build_siwe_message
+
+        nonce = self.rec.call("siwe_start", self.client.post, "/auth/siwe/start").json()["nonce"]
+        message = build_siwe_message(acct.address, nonce)
+        signature = Account.sign_message(encode_defunct(text=message), acct.key).signature.hex()
+        resp = self.rec.call(
+            "siwe_verify",
+            self.client.post,
+            "/auth/siwe/verify",
+            json={"address": acct.address, "message": message, "signature": signature},
+        )
+        headers = {"Authorization": f"Bearer {resp.json()['token']}"}
+        self.headers[acct.address] = headers
+        return headers
+
+    def setup(self):
+        admin_secret = os.getenv("ADMIN_SECRET", "changeme-admin")
+        for acct, role in ((self.regulator, "REGULATOR"), (self.financial, "FINANCIAL")):
+            self.client.post(
+                "/admin/assign-role",
+                json={"wallet": acct.address, "role": role, "admin_secret": admin_secret},
+            )
+        for acct in [self.regulator, self.financial, *self.users]:
+            self.login(acct)
+
+    def _next_matricula(self) -> str:
+        with self._lock:
+            self._counter += 1
+            return f"BENCH-{self.seed}-{os.getpid()}-{self._counter:08d}"
+
+    def _take_owned(self, rng: random.Random):
+        with self._lock:
+            if not self.owned:
+                return None, None
+            matricula = rng.choice(list(self.owned))
+            return matricula, self.owned.pop(matricula)
+
+    # --- cenários --------------------------------------------------------
+
+    def login_scenario(self, rng: random.Random):
+        self.login(rng.choice(self.users))
+
+    def register_scenario(self, rng: random.Random):
+        owner = rng.choice(self.users)
+        matricula = self._next_matricula()
+        resp = self.rec.call(
+            "register_property",
+            self.client.post,
+            "/properties",
+            headers=self.headers[owner.address],
+            json={
+                "matricula": matricula,
+                "current_owner": owner.address.lower(),
+                "description": f"Imóvel de benchmark {matricula}",
+                "latitude": rng.uniform(-33.0, 5.0),
+                "longitude": rng.uniform(-73.0, -35.0),
+            },
+        )
+        if resp.status_code < 400:
+            with self._lock:
+                self.owned[matricula] = owner
+                self.matriculas.append(matricula)
+
+    def proposal_scenario(self, rng: random.Random):
+        if not self.matriculas:
+            return self.register_scenario(rng)
+        buyer = rng.choice(self.users)
+        self.rec.call(
+            "create_proposal",
+            self.client.post,
+            "/proposals",
+            headers=self.headers[buyer.address],
+            json={"matricula": rng.choice(self.matriculas), "amount": rng.uniform(1_000, 100_000)},
+        )
+
+    def multisig_scenario(self, rng: random.Random):
+        matricula, owner = self._take_owned(rng)
+        if matricula is None:
+            return self.register_scenario(rng)
+        buyer = rng.choice([u for u in self.users if u is not owner] or self.users)
+        owner_h, buyer_h = self.headers[owner.address], self.headers[buyer.address]
+        resp = self.rec.call(
+            "create_proposal",
+            self.client.post,
+            "/proposals",
+            headers=buyer_h,
+            json={"matricula": matricula, "amount": 50_000, "fraction": 100},
+        )
+        if resp.status_code >= 400:
+            with self._lock:
+                self.owned[matricula] = owner
+            return
+        pid = resp.json()["id"]
+        self.rec.call(
+            "decide_proposal",
+            self.client.post,
+            f"/proposals/{pid}/decision",
+            headers=owner_h,
+            json={"decision": "ACCEPT"},
+        )
+        self.rec.call("initiate_transfer", self.client.post, f"/transfers/{pid}/initiate", headers=owner_h)
+        for acct in (owner, buyer, self.regulator, self.financial):
+            resp = self.rec.call(
+                "sign_transfer",
+                self.client.post,
+                f"/transfers/{pid}/sign",
+                headers=self.headers[acct.address],
+                json={"action": "SIGN"},
+            )
+        self.rec.call("get_transfer", self.client.get, f"/transfers/{pid}", headers=buyer_h)
+        new_owner = buyer if resp.status_code < 400 and resp.json()["status"] == "EXECUTED" else owner
+        with self._lock:
+            self.owned[matricula] = new_owner
+
+    def audit_scenario(self, rng: random.Random):
+        reg_h = self.headers[self.regulator.address]
+        if self.matriculas:
+            self.rec.call(
+                "audit_history",
+                self.client.get,
+                f"/audit/{rng.choice(self.matriculas)}",
+                headers=reg_h,
+            )
+        user = rng.choice(self.users)
+        self.rec.call(
+            "my_proposals", self.client.get, "/proposals/me", headers=self.headers[user.address]
+        )
+
+    def list_scenario(self, rng: random.Random):
+        reg_h = self.headers[self.regulator.address]
+        self.rec.call("list_properties", self.client.get, "/properties")
+        self.rec.call("audit_transfers", self.client.get, "/audit/transfers", headers=reg_h)
+        self.rec.call("pos_validations", self.client.get, "/pos/validations", headers=reg_h)
+
+    def run(self, iterations: int, concurrency: int) -> float:
+        """Executa `iterations` cenários em `concurrency` threads; retorna o tempo total."""
+        names = list(SCENARIOS)
+        weights = [SCENARIOS[n] for n in names]
+        per_worker = [iterations // concurrency + (i < iterations % concurrency) for i in range(concurrency)]
+
+        def worker(idx: int, count: int):
+            rng = random.Random(self.seed * 1000 + idx)
+            for _ in range(count):
+                name = rng.choices(names, weights)[0]
+                getattr(self, f"{name}_scenario")(rng)
+
+        threads = [threading.Thread(target=worker, args=(i, n)) for i, n in enumerate(per_worker)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.perf_counter() - start
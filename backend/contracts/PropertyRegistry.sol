@@ -17,6 +17,10 @@ contract PropertyRegistry {
     mapping(string => Property) public properties;
     event PropertyRegistered(string indexed matricula, string currentOwner, string txHash);
 
+    /// @notice Raízes Merkle de lotes de registros/transferências (modo de ancoragem).
+    mapping(bytes32 => uint256) public anchoredAt;
+    event RootAnchored(bytes32 indexed root, address submittedBy);
+
     function registerProperty(
         string memory matricula,
         string memory previousOwner,
@@ -37,6 +41,28 @@ contract PropertyRegistry {
         emit PropertyRegistered(matricula, currentOwner, _toHexString(msg.sender));
     }
 
+    /// @notice Ancora a raiz de um lote; os registros ficam off-chain com prova de inclusão.
+    function anchorRoot(bytes32 root) public {
+        require(anchoredAt[root] == 0, "Raiz ja ancorada");
+        anchoredAt[root] = block.timestamp;
+        emit RootAnchored(root, msg.sender);
+    }
+
+    /// @notice Verifica a inclusão de uma folha (pares ordenados, como o MerkleProof do OpenZeppelin).
+    function verifyInclusion(bytes32 root, bytes32 leaf, bytes32[] calldata proof) external view returns (bool) {
+        if (anchoredAt[root] == 0) {
+            return false;
+        }
+        bytes32 node = leaf;
+        for (uint256 i = 0; i < proof.length; i++) {
+            bytes32 sibling = proof[i];
+            node = node <= sibling
+                ? keccak256(abi.encodePacked(node, sibling))
+                : keccak256(abi.encodePacked(sibling, node));
+        }
+        return node == root;
+    }
+
     function _toHexString(address account) internal pure returns (string memory) {
         bytes20 value = bytes20(account);
         bytes16 hexSymbols = "0123456789abcdef";
@@ -0,0 +1,69 @@
+// SPDX-License-Identifier: MIT
+pragma solidity ^0.8.20;
+
+/// @title Registro de propriedades v2 (armazenamento compacto)
+/// @notice Mesma semântica da v1 com tipos fixos: matrícula como keccak256, donos como
+///         address, coordenadas int32 em micrograus e timestamp uint64. Cada registro
+///         ocupa 3 slots (a v1 usa ~12) e o calldata não tem strings dinâmicas.
+contract PropertyRegistryV2 {
+    struct Property {
+        // slot 0: 20 + 4 + 4 bytes
+        address previousOwner;
+        int32 latitudeE6;
+        int32 longitudeE6;
+        // slot 1: 20 + 8 bytes
+        address currentOwner;
+        uint64 registeredAt;
+        // slot 2
+        address submittedBy;
+    }
+
+    /// @notice Chave: keccak256(bytes(matricula)).
+    mapping(bytes32 => Property) public properties;
+    event PropertyRegistered(bytes32 indexed matriculaHash, address indexed currentOwner, address previousOwner);
+
+    /// @notice Raízes Merkle de lotes de registros/transferências (modo de ancoragem).
+    mapping(bytes32 => uint256) public anchoredAt;
+    event RootAnchored(bytes32 indexed root, address submittedBy);
+
+    function registerProperty(
+        bytes32 matriculaHash,
+        address previousOwner,
+        address currentOwner,
+        int32 latitudeE6,
+        int32 longitudeE6
+    ) external {
+        // Sobrescreve se já existir, mantendo rastreabilidade por evento (como na v1).
+        properties[matriculaHash] = Property({
+            previousOwner: previousOwner,
+            latitudeE6: latitudeE6,
+            longitudeE6: longitudeE6,
+            currentOwner: currentOwner,
+            registeredAt: uint64(block.timestamp),
+            submittedBy: msg.sender
+        });
+        emit PropertyRegistered(matriculaHash, currentOwner, previousOwner);
+    }
+
+    /// @notice Ancora a raiz de um lote; os registros ficam off-chain com prova de inclusão.
+    function anchorRoot(bytes32 root) external {
+        require(anchoredAt[root] == 0, "Raiz ja ancorada");
+        anchoredAt[root] = block.timestamp;
+        emit RootAnchored(root, msg.sender);
+    }
+
+    /// @notice Verifica a inclusão de uma folha (pares ordenados, como o MerkleProof do OpenZeppelin).
+    function verifyInclusion(bytes32 root, bytes32 leaf, bytes32[] calldata proof) external view returns (bool) {
+        if (anchoredAt[root] == 0) {
+            return false;
+        }
+        bytes32 node = leaf;
+        for (uint256 i = 0; i < proof.length; i++) {
+            bytes32 sibling = proof[i];
+            node = node <= sibling
+                ? keccak256(abi.encodePacked(node, sibling))
+                : keccak256(abi.encodePacked(sibling, node));
+        }
+        return node == root;
+    }
+}
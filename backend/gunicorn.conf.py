@@ -0,0 +1,84 @@
+"""
+Perfil de produção: gunicorn gerenciando workers uvicorn.
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+Todas as opções aceitam override por variável de ambiente.
+"""
+import os
+import shutil
+import tempfile
+
+
+def _cpus() -> int:
+    # Respeita cpuset do container (os.cpu_count ignora limites).
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() == "true"
+
+
+# Métricas Prometheus agregadas entre workers. O diretório precisa existir (e estar
+# limpo) antes do preload importar a app, por isso é preparado aqui e não em on_starting.
+os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "prometheus-multiproc")
+)
+shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+worker_class = "uvicorn.workers.UvicornWorker"
+# Endpoints síncronos rodam no threadpool de cada worker; um worker por core
+# evita disputa de GIL sem deixar CPU ociosa.
+workers = int(os.getenv("WEB_CONCURRENCY", str(_cpus())))
+backlog = int(os.getenv("GUNICORN_BACKLOG", "2048"))
+
+# Preload importa a app uma vez no master (cold start único, páginas compartilhadas).
+# É seguro porque a importação não abre conexões nem threads além do log,
+# ambos recriados em post_fork.
+preload_app = _bool("GUNICORN_PRELOAD", "true")
+
+# Reciclagem gradual de workers para conter vazamentos; o jitter evita que
+# todos reiniciem ao mesmo tempo.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "5000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "500"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+
+# Keep-alive maior que o idle timeout do balanceador (ex.: 60s no ALB) evita
+# que o servidor feche conexões que o proxy ainda considera vivas.
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "75"))
+
+# Heartbeat em tmpfs: em Docker /tmp pode ser overlay e travar workers.
+worker_tmp_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+accesslog = os.getenv("GUNICORN_ACCESSLOG") or None
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOGLEVEL", "info")
+
+
+def on_starting(server):
+    # Schema criado uma única vez no master, não em paralelo no lifespan de cada worker.
+    from app.database import init_schema, should_create_schema
+
+    if should_create_schema():
+        init_schema()
+    os.environ["DB_CREATE_ALL"] = "false"
+
+
+def post_fork(server, worker):
+    from app.database import dispose_after_fork
+    from app.observability import reset_logging_after_fork
+
+    dispose_after_fork()
+    reset_logging_after_fork()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -48,6 +48,7 @@ export async function sendProposal(
     amount: number;
     fraction?: number;
     message?: string;
+    owner_wallet?: string;
   },
   token: string
 ) {
@@ -167,3 +168,27 @@ export async function fetchTransfers(token: string) {
   }
   return res.json();
 }
+
+export type AppEvent = {
+  type: string;
+  proposal_id: number;
+  matricula: string;
+  status: string;
+  tx_hash?: string | null;
+  ts: number;
+};
+
+export function subscribeEvents(token: string, onEvent: (event: AppEvent) => void) {
+  // EventSource não envia cabeçalhos; o backend aceita o JWT via query string.
+  const source = new EventSource(`${API_URL}/events/stream?token=${encodeURIComponent(token)}`);
+  const handler = (msg: MessageEvent) => onEvent(JSON.parse(msg.data));
+  [
+    "proposal.created",
+    "proposal.decided",
+    "transfer.initiated",
+    "transfer.signed",
+    "transfer.rejected",
+    "transfer.executed",
+  ].forEach((type) => source.addEventListener(type, handler as EventListener));
+  return () => source.close();
+}
@@ -1,4 +1,4 @@
-import { useState } from "react";
+import { useEffect, useState } from "react";
 import { BrowserProvider } from "ethers";
 import {
   startSiwe,
@@ -11,6 +11,8 @@ import {
   validatePos,
   fetchAudit,
   fetchTransfers,
+  subscribeEvents,
+  type AppEvent,
 } from "../lib/api";
 
 declare const process: { env: { [key: string]: string | undefined } };
@@ -110,6 +112,28 @@ export default function Home() {
   const [transferList, setTransferList] = useState<TransferListItem[]>([]);
   const [transferListStatus, setTransferListStatus] = useState<string>("Aguardando listagem");
   const [transferListError, setTransferListError] = useState<string>("");
+  const [lastEvent, setLastEvent] = useState<AppEvent | null>(null);
+
+  // Com login feito, acompanha propostas e transferências pelo stream de eventos do backend.
+  useEffect(() => {
+    if (!token) return;
+    return subscribeEvents(token, setLastEvent);
+  }, [token]);
+
+  useEffect(() => {
+    if (!lastEvent) return;
+    const id = String(lastEvent.proposal_id);
+    const info = `${lastEvent.type}: ${lastEvent.status}` + (lastEvent.tx_hash ? ` | tx=${lastEvent.tx_hash}` : "");
+    if (lastEvent.type.startsWith("proposal.") && decisionForm.proposalId === id) {
+      setDecisionStatus(`Proposta #${id} atualizada (${info})`);
+    }
+    if (lastEvent.type.startsWith("transfer.") && transferForm.proposalId === id) {
+      setTransferStatus(`Transferência da proposta #${id} atualizada (${info})`);
+    }
+    if (lastEvent.type.startsWith("transfer.") && transferList.length > 0) {
+      loadTransfers();
+    }
+  }, [lastEvent]);
 
   async function connectWallet() {
     setError("");
@@ -773,6 +797,12 @@ export default function Home() {
         <div style={{ marginTop: 8 }}>
           <strong>Status:</strong> {transferListStatus}
         </div>
+        {lastEvent && (
+          <div style={{ color: "#9ca3af", marginTop: 8 }}>
+            Último evento: {lastEvent.type} (proposta #{lastEvent.proposal_id}, {lastEvent.matricula}) →{" "}
+            {lastEvent.status}
+          </div>
+        )}
         {transferListError && (
           <div style={{ color: "crimson", marginTop: 8 }}>
             Erro: {transferListError}